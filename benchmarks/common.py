@@ -0,0 +1,173 @@
+import os
+import statistics
+import typing as t
+import uuid
+from dataclasses import dataclass
+
+import boto3
+from mypy_boto3_dynamodb import ServiceResource
+from mypy_boto3_dynamodb.service_resource import Table
+
+from api.repository import (
+    INDEX_INCLUDED_ATTRIBUTES,
+    TIME_BUCKET_INDEX,
+    UPDATED_AT_INDEX,
+)
+
+LOCALSTACK_ENDPOINT_URL = "http://localhost:4566"
+
+
+@dataclass
+class LambdaContext:
+    function_name: str = "benchmark"
+    function_version: str = "benchmark"
+    memory_limit_in_mb: int = 128
+    invoked_function_arn: str = "arn:aws:lambda:us-east-1:000000000:function:bench"
+    aws_request_id: str = str(uuid.UUID(int=0))
+
+    def get_remaining_time_in_millis(self) -> int:
+        return 3000
+
+
+def apigateway_event(
+    method: str,
+    path: str,
+    *,
+    query: t.Optional[t.Dict[str, str]] = None,
+    path_parameters: t.Optional[t.Dict[str, str]] = None,
+    headers: t.Optional[t.Dict[str, str]] = None,
+    body: t.Optional[str] = None,
+) -> t.Dict[str, t.Any]:
+    """
+    Build an event shaped like the ones API Gateway's REST proxy integration
+    sends to the handler.
+    """
+    headers = headers or {}
+    return {
+        "resource": path,
+        "path": path,
+        "httpMethod": method,
+        "headers": headers,
+        "multiValueHeaders": {k: [v] for k, v in headers.items()},
+        "queryStringParameters": query,
+        "multiValueQueryStringParameters": (
+            None if query is None else {k: [v] for k, v in query.items()}
+        ),
+        "requestContext": {
+            "accountId": "123456789012",
+            "apiId": "id",
+            "httpMethod": method,
+            "identity": {"sourceIp": "127.0.0.1", "userAgent": "benchmark"},
+            "path": path,
+            "protocol": "HTTP/1.1",
+            "requestId": str(uuid.uuid4()),
+            "requestTimeEpoch": 1583349317135,
+            "resourcePath": path,
+            "stage": "$default",
+        },
+        "pathParameters": path_parameters,
+        "stageVariables": None,
+        "body": body,
+        "isBase64Encoded": False,
+    }
+
+
+def configure_environment(table_name: str, endpoint_url: t.Optional[str], **extra):
+    """
+    Point the application's Settings at the benchmark table.
+    """
+    os.environ["APP_DYNAMO_TABLE_NAME"] = table_name
+    if endpoint_url:
+        os.environ["APP_DYNAMO_ENDPOINT_URL"] = endpoint_url
+        # Localstack accepts any credentials
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "TEST")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "TEST")
+    for key, value in extra.items():
+        os.environ[f"APP_{key.upper()}"] = str(value)
+
+
+def create_table(
+    table_name: str, endpoint_url: t.Optional[str], lsi_projection: str = "ALL"
+) -> Table:
+    dynamo: ServiceResource = boto3.resource(
+        "dynamodb", endpoint_url=endpoint_url, region_name="us-east-1"
+    )
+    if lsi_projection == "INCLUDE":
+        projection = {
+            "ProjectionType": "INCLUDE",
+            "NonKeyAttributes": INDEX_INCLUDED_ATTRIBUTES,
+        }
+    else:
+        projection = {"ProjectionType": "ALL"}
+
+    lsis = [
+        ("CreatedAtLSI", "created_at#id"),
+        ("CompletedAtLSI", "completed_at#id"),
+        ("ActionStatusLSI", "status#id"),
+    ]
+    table = dynamo.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {"AttributeName": "created_by", "KeyType": "HASH"},
+            {"AttributeName": "action_id", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": name, "AttributeType": "S"}
+            for name in ["created_by", "action_id", "bucket", "updated_at#id"]
+            + [sk for _, sk in lsis]
+        ],
+        LocalSecondaryIndexes=[
+            {
+                "IndexName": index_name,
+                "KeySchema": [
+                    {"AttributeName": "created_by", "KeyType": "HASH"},
+                    {"AttributeName": sort_key, "KeyType": "RANGE"},
+                ],
+                "Projection": projection,
+            }
+            for index_name, sort_key in lsis
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": TIME_BUCKET_INDEX,
+                "KeySchema": [
+                    {"AttributeName": "bucket", "KeyType": "HASH"},
+                    {"AttributeName": "status#id", "KeyType": "RANGE"},
+                ],
+                "Projection": {
+                    "ProjectionType": "INCLUDE",
+                    "NonKeyAttributes": INDEX_INCLUDED_ATTRIBUTES,
+                },
+            },
+            {
+                "IndexName": UPDATED_AT_INDEX,
+                "KeySchema": [
+                    {"AttributeName": "created_by", "KeyType": "HASH"},
+                    {"AttributeName": "updated_at#id", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            },
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    table.wait_until_exists()
+    return table
+
+
+def summarize(samples_s: t.Sequence[float]) -> t.Dict[str, float]:
+    """
+    Reduce latency samples (in seconds) to millisecond percentiles.
+    """
+    ordered = sorted(samples_s)
+
+    def percentile(p: float) -> float:
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(50) if ordered else 0.0,
+        "p95_ms": percentile(95) if ordered else 0.0,
+        "p99_ms": percentile(99) if ordered else 0.0,
+    }
@@ -0,0 +1,172 @@
+"""
+Replay a mix of API Gateway events against index.handler at concurrency and
+report throughput and per-route latency percentiles.
+
+By default the handler runs against the in-memory repository so only the
+Lambda code itself is measured. Pass --backend dynamo to include localstack (or
+DynamoDB, with an empty --endpoint-url) in the measurements. Each worker is a
+process of its own, like a Lambda execution environment, as the handler keeps
+per-invocation state in module globals.
+
+    poetry run python -m benchmarks.load_test --requests 5000 --concurrency 8
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import time
+import typing as t
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import arrow
+from benchmarks.common import (
+    LOCALSTACK_ENDPOINT_URL,
+    LambdaContext,
+    apigateway_event,
+    configure_environment,
+    create_table,
+    summarize,
+)
+
+ROUTES = ["run", "status", "enumerate", "enumerate_status", "enumerate_created_at"]
+
+# Relative weights of each kind of request in the generated traffic
+DEFAULT_MIX = "run=2,status=5,enumerate=1,enumerate_status=1,enumerate_created_at=1"
+
+
+def parse_mix(mix: str) -> t.Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        route, _, weight = part.partition("=")
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route {route!r}, expected one of {ROUTES}")
+        weights[route] = int(weight or 1)
+    return weights
+
+
+def build_event(route: str, action_ids: t.List[str]) -> t.Dict[str, t.Any]:
+    if route == "run":
+        return apigateway_event("POST", "/actions")
+    if route == "status":
+        action_id = random.choice(action_ids)
+        return apigateway_event(
+            "GET", f"/actions/{action_id}", path_parameters={"action_id": action_id}
+        )
+    if route == "enumerate":
+        return apigateway_event("GET", "/actions")
+    if route == "enumerate_status":
+        status = random.choice(["PENDING", "SUCCEEDED", "FAILED"])
+        return apigateway_event("GET", "/actions", query={"status": status})
+    if route == "enumerate_created_at":
+        since = arrow.utcnow().shift(minutes=-random.randint(1, 60))
+        return apigateway_event("GET", "/actions", query={"created_at": str(since)})
+    raise ValueError(f"Unknown route {route!r}")
+
+
+Sample = t.Tuple[str, float, int]
+
+
+def worker(
+    requests: int, mix: t.Dict[str, int], seed_actions: int
+) -> t.Tuple[t.List[Sample], float, float]:
+    """
+    Issue `requests` events drawn from `mix` and return a (route, latency,
+    status code) sample for each along with the wall clock window they were
+    issued in.
+    """
+    # Imported here so that process workers pick up the configured environment
+    from api.index import handler
+
+    context = LambdaContext()
+    action_ids = []
+    for _ in range(max(seed_actions, 1)):
+        response = handler(apigateway_event("POST", "/actions"), context)
+        action_ids.append(json.loads(response["body"])["id"])
+
+    routes = random.choices(list(mix), weights=list(mix.values()), k=requests)
+    samples = []
+    window_start = time.time()
+    for route in routes:
+        event = build_event(route, action_ids)
+        start = time.perf_counter()
+        response = handler(event, context)
+        samples.append((route, time.perf_counter() - start, response["statusCode"]))
+    return samples, window_start, time.time()
+
+
+def report(samples: t.List[Sample], elapsed_s: float) -> t.Dict[str, t.Any]:
+    by_route: t.Dict[str, t.List[t.Tuple[float, int]]] = {}
+    for route, latency, status_code in samples:
+        by_route.setdefault(route, []).append((latency, status_code))
+
+    return {
+        "requests": len(samples),
+        "elapsed_s": elapsed_s,
+        "throughput_rps": len(samples) / elapsed_s if elapsed_s else 0.0,
+        "routes": {
+            route: {
+                **summarize([latency for latency, _ in results]),
+                "errors": sum(1 for _, code in results if code >= 400),
+                "throughput_rps": len(results) / elapsed_s if elapsed_s else 0.0,
+            }
+            for route, results in sorted(by_route.items())
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=["memory", "dynamo"], default="memory")
+    parser.add_argument("--endpoint-url", default=LOCALSTACK_ENDPOINT_URL)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--executor",
+        choices=["thread", "process"],
+        default="process",
+        help=(
+            "Threads share the handler's per-invocation state (log buffer, "
+            "trace, retry deadline), which assumes one invocation per process "
+            "like Lambda, so only use them for code that doesn't depend on it"
+        ),
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed-actions", type=int, default=50)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    table = None
+    table_name = f"bench-load-{uuid.uuid4().hex[:8]}"
+    endpoint_url = args.endpoint_url or None
+    configure_environment(table_name, endpoint_url, repository_backend=args.backend)
+    # Every module's Logger shares the service's underlying stdlib logger
+    logging.getLogger("gw-api").setLevel(args.log_level)
+    os.environ["LOG_LEVEL"] = args.log_level
+    if args.backend == "dynamo":
+        table = create_table(table_name, endpoint_url)
+
+    executor_cls = (
+        ProcessPoolExecutor if args.executor == "process" else ThreadPoolExecutor
+    )
+    per_worker = [args.requests // args.concurrency] * args.concurrency
+    per_worker[0] += args.requests % args.concurrency
+    try:
+        with executor_cls(max_workers=args.concurrency) as pool:
+            futures = [
+                pool.submit(worker, n, mix, args.seed_actions) for n in per_worker
+            ]
+            results = [f.result() for f in futures]
+    finally:
+        if table is not None:
+            table.delete()
+
+    samples = [sample for worker_samples, _, _ in results for sample in worker_samples]
+    elapsed = max(end for *_, end in results) - min(start for _, start, _ in results)
+    print(json.dumps(report(samples, elapsed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
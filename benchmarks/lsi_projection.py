@@ -0,0 +1,85 @@
+"""
+Compare write cost and read latency of the LSIs deployed with an ALL versus an
+INCLUDE projection.
+
+Run against localstack (the default) or, by passing an empty --endpoint-url,
+against real DynamoDB. Consumed capacity reported by localstack is only an
+approximation of what DynamoDB bills.
+
+    poetry run python -m benchmarks.lsi_projection --actions 500
+"""
+import argparse
+import json
+import time
+import typing as t
+import uuid
+
+from benchmarks.common import (
+    LOCALSTACK_ENDPOINT_URL,
+    configure_environment,
+    create_table,
+    summarize,
+)
+
+from api.models import Action, ActionStatus
+from api.repository import DynamoActionRepository
+
+
+def run(projection: str, args: argparse.Namespace) -> t.Dict[str, t.Any]:
+    table_name = f"bench-lsi-{projection.lower()}-{uuid.uuid4().hex[:8]}"
+    configure_environment(
+        table_name, args.endpoint_url or None, dynamo_lsi_projection=projection
+    )
+    table = create_table(table_name, args.endpoint_url or None, projection)
+    try:
+        repo = DynamoActionRepository()
+        user_id = uuid.uuid4()
+        actions = [
+            Action(
+                created_by=user_id,
+                status=ActionStatus.SUCCEEDED,
+                details={"payload": "x" * args.details_bytes},
+            )
+            for _ in range(args.actions)
+        ]
+
+        write_units = 0.0
+        for action in actions:
+            response = repo.table.put_item(
+                Item=repo.action_to_item(action, repo.settings),
+                ReturnConsumedCapacity="INDEXES",
+            )
+            write_units += response.get("ConsumedCapacity", {}).get(
+                "CapacityUnits", 0.0
+            )
+
+        results: t.Dict[str, t.Any] = {
+            "projection": projection,
+            "write_capacity_units": write_units,
+        }
+        for with_details in (False, True):
+            samples = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                repo.get_actions_by_created_at(str(user_id), with_details=with_details)
+                samples.append(time.perf_counter() - start)
+            results[f"read_with_details={with_details}"] = summarize(samples)
+        return results
+    finally:
+        table.delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--endpoint-url", default=LOCALSTACK_ENDPOINT_URL)
+    parser.add_argument("--actions", type=int, default=200)
+    parser.add_argument("--details-bytes", type=int, default=2_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    for projection in ("ALL", "INCLUDE"):
+        print(json.dumps(run(projection, args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Serve index.handler over HTTP, translating each request into the event API
+Gateway's REST proxy integration would send, so that standard HTTP load tools
+(wrk, hey, k6, ...) can be pointed at a local stack.
+
+Each worker is a forked process that serves one request at a time, like a
+Lambda execution environment, and keeps its own warm state (repository,
+clients, caches) between requests. With the in-memory repository every worker
+therefore has its own actions.
+
+    poetry run python -m benchmarks.server --workers 8 --backend dynamo
+
+The module's `app` is a plain WSGI application, so it can be run under any WSGI
+server instead, e.g. `gunicorn -w 8 benchmarks.server:app`.
+"""
+import argparse
+import base64
+import functools
+import http.client
+import logging
+import os
+import re
+import signal
+import sys
+import typing as t
+import uuid
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from benchmarks.common import (
+    LOCALSTACK_ENDPOINT_URL,
+    LambdaContext,
+    apigateway_event,
+    configure_environment,
+    create_table,
+)
+
+# The API's resources with path parameters, as deployed by cdk/stack.py.
+# Anything else is passed through as a resource of its own
+RESOURCES = [
+    (re.compile(r"^/actions/stats$"), "/actions/stats"),
+    (re.compile(r"^/actions/(?P<action_id>[^/]+)$"), "/actions/{action_id}"),
+]
+
+
+def to_event(environ: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    """
+    Build the proxy integration event for a WSGI request.
+    """
+    path = environ.get("PATH_INFO") or "/"
+    resource, path_parameters = path, None
+    for pattern, name in RESOURCES:
+        match = pattern.match(path)
+        if match:
+            resource, path_parameters = name, match.groupdict() or None
+            break
+
+    multi_query = parse_qs(environ.get("QUERY_STRING", ""), keep_blank_values=True)
+    headers: t.Dict[str, str] = {}
+    for key, value in environ.items():
+        if key.startswith("HTTP_"):
+            name = key[5:]
+        elif key in ("CONTENT_TYPE", "CONTENT_LENGTH") and value:
+            name = key
+        else:
+            continue
+        headers[name.replace("_", "-").title()] = value
+
+    length = int(environ.get("CONTENT_LENGTH") or 0)
+    body = environ["wsgi.input"].read(length).decode() if length else None
+
+    event = apigateway_event(
+        environ["REQUEST_METHOD"],
+        path,
+        # API Gateway keeps the last of repeated parameters
+        query={k: v[-1] for k, v in multi_query.items()} or None,
+        path_parameters=path_parameters,
+        headers=headers,
+        body=body,
+    )
+    event["resource"] = event["requestContext"]["resourcePath"] = resource
+    event["multiValueQueryStringParameters"] = multi_query or None
+    return event
+
+
+@functools.lru_cache(maxsize=None)
+def _handler() -> t.Callable:
+    # Imported on first use so that each worker initializes the Lambda code
+    # itself, after the environment has been configured and the process forked
+    from api.index import handler
+
+    return handler
+
+
+def app(environ: t.Dict[str, t.Any], start_response: t.Callable) -> t.List[bytes]:
+    context = LambdaContext(aws_request_id=str(uuid.uuid4()))
+    response = _handler()(to_event(environ), context)
+
+    body = response.get("body") or ""
+    if response.get("isBase64Encoded"):
+        payload = base64.b64decode(body)
+    else:
+        payload = body.encode()
+    headers = [(k, str(v)) for k, v in (response.get("headers") or {}).items()]
+    for k, values in (response.get("multiValueHeaders") or {}).items():
+        headers.extend((k, str(v)) for v in values)
+    headers.append(("Content-Length", str(len(payload))))
+
+    status = response["statusCode"]
+    start_response(f"{status} {http.client.responses.get(status, '')}", headers)
+    return [payload]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str, port: int, workers: int, access_log: bool):
+    """
+    Bind the listening socket once and fork `workers` processes which all
+    accept connections from it, until interrupted.
+    """
+    server = make_server(
+        host,
+        port,
+        app,
+        handler_class=WSGIRequestHandler if access_log else QuietRequestHandler,
+    )
+    print(f"Serving on http://{host}:{server.server_port} with {workers} workers")
+    sys.stdout.flush()
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
+    server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=["memory", "dynamo"], default="memory")
+    parser.add_argument("--endpoint-url", default=LOCALSTACK_ENDPOINT_URL)
+    parser.add_argument(
+        "--table", help="Serve an existing table rather than a temporary one"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args()
+
+    table = None
+    table_name = args.table or f"bench-server-{uuid.uuid4().hex[:8]}"
+    endpoint_url = args.endpoint_url or None
+    configure_environment(table_name, endpoint_url, repository_backend=args.backend)
+    # Every module's Logger shares the service's underlying stdlib logger
+    logging.getLogger("gw-api").setLevel(args.log_level)
+    os.environ["LOG_LEVEL"] = args.log_level
+    if args.backend == "dynamo" and args.table is None:
+        table = create_table(table_name, endpoint_url)
+
+    try:
+        serve(args.host, args.port, args.workers, args.access_log)
+    finally:
+        if table is not None:
+            table.delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,27 @@ from aws_cdk import core as cdk
 from aws_cdk.aws_lambda_python import PythonFunction
 from aws_cdk.aws_logs import RetentionDays
 
+# Keep in sync with api.repository.INDEX_INCLUDED_ATTRIBUTES
+INDEX_INCLUDED_ATTRIBUTES = ["expires_at", "v", "c", "f", "m", "st"]
+
 
 class LambdaStack(cdk.Stack):
     def __init__(self, scope: cdk.Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         cdk.Tags.of(self).add("StackName", construct_id)
 
+        # Projecting only the keys and hot attributes into the LSIs keeps the
+        # per-write index cost and item collection size down; full details are
+        # then fetched from the base table on demand
+        lsi_projection = self.node.try_get_context("lsi_projection") or "ALL"
+        if lsi_projection == "INCLUDE":
+            lsi_projection_kwargs = {
+                "projection_type": dynamo.ProjectionType.INCLUDE,
+                "non_key_attributes": INDEX_INCLUDED_ATTRIBUTES,
+            }
+        else:
+            lsi_projection_kwargs = {"projection_type": dynamo.ProjectionType.ALL}
+
         table = dynamo.Table(
             self,
             "DynamoTable",
@@ -23,29 +38,66 @@ class LambdaStack(cdk.Stack):
             ),
             billing_mode=dynamo.BillingMode.PAY_PER_REQUEST,
             time_to_live_attribute="expires_at",
+            # Feeds the per-user stats, including removals by TTL
+            stream=dynamo.StreamViewType.NEW_AND_OLD_IMAGES,
         )
         table.add_local_secondary_index(
             index_name="CreatedAtLSI",
             sort_key=dynamo.Attribute(
                 name="created_at#id", type=dynamo.AttributeType.STRING
             ),
-            projection_type=dynamo.ProjectionType.ALL,
+            **lsi_projection_kwargs,
         )
         table.add_local_secondary_index(
             index_name="CompletedAtLSI",
             sort_key=dynamo.Attribute(
                 name="completed_at#id", type=dynamo.AttributeType.STRING
             ),
-            projection_type=dynamo.ProjectionType.ALL,
+            **lsi_projection_kwargs,
         )
         table.add_local_secondary_index(
             index_name="ActionStatusLSI",
             sort_key=dynamo.Attribute(
                 name="status#id", type=dynamo.AttributeType.STRING
             ),
-            projection_type=dynamo.ProjectionType.ALL,
+            **lsi_projection_kwargs,
         )
 
+        # CloudFormation creates at most one GSI per table update. A stack that
+        # predates them is updated once per index, each time naming the ones
+        # to have so far, e.g. -c global_indexes=TimeBucketGSI
+        global_indexes = self.node.try_get_context("global_indexes")
+        wanted_indexes = global_indexes.split(",") if global_indexes else None
+
+        # Lets operators query every user's actions by creation time without a
+        # scan, see api.repository.TIME_BUCKET_INDEX
+        if wanted_indexes is None or "TimeBucketGSI" in wanted_indexes:
+            table.add_global_secondary_index(
+                index_name="TimeBucketGSI",
+                partition_key=dynamo.Attribute(
+                    name="bucket", type=dynamo.AttributeType.STRING
+                ),
+                sort_key=dynamo.Attribute(
+                    name="status#id", type=dynamo.AttributeType.STRING
+                ),
+                projection_type=dynamo.ProjectionType.INCLUDE,
+                non_key_attributes=INDEX_INCLUDED_ATTRIBUTES,
+            )
+        # Delta sync reads each user's actions by when they last changed, see
+        # api.repository.UPDATED_AT_INDEX. Every read needs whole actions, so
+        # they're projected in full rather than fetched from the table
+        if wanted_indexes is None or "UpdatedAtGSI" in wanted_indexes:
+            table.add_global_secondary_index(
+                index_name="UpdatedAtGSI",
+                partition_key=dynamo.Attribute(
+                    name="created_by", type=dynamo.AttributeType.STRING
+                ),
+                sort_key=dynamo.Attribute(
+                    name="updated_at#id", type=dynamo.AttributeType.STRING
+                ),
+                projection_type=dynamo.ProjectionType.ALL,
+            )
+
         backend = PythonFunction(
             self,
             "LitLambdaHandler",
@@ -54,21 +106,119 @@ class LambdaStack(cdk.Stack):
             handler="handler",
             runtime=lambda_.Runtime.PYTHON_3_8,
             log_retention=RetentionDays.ONE_WEEK,
-            timeout=cdk.Duration.seconds(3),
-            environment={"APP_DYNAMO_TABLE_NAME": table.table_name},
+            # Long enough for GET /actions/{action_id}?wait= to hold a request
+            # for APP_STATUS_MAX_WAIT_S, and within API Gateway's 29s limit.
+            # Other requests stop retrying within APP_REQUEST_DEADLINE_MS, and
+            # time out each DynamoDB call well within it
+            timeout=cdk.Duration.seconds(25),
+            environment={
+                "APP_DYNAMO_TABLE_NAME": table.table_name,
+                "APP_DYNAMO_LSI_PROJECTION": lsi_projection,
+            },
         )
+        # Only while upgrading a table to status#ids with created_at in them
+        if self.node.try_get_context("legacy_status_ids"):
+            backend.add_environment("APP_DYNAMO_LEGACY_STATUS_IDS", "true")
         table.grant_read_write_data(backend.grant_principal)
 
+        stats_consumer = PythonFunction(
+            self,
+            "LitLambdaStatsConsumer",
+            entry="lit_lambdas",
+            index="api/streams.py",
+            handler="handler",
+            runtime=lambda_.Runtime.PYTHON_3_8,
+            log_retention=RetentionDays.ONE_WEEK,
+            timeout=cdk.Duration.seconds(30),
+            environment={"APP_DYNAMO_TABLE_NAME": table.table_name},
+        )
+        table.grant_read_write_data(stats_consumer.grant_principal)
+        table.grant_stream_read(stats_consumer)
+        stats_consumer.add_event_source_mapping(
+            "TableStream",
+            event_source_arn=table.table_stream_arn,
+            starting_position=lambda_.StartingPosition.TRIM_HORIZON,
+            batch_size=100,
+            max_batching_window=cdk.Duration.seconds(5),
+            bisect_batch_on_error=True,
+            retry_attempts=10,
+        )
+
+        # Environments created for provisioned concurrency warm themselves up
+        # during their init phase, see api/index.py
+        api_handler: lambda_.IFunction = backend
+        provisioned_concurrency = self.node.try_get_context("provisioned_concurrency")
+        if provisioned_concurrency:
+            api_handler = lambda_.Alias(
+                self,
+                "LitLambdaHandlerLive",
+                alias_name="live",
+                version=backend.current_version,
+                provisioned_concurrent_executions=int(provisioned_concurrency),
+            )
+
+        # The stage cache answers repeated reads without invoking the lambda,
+        # but ignores the Cache-Control headers the handler sets. It's off
+        # unless api_cache_ttl_s is set, as enumerate pages are then served
+        # stale for up to that long after a write. Action lookups are never
+        # cached since pending actions would be too, as would long polls; only
+        # clients honoring Cache-Control cache finished actions
+        cache_ttl_s = int(self.node.try_get_context("api_cache_ttl_s") or 0)
+        caching_enabled = cache_ttl_s > 0
+        deploy_options = apigateway.StageOptions(
+            cache_cluster_enabled=caching_enabled,
+            cache_cluster_size="0.5" if caching_enabled else None,
+            method_options={
+                "//GET": apigateway.MethodDeploymentOptions(
+                    caching_enabled=caching_enabled,
+                    cache_ttl=cdk.Duration.minutes(5),
+                ),
+                "/actions/GET": apigateway.MethodDeploymentOptions(
+                    caching_enabled=caching_enabled,
+                    cache_ttl=cdk.Duration.seconds(cache_ttl_s),
+                ),
+                "/actions/{action_id}/GET": apigateway.MethodDeploymentOptions(
+                    caching_enabled=False
+                ),
+            },
+        )
+
         api = apigateway.LambdaRestApi(
-            self, "LitLambdaAPI", handler=backend, proxy=False
+            self,
+            "LitLambdaAPI",
+            handler=api_handler,
+            proxy=False,
+            deploy_options=deploy_options,
         )
         api.root.add_method("GET")  # GET /
 
+        # Every query parameter enumerate understands is part of its cache key
+        enumerate_parameters = [
+            f"method.request.querystring.{name}"
+            for name in [
+                "status",
+                "created_at",
+                "completed_at",
+                "limit",
+                "page",
+                "order",
+                "changed_since",
+            ]
+        ]
         provider = api.root.add_resource("actions")
         provider.add_method("POST")  # POST /actions
-        provider.add_method("GET")  # GET /actions
+        provider.add_method(
+            "GET",
+            apigateway.LambdaIntegration(
+                api_handler, cache_key_parameters=enumerate_parameters
+            ),
+            request_parameters={p: False for p in enumerate_parameters},
+        )  # GET /actions
+        provider.add_method("DELETE")  # DELETE /actions
+        provider.add_resource("stats").add_method("GET")  # GET /actions/stats
 
         single_action = provider.add_resource("{action_id}")
         single_action.add_method("DELETE")  # DELETE /actions/{action_id}
+        # Not cached, so that long polls always reach the handler
         single_action.add_method("GET")  # GET /actions/{action_id}
         single_action.add_method("PUT")  # PUT /actions/{action_id}
@@ -0,0 +1,149 @@
+import random
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from mypy_boto3_dynamodb import DynamoDBClient
+
+from api import retries
+from api.config import Settings
+from api.log import logger
+
+# Hard limits imposed by DynamoDB on a single BatchWriteItem/BatchGetItem call
+BATCH_WRITE_MAX_ITEMS = 25
+BATCH_GET_MAX_ITEMS = 100
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def serialize(item: t.Dict) -> t.Dict:
+    return {k: _serializer.serialize(v) for k, v in item.items()}
+
+
+def deserialize(item: t.Dict) -> t.Dict:
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+def chunked(seq: t.Sequence, size: int) -> t.Iterator[t.Sequence]:
+    for i in range(0, len(seq), size):
+        yield seq[i : i + size]
+
+
+def _backoff(attempt: int, settings: Settings) -> bool:
+    """
+    Sleep before retrying, unless that would run past the invocation's
+    deadline. Returns whether the retry should go ahead.
+    """
+    # Full jitter exponential backoff so that parallel workers don't retry in
+    # lockstep against the same partition
+    delay = random.uniform(0, settings.dynamo_batch_retry_base_delay_s * (2**attempt))
+    if not retries.deadline_allows(delay, settings):
+        return False
+    time.sleep(delay)
+    return True
+
+
+def run_chunks(fn: t.Callable, chunks: t.List, settings: Settings) -> t.List:
+    if len(chunks) <= 1:
+        return [fn(c) for c in chunks]
+    workers = min(settings.dynamo_batch_max_workers, len(chunks))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, chunks))
+
+
+def _batch_write(
+    db: DynamoDBClient, requests: t.Sequence[t.Dict], settings: Settings
+) -> int:
+    """
+    Submit a single BatchWriteItem chunk, retrying any unprocessed requests.
+    Returns the number of requests that could not be processed.
+    """
+    table_name = settings.dynamo_table_name
+    pending: t.Dict = {table_name: list(requests)}
+    attempts = 0
+    while attempts <= settings.dynamo_batch_max_retries:
+        if attempts and not _backoff(attempts, settings):
+            break
+        attempts += 1
+        response = db.batch_write_item(RequestItems=pending)
+        pending = response.get("UnprocessedItems") or {}
+        if not pending:
+            return 0
+
+    unprocessed = len(pending.get(table_name, []))
+    logger.warning(
+        "Unable to process all batch write requests",
+        extra={"unprocessed": unprocessed, "attempts": attempts},
+    )
+    return unprocessed
+
+
+def _batch_get(
+    db: DynamoDBClient, keys: t.Sequence[t.Dict], settings: Settings
+) -> t.List[t.Dict]:
+    """
+    Submit a single BatchGetItem chunk, retrying any unprocessed keys.
+    """
+    table_name = settings.dynamo_table_name
+    pending: t.Dict = {table_name: {"Keys": list(keys)}}
+    items: t.List[t.Dict] = []
+    attempts = 0
+    while attempts <= settings.dynamo_batch_max_retries:
+        if attempts and not _backoff(attempts, settings):
+            break
+        attempts += 1
+        response = db.batch_get_item(RequestItems=pending)
+        items.extend(response.get("Responses", {}).get(table_name, []))
+        pending = response.get("UnprocessedKeys") or {}
+        if not pending:
+            return items
+
+    logger.warning(
+        "Unable to retrieve all batch get keys",
+        extra={
+            "unprocessed": len(pending.get(table_name, {}).get("Keys", [])),
+            "attempts": attempts,
+        },
+    )
+    return items
+
+
+def write_requests(db: DynamoDBClient, requests: t.List[t.Dict]) -> int:
+    """
+    Run the write requests in parallel chunks and return how many succeeded.
+    """
+    settings = Settings()
+    chunks = list(chunked(requests, BATCH_WRITE_MAX_ITEMS))
+    unprocessed = run_chunks(lambda c: _batch_write(db, c, settings), chunks, settings)
+    return len(requests) - sum(unprocessed)
+
+
+def _unique_keys(keys: t.Iterable[t.Dict]) -> t.List[t.Dict]:
+    # A single batch call rejects duplicate keys, so they're dropped up front
+    unique = {tuple(sorted((k, str(v)) for k, v in key.items())): key for key in keys}
+    return list(unique.values())
+
+
+def get_items(db: DynamoDBClient, keys: t.Iterable[t.Dict]) -> t.List[t.Dict]:
+    """
+    Fetch items by their (unserialized) primary keys using parallel, chunked
+    BatchGetItem calls. Items are returned in no particular order.
+    """
+    settings = Settings()
+    serialized_keys = _unique_keys(serialize(key) for key in keys)
+    chunks = list(chunked(serialized_keys, BATCH_GET_MAX_ITEMS))
+    results = run_chunks(lambda c: _batch_get(db, c, settings), chunks, settings)
+    return [deserialize(item) for items in results for item in items]
+
+
+def delete_keys(db: DynamoDBClient, keys: t.Iterable[t.Dict]) -> int:
+    """
+    Delete items by their serialized primary keys using parallel, chunked
+    BatchWriteItem calls. Returns the number of delete requests processed,
+    which includes any for items that no longer existed: BatchWriteItem
+    doesn't support ReturnValues to tell them apart.
+    """
+    requests = [{"DeleteRequest": {"Key": key}} for key in _unique_keys(keys)]
+    return write_requests(db, requests)
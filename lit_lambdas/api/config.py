@@ -5,19 +5,98 @@ from pydantic import BaseSettings
 
 
 class Settings(BaseSettings):
+    eager_initialization: bool = False
+    # "memory" keeps actions in process, which is only meant for load testing
+    repository_backend: t.Literal["dynamo", "memory"] = "dynamo"
+
     dynamo_table_name: str = "actions"
     dynamo_endpoint_url: t.Optional[str] = None
     dynamo_item_ttl_s: int = 60 * 60 * 24 * 31  # 1 month
+    # Changing the shard count makes previously written actions unreachable,
+    # so it must only be changed alongside a migration of existing items
+    dynamo_shard_count: int = 1
+    dynamo_query_max_workers: int = 4
+    # Layout of the cross-user TimeBucketGSI. Changing either leaves existing
+    # actions in the wrong buckets until scripts.backfill_time_buckets is run
+    dynamo_time_bucket_s: int = 60 * 60 * 24
+    dynamo_time_bucket_shards: int = 4
+    # Whether to also read actions whose status#id predates it embedding
+    # created_at. That reads every such action on each status query, so only
+    # turn it on while upgrading a table until scripts.backfill_status_id has
+    # rewritten them
+    dynamo_legacy_status_ids: bool = False
+    # How far behind the latest writes a delta sync cursor is held, to allow
+    # for the UpdatedAtGSI trailing the table. Changes within it are returned
+    # again by the next poll
+    changes_settle_s: int = 5
+    # See LEGACY_ITEM_FORMAT and COMPACT_ITEM_FORMAT in api.repository
+    dynamo_item_format: int = 1
+    dynamo_details_compression_threshold_bytes: int = 1024
+    # Must match the projection the LSIs were deployed with: "ALL" or "INCLUDE"
+    dynamo_lsi_projection: t.Literal["ALL", "INCLUDE"] = "ALL"
+    dynamo_batch_max_workers: int = 4
+    dynamo_batch_max_retries: int = 5
+    dynamo_batch_retry_base_delay_s: float = 0.05
 
     boto_client_region_name: str = "us-east-1"
-    boto_client_connection_timeout: int = 30
+    # Kept well inside request_deadline_ms, so that a stalled connection fails
+    # and is retried, or given up on at the deadline, rather than holding the
+    # handler until its own timeout
+    boto_client_connection_timeout: float = 1
+    boto_client_read_timeout: float = 1.5
     boto_client_connection_retries: int = 2
+    # "adaptive" adds a client side token bucket that slows every caller in the
+    # process down once DynamoDB starts throttling
+    boto_client_retry_mode: t.Literal["legacy", "standard", "adaptive"] = "adaptive"
+    # Retries stop once less than this much of the invocation's time is left
+    boto_client_deadline_margin_ms: int = 300
+    # The time requests other than long polls have, whatever is left of the
+    # invocation: the handler's timeout is raised to make room for long polls.
+    # Must leave room for one attempt's connection and read timeouts
+    request_deadline_ms: int = 3000
+
+    metrics_namespace: str = "gw-api"
+    # Trace allocations to report each invocation's peak memory, see api.memory
+    memory_profiling: bool = False
+    # Time each phase of an invocation, see api.tracing. Traces are exported
+    # with tracing on, and summed up in a Server-Timing response header with
+    # server_timing on
+    tracing: bool = False
+    server_timing: bool = False
+
+    # Bounds on GET /actions/{action_id}?wait=, see api.longpoll. The handler's
+    # timeout in cdk/stack.py has to leave room for the longest wait, which is
+    # the only request given all of it
+    status_max_wait_s: float = 20
+    status_wait_initial_interval_s: float = 0.1
+    status_wait_max_interval_s: float = 1.0
+
+    # Cache-Control max-age for responses that can't change: finished actions
+    # and the introspection document
+    finished_action_max_age_s: int = 60 * 60
+    introspect_max_age_s: int = 60 * 5
+
+    # How long a POST's Idempotency-Key is remembered, in DynamoDB and in the
+    # process. The in-process copy must expire well before the durable one
+    idempotency_ttl_s: int = 60 * 60 * 24
+    idempotency_cache_size: int = 1024
+    idempotency_cache_ttl_s: int = 60
+
+    # Chance that an invocation keeps its sub-WARNING logs, per route name, e.g.
+    # APP_LOG_SAMPLE_RATES='{"enumerate": 0.01}'. Failed invocations keep all
+    log_sample_rates: t.Dict[str, float] = {}
+    log_default_sample_rate: float = 1.0
+    log_buffer_capacity: int = 1000
 
     @property
     def boto_client_config(self) -> BotoClientConfig:
         return BotoClientConfig(
             connect_timeout=self.boto_client_connection_timeout,
-            retries={"total_max_attempts": self.boto_client_connection_retries},
+            read_timeout=self.boto_client_read_timeout,
+            retries={
+                "total_max_attempts": self.boto_client_connection_retries,
+                "mode": self.boto_client_retry_mode,
+            },
             region_name=self.boto_client_region_name,
         )
 
@@ -1,62 +1,169 @@
+import typing as t
 import uuid
 
-from aws_lambda_powertools import Logger
 from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
 from pydantic import ValidationError
 
-from api.models import Action, EnumerationQueryArgs, LambdaResponse
-from api.repository import DynamoActionRepository
-from api.responses import BadRequest, NotFound, Ok
-
-logger = Logger(service="gw-api", utc=True)
+from api import idempotency, longpoll, tracing
+from api.config import Settings
+from api.idempotency import idempotency_key, replayed
+from api.log import Lazy, logger
+from api.models import (
+    Action,
+    LambdaResponse,
+    PurgeQueryArgs,
+    StatusQueryArgs,
+)
+from api.qargs import UNBOUNDED_RANGE, parse_enumeration_args
+from api.repository import TimeField, get_repository
+from api.responses import (
+    CHANGES_CURSOR_HEADER,
+    MORE_CHANGES_HEADER,
+    NEXT_PAGE_HEADER,
+    BadRequest,
+    NotFound,
+    Ok,
+)
+
+
+def warmup() -> LambdaResponse:
+    """
+    Initialize everything on the request hot path without touching the table.
+    """
+    get_repository().warmup()
+    parse_enumeration_args({})
+    Ok.as_json(Action(details={"endpoint": "warmup"}, created_by=uuid.UUID(int=0)))
+    return Ok.as_json({"warm": True})
 
 
 def introspect(context) -> LambdaResponse:
-    return Ok.as_json({"version": context.function_version, "schema": ""})
+    return Ok.as_json(
+        {"version": context.function_version, "schema": ""},
+        max_age_s=Settings().introspect_max_age_s,
+    )
+
+
+def _query_args(event: APIGatewayProxyEvent) -> t.Dict[str, str]:
+    """
+    Collapse repeated query parameters into the comma separated form the query
+    argument models parse, so ?status=A&status=B is the same as ?status=A,B
+    """
+    raw_qargs = dict(event["queryStringParameters"] or {})
+    multi_qargs = event.get("multiValueQueryStringParameters") or {}
+    for name, values in multi_qargs.items():
+        if values and len(values) > 1:
+            raw_qargs[name] = ",".join(values)
+    return raw_qargs
 
 
 def enumerate(event: APIGatewayProxyEvent) -> LambdaResponse:
-    raw_qargs = (
-        {} if event["queryStringParameters"] is None else event["queryStringParameters"]
-    )
     try:
-        qargs = EnumerationQueryArgs(**raw_qargs)
+        with tracing.span("parse"):
+            qargs = parse_enumeration_args(_query_args(event))
     except ValidationError as ve:
-        logger.info("Unable to parse query args", extra={"errors": ve.errors()})
+        logger.info("Unable to parse query args", extra={"errors": Lazy(ve.errors)})
         return BadRequest.as_json(ve.errors())
 
     uid = str(uuid.UUID(int=0))
-    repo = DynamoActionRepository()
-    if qargs.status:
-        result = repo.get_actions_by_status(uid, qargs.status)
-    elif qargs.created_at:
-        result = repo.get_actions_by_created_at(
-            uid, since=qargs.created_at.since, until=qargs.created_at.until
-        )
-    elif qargs.completed_at:
-        result = repo.get_actions_by_completed_at(
-            uid, since=qargs.completed_at.since, until=qargs.completed_at.until
+    repo = get_repository()
+    if qargs.changed_since is not None:
+        return changes(uid, qargs.changed_since or None, qargs.limit)
+
+    field: TimeField = "completed_at" if qargs.completed_at else "created_at"
+    time_range = qargs.created_at or qargs.completed_at
+    if not (qargs.status or time_range):
+        if not qargs.paginated:
+            return Ok.as_json(repo.enumerate_actions_for_user(uid))
+        # Ordering and limits need a sort key, so fall back to creation time
+        time_range = UNBOUNDED_RANGE
+
+    try:
+        if qargs.status:
+            page = repo.get_actions_by_statuses(
+                uid,
+                qargs.status,
+                limit=qargs.limit,
+                page=qargs.page,
+                descending=qargs.descending,
+            )
+        else:
+            assert time_range
+            page = repo.get_actions_by_time(
+                uid,
+                field,
+                since=time_range.since,
+                until=time_range.until,
+                limit=qargs.limit,
+                page=qargs.page,
+                descending=qargs.descending,
+            )
+    except ValueError as e:
+        return BadRequest.as_json(str(e))
+
+    headers = None
+    if page.next_page is not None:
+        headers = {NEXT_PAGE_HEADER: page.next_page}
+    return Ok.as_json(page.actions, headers=headers)
+
+
+def changes(
+    user_id: str, cursor: t.Optional[str], limit: t.Optional[int]
+) -> LambdaResponse:
+    try:
+        changed = get_repository().get_actions_changed_since(
+            user_id, cursor, limit=limit
         )
-    else:
-        result = repo.enumerate_actions_for_user(uid)
-    return Ok.as_json(result)
+    except ValueError as e:
+        return BadRequest.as_json(str(e))
+
+    headers = {CHANGES_CURSOR_HEADER: changed.cursor}
+    if changed.has_more:
+        headers[MORE_CHANGES_HEADER] = "true"
+    return Ok.as_json(changed.actions, headers=headers)
 
 
 def run(event: APIGatewayProxyEvent) -> LambdaResponse:
+    try:
+        key = idempotency_key(event)
+    except ValueError as e:
+        return BadRequest.as_json(str(e))
+
     # Do something interesting
-    repo = DynamoActionRepository()
+    repo = get_repository()
     action = Action(details={"endpoint": "run"}, created_by=uuid.UUID(int=0))
-    repo.store_actions(action)
-    return Ok.as_json(action)
+    if key is None:
+        repo.store_actions(action)
+        return Ok.as_json(action)
+
+    uid = str(action.created_by)
+    cached = idempotency.cache.get(uid, key)
+    if cached is not None:
+        return replayed(cached)
+
+    response = Ok.as_json(action)
+    previous = repo.store_action_idempotently(action, key, response)
+    idempotency.cache.put(uid, key, previous or response)
+    return response if previous is None else replayed(previous)
 
 
 def status(event: APIGatewayProxyEvent) -> LambdaResponse:
+    try:
+        with tracing.span("parse"):
+            qargs = StatusQueryArgs(**_query_args(event))
+    except ValidationError as ve:
+        logger.info("Unable to parse query args", extra={"errors": Lazy(ve.errors)})
+        return BadRequest.as_json(ve.errors())
+
     uid = str(uuid.UUID(int=0))
-    repo = DynamoActionRepository()
+    repo = get_repository()
 
     assert event.path_parameters
     action_id = event.path_parameters["action_id"]
     action = repo.get_action_by_id(uid, action_id)
+    if action is not None and qargs.wait:
+        action = longpoll.wait_for_change(
+            lambda: repo.get_action_by_id(uid, action_id), action, qargs.wait
+        )
 
     if action is None:
         logger.info(
@@ -66,9 +173,42 @@ def status(event: APIGatewayProxyEvent) -> LambdaResponse:
     return Ok.as_json(action)
 
 
+def stats(event: APIGatewayProxyEvent) -> LambdaResponse:
+    uid = str(uuid.UUID(int=0))
+    return Ok.as_json(get_repository().get_action_stats(uid).dict())
+
+
 def cancel(event: APIGatewayProxyEvent) -> LambdaResponse:
     return Ok.as_json({"Endpoint": "cancel"})
 
 
 def release(event: APIGatewayProxyEvent) -> LambdaResponse:
-    return Ok.as_json({"Endpoint": "release"})
+    uid = str(uuid.UUID(int=0))
+    repo = get_repository()
+
+    assert event.path_parameters
+    action_id = event.path_parameters["action_id"]
+    action = repo.get_action_by_id(uid, action_id)
+
+    if action is None:
+        logger.info(
+            "Unable to find Action", extra={"user_id": uid, "action_id": action_id}
+        )
+        return NotFound.as_json(f"Action with ID {action_id} was not found.")
+    repo.delete_actions(action)
+    return Ok.as_json(action, max_age_s=0)
+
+
+def purge(event: APIGatewayProxyEvent) -> LambdaResponse:
+    try:
+        with tracing.span("parse"):
+            qargs = PurgeQueryArgs(**_query_args(event))
+    except ValidationError as ve:
+        logger.info("Unable to parse query args", extra={"errors": Lazy(ve.errors)})
+        return BadRequest.as_json(ve.errors())
+
+    uid = str(uuid.UUID(int=0))
+    repo = get_repository()
+    # Counts delete requests, see ActionRepository.delete_actions
+    deleted = repo.purge_actions(uid, status=qargs.status, older_than=qargs.older_than)
+    return Ok.as_json({"deleted": deleted})
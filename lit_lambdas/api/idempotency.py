@@ -0,0 +1,86 @@
+import string
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+
+from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+
+from api.config import Settings
+from api.models import LambdaResponse
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+# Set on responses replayed from an earlier request with the same key
+IDEMPOTENT_REPLAYED_HEADER = "Idempotent-Replayed"
+
+MAX_KEY_LENGTH = 255
+_KEY_CHARACTERS = set(string.ascii_letters + string.digits + "-_.:")
+
+
+def idempotency_key(event: APIGatewayProxyEvent) -> t.Optional[str]:
+    """
+    Get the request's idempotency key, if it sent one. Raises a ValueError for
+    keys that can't be used.
+    """
+    key = event.get_header_value(IDEMPOTENCY_KEY_HEADER, case_sensitive=False)
+    if key is None:
+        return None
+    if not 0 < len(key) <= MAX_KEY_LENGTH or not set(key) <= _KEY_CHARACTERS:
+        raise ValueError(
+            f"{IDEMPOTENCY_KEY_HEADER} must be 1 to {MAX_KEY_LENGTH} letters, "
+            "digits or any of -_.:"
+        )
+    return key
+
+
+def replayed(response: LambdaResponse) -> LambdaResponse:
+    return {
+        **response,
+        "headers": {**response["headers"], IDEMPOTENT_REPLAYED_HEADER: "true"},
+    }
+
+
+class ResponseCache:
+    """
+    A small LRU of recent responses by user and idempotency key, so that hot
+    retries landing on the same warm Lambda skip the round trip to DynamoDB.
+    Entries must expire well before the durable record does.
+    """
+
+    def __init__(self, max_size: int, ttl_s: float):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.lock = threading.Lock()
+        self.entries: t.OrderedDict[
+            t.Tuple[str, str], t.Tuple[float, LambdaResponse]
+        ] = OrderedDict()
+
+    def get(self, user_id: str, key: str) -> t.Optional[LambdaResponse]:
+        with self.lock:
+            entry = self.entries.get((user_id, key))
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at < time.monotonic():
+                del self.entries[(user_id, key)]
+                return None
+            self.entries.move_to_end((user_id, key))
+            return response
+
+    def put(self, user_id: str, key: str, response: LambdaResponse):
+        with self.lock:
+            self.entries[(user_id, key)] = (time.monotonic() + self.ttl_s, response)
+            self.entries.move_to_end((user_id, key))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_settings = Settings()
+
+cache = ResponseCache(
+    _settings.idempotency_cache_size, _settings.idempotency_cache_ttl_s
+)
@@ -1,38 +1,133 @@
-from os import stat
+import os
+import typing as t
 
-from aws_lambda_powertools import Logger
 from aws_lambda_powertools.utilities.data_classes import (
     APIGatewayProxyEvent,
     event_source,
 )
 
-from api.endpoints import enumerate, introspect, release, run, status
+from api import log, memory, retries, tracing
+from api.config import Settings
+from api.endpoints import (
+    enumerate,
+    introspect,
+    purge,
+    release,
+    run,
+    stats,
+    status,
+    warmup,
+)
+from api.log import logger
 from api.models import HttpMethod, LambdaResponse
-from api.responses import NotFound
+from api.responses import InternalServerError, NotFound
 
-logger = Logger(service="gw-api", utc=True)
+settings = Settings()
 
+Endpoint = t.Callable[[APIGatewayProxyEvent, t.Any], LambdaResponse]
+
+# Warmup pings aren't API Gateway events, so dispatch handles them itself
+ENDPOINTS: t.Dict[str, Endpoint] = {
+    "introspect": lambda event, context: introspect(context),
+    "enumerate": lambda event, context: enumerate(event),
+    "run": lambda event, context: run(event),
+    "purge": lambda event, context: purge(event),
+    "stats": lambda event, context: stats(event),
+    "status": lambda event, context: status(event),
+    "release": lambda event, context: release(event),
+}
+
+
+def route(event: APIGatewayProxyEvent) -> t.Optional[str]:
+    """
+    Name the endpoint an event should be dispatched to, if any.
+    """
+    # Scheduled pings send {"warmup": true} rather than an API Gateway event
+    if event.get("warmup") is True:
+        return "warmup"
 
-@logger.inject_lambda_context
-@event_source(data_class=APIGatewayProxyEvent)
-def handler(event: APIGatewayProxyEvent, context) -> LambdaResponse:
-    logger.set_correlation_id(event.request_context.request_id)
     if event.path == "/" and event.http_method.upper() == HttpMethod.GET:
-        logger.info("Dispatching event to instrospect")
-        return introspect(context)
+        return "introspect"
     elif event.path == "/actions" and event.http_method == HttpMethod.GET:
-        logger.info("Dispatching event to enumerate")
-        return enumerate(event)
+        return "enumerate"
     elif event.path == "/actions" and event.http_method == HttpMethod.POST:
-        logger.info("Dispatching event to run")
-        return run(event)
+        return "run"
+    elif event.path == "/actions" and event.http_method == HttpMethod.DELETE:
+        return "purge"
+    elif event.path == "/actions/stats" and event.http_method == HttpMethod.GET:
+        return "stats"
     elif event.path.startswith("/actions/") and event.http_method == HttpMethod.GET:
-        logger.info(f"Dispatching event to status")
-        return status(event)
+        return "status"
     elif event.path.startswith("/actions/") and event.http_method == HttpMethod.DELETE:
-        logger.info(f"Dispatching event to release")
-        return release(event)
-    else:
+        return "release"
+    return None
+
+
+@logger.inject_lambda_context
+@event_source(data_class=APIGatewayProxyEvent)
+def handler(event: APIGatewayProxyEvent, context) -> LambdaResponse:
+    name = route(event)
+    log.start_invocation(name or "unknown")
+    retries.set_deadline(deadline_ms(name, event, context))
+    if settings.tracing or settings.server_timing:
+        tracing.start_trace(name or "unknown")
+    failed = True
+    try:
+        with memory.instrumented(name or "unknown", settings):
+            response = dispatch(name, event, context)
+        failed = response["statusCode"] == InternalServerError.http_status
+        return with_trace(response)
+    except Exception:
+        logger.exception("Unhandled error", extra={"route": name})
+        raise
+    finally:
+        tracing.end_trace()
+        retries.set_deadline(None)
+        retries.metrics.flush()
+        log.end_invocation(failed)
+
+
+def deadline_ms(name: t.Optional[str], event: APIGatewayProxyEvent, context) -> int:
+    """
+    How long the invocation has to finish in. Only long polls may use the
+    handler's whole timeout, anything else gets APP_REQUEST_DEADLINE_MS.
+    """
+    remaining = context.get_remaining_time_in_millis()
+    if name == "status" and "wait" in (event.query_string_parameters or {}):
+        return remaining
+    return min(remaining, settings.request_deadline_ms)
+
+
+def with_trace(response: LambdaResponse) -> LambdaResponse:
+    """
+    Finish the invocation's trace, if it's being traced, exporting it and/or
+    adding it to the response as a Server-Timing header.
+    """
+    trace = tracing.end_trace()
+    if trace is None:
+        return response
+    if settings.tracing:
+        tracing.exporter.export(trace)
+    if not settings.server_timing:
+        return response
+    return {
+        **response,
+        "headers": {
+            **response["headers"],
+            tracing.SERVER_TIMING_HEADER: tracing.server_timing(trace),
+        },
+    }
+
+
+def dispatch(
+    name: t.Optional[str], event: APIGatewayProxyEvent, context
+) -> LambdaResponse:
+    if name == "warmup":
+        logger.debug("Dispatching event to warmup")
+        return warmup()
+
+    logger.set_correlation_id(event.request_context.request_id)
+    if name is None:
         logger.warning(
             "Unable to dispatch event",
             extra={
@@ -41,3 +136,15 @@ def handler(event: APIGatewayProxyEvent, context) -> LambdaResponse:
             },
         )
         return NotFound.as_json()
+
+    logger.info(f"Dispatching event to {name}")
+    return ENDPOINTS[name](event, context)
+
+
+# Provisioned concurrency runs the init phase well ahead of any traffic, so pay
+# for the hot path's first-use costs there instead of on the first request
+if (
+    settings.eager_initialization
+    or os.environ.get("AWS_LAMBDA_INITIALIZATION_TYPE") == "provisioned-concurrency"
+):
+    warmup()
@@ -0,0 +1,116 @@
+import logging
+import random
+import sys
+import threading
+import typing as t
+
+from aws_lambda_powertools import Logger
+
+from api.config import Settings
+
+
+class Lazy:
+    """
+    A log `extra` value that is only computed if the record is emitted, e.g.
+    `extra={"errors": Lazy(ve.errors)}`. Records are formatted when the
+    invocation's buffer is flushed, so the callable must not depend on state
+    that changes later in the request.
+    """
+
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: t.Callable[[], t.Any]):
+        self.fn = fn
+
+    def __call__(self) -> t.Any:
+        return self.fn()
+
+
+def _json_default(obj: t.Any) -> t.Any:
+    if isinstance(obj, Lazy):
+        return obj()
+    return str(obj)
+
+
+class BufferingHandler(logging.StreamHandler):
+    """
+    Holds records back during an invocation and writes them out at its end.
+    Records below WARNING are dropped at the end of invocations that were not
+    sampled, unless the invocation failed. Outside an invocation, e.g. during
+    init, records are written straight away. Like retries' deadline and
+    tracing's recorder, this state assumes one invocation per process at a
+    time, as on Lambda, and is shared with the query pool's threads.
+    """
+
+    def __init__(self, capacity: int, stream: t.Optional[t.IO[str]] = None):
+        super().__init__(stream or sys.stdout)
+        self.capacity = capacity
+        self.buffering = False
+        self.sampled = True
+        self.buffer: t.List[logging.LogRecord] = []
+        self.buffer_lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord):
+        if not self.buffering:
+            super().emit(record)
+            return
+        with self.buffer_lock:
+            self.buffer.append(record)
+            full = len(self.buffer) >= self.capacity
+        if full:
+            self.flush_buffer(failed=False)
+
+    def start(self, sampled: bool):
+        self.flush_buffer(failed=False)
+        self.buffering = True
+        self.sampled = sampled
+
+    def flush_buffer(self, failed: bool):
+        with self.buffer_lock:
+            records, self.buffer = self.buffer, []
+        keep_all = self.sampled or failed
+        for record in records:
+            if keep_all or record.levelno >= logging.WARNING:
+                super().emit(record)
+
+    def stop(self, failed: bool):
+        self.flush_buffer(failed)
+        self.buffering = False
+        self.sampled = True
+
+
+_settings = Settings()
+
+# Every module shares this one logger rather than configuring its own
+logger = Logger(
+    service="gw-api",
+    utc=True,
+    logger_handler=BufferingHandler(_settings.log_buffer_capacity),
+    json_default=_json_default,
+)
+
+
+def _buffering_handler() -> t.Optional[BufferingHandler]:
+    # Whichever Logger configured "gw-api" first owns the handler
+    handler = logger.registered_handler
+    return handler if isinstance(handler, BufferingHandler) else None
+
+
+def start_invocation(route: str):
+    """
+    Start buffering the invocation's logs and decide whether `route`'s
+    sampling rate keeps its sub-WARNING records.
+    """
+    handler = _buffering_handler()
+    if handler is not None:
+        rate = _settings.log_sample_rates.get(route, _settings.log_default_sample_rate)
+        handler.start(sampled=random.random() < rate)
+
+
+def end_invocation(failed: bool = False):
+    """
+    Write out the invocation's buffered logs, all of them if it failed.
+    """
+    handler = _buffering_handler()
+    if handler is not None:
+        handler.stop(failed)
@@ -0,0 +1,50 @@
+import time
+import typing as t
+
+from api import retries, tracing
+from api.config import Settings
+from api.log import logger
+from api.models import Action
+from api.responses import FINISHED_STATUSES
+
+
+def wait_for_change(
+    fetch: t.Callable[[], t.Optional[Action]], action: Action, wait_s: float
+) -> t.Optional[Action]:
+    """
+    Hold a status request for up to `wait_s` seconds, fetching the action
+    again with exponential backoff until its status changes or it's gone.
+    Gives up early rather than run into the invocation's deadline, returning
+    the action as last seen.
+    """
+    if action.status in FINISHED_STATUSES:
+        return action
+
+    settings = Settings()
+    started = time.monotonic()
+    deadline = started + min(wait_s, settings.status_max_wait_s)
+    interval = settings.status_wait_initial_interval_s
+    checks = 0
+    current: t.Optional[Action] = action
+    while True:
+        pause = min(interval, deadline - time.monotonic())
+        if pause <= 0 or not retries.deadline_allows(pause, settings):
+            break
+        with tracing.span("wait"):
+            time.sleep(pause)
+        current = fetch()
+        checks += 1
+        if current is None or current.status != action.status:
+            break
+        interval = min(interval * 2, settings.status_wait_max_interval_s)
+
+    logger.info(
+        "Waited for action to change",
+        extra={
+            "action_id": str(action.id),
+            "waited_s": round(time.monotonic() - started, 3),
+            "checks": checks,
+            "changed": current is None or current.status != action.status,
+        },
+    )
+    return current
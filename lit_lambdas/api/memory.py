@@ -0,0 +1,66 @@
+import contextlib
+import tracemalloc
+import typing as t
+
+from aws_lambda_powertools.metrics import MetricUnit, single_metric
+
+from api.config import Settings
+from api.log import logger
+
+
+class MemoryUsage(t.NamedTuple):
+    # Bytes allocated during the invocation that were alive at its peak, and
+    # those still alive at its end
+    peak: int
+    retained: int
+
+
+@contextlib.contextmanager
+def traced() -> t.Iterator[t.List[MemoryUsage]]:
+    """
+    Trace the Python allocations made within the block. The usage is appended
+    to the yielded list once the block exits.
+    """
+    usage: t.List[MemoryUsage] = []
+    # Restarting is the only way to reset the peak on Python 3.8, and keeps
+    # allocations made before the block out of the numbers
+    already_tracing = tracemalloc.is_tracing()
+    if already_tracing:
+        tracemalloc.stop()
+    tracemalloc.start()
+    try:
+        yield usage
+    finally:
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if already_tracing:
+            tracemalloc.start()
+        usage.append(MemoryUsage(peak=peak, retained=retained))
+
+
+@contextlib.contextmanager
+def instrumented(route: str, settings: Settings) -> t.Iterator[None]:
+    """
+    Report the block's peak and retained allocations for the route, if
+    APP_MEMORY_PROFILING is on. Tracing slows every allocation down, so it's
+    meant to be switched on while investigating rather than left on.
+    """
+    if not settings.memory_profiling:
+        yield
+        return
+
+    with traced() as usage:
+        yield
+    peak, retained = usage[0]
+    logger.info(
+        "Invocation memory",
+        extra={"route": route, "peak_bytes": peak, "retained_bytes": retained},
+    )
+    for name, value in (("PeakMemory", peak), ("RetainedMemory", retained)):
+        with single_metric(
+            name=name,
+            unit=MetricUnit.Bytes,
+            value=value,
+            namespace=settings.metrics_namespace,
+        ) as m:
+            m.add_dimension(name="route", value=route)
@@ -5,12 +5,10 @@ import uuid
 from logging import log
 
 import arrow
-from aws_lambda_powertools import Logger
 from pydantic import BaseModel, Field, root_validator, validator
 
 from api.config import Settings
-
-logger = Logger(service="gw-api", utc=True)
+from api.log import logger
 
 
 def _get_now() -> datetime.datetime:
@@ -45,6 +43,26 @@ class LambdaResponse(t.TypedDict):
     body: str
 
 
+class ActionPage(t.NamedTuple):
+    actions: t.List["Action"]
+    next_page: t.Optional[str] = None
+
+
+class ActionChanges(t.NamedTuple):
+    actions: t.List["Action"]
+    # Where the next poll for changes should continue from
+    cursor: str
+    # Whether more changes were left out by the limit
+    has_more: bool = False
+
+
+class ActionStats(BaseModel):
+    counts: t.Dict[ActionStatus, int] = Field(
+        default_factory=lambda: {status: 0 for status in ActionStatus}
+    )
+    total: int = 0
+
+
 class DatetimeRange(BaseModel):
     since: datetime.datetime = Field(default_factory=_get_datetime_min)
     until: datetime.datetime = Field(default_factory=_get_datetime_max)
@@ -63,18 +81,32 @@ class DatetimeRange(BaseModel):
 
 
 class EnumerationQueryArgs(BaseModel):
-    status: t.Optional[ActionStatus] = None
+    status: t.Optional[t.List[ActionStatus]] = None
     created_at: t.Optional[DatetimeRange] = None
     completed_at: t.Optional[DatetimeRange] = None
 
-    @validator("status")
+    limit: t.Optional[int] = Field(None, ge=1)
+    page: t.Optional[str] = None
+    order: t.Optional[t.Literal["asc", "desc"]] = None
+    # Empty to sync from the start
+    changed_since: t.Optional[str] = None
+
+    @property
+    def descending(self) -> bool:
+        return self.order == "desc"
+
+    @property
+    def paginated(self) -> bool:
+        return any(v is not None for v in (self.limit, self.page, self.order))
+
+    @validator("status", pre=True)
     def parse_status(cls, v):
-        if v is not None:
-            if len(v.split(",")) > 2:
-                raise ValueError(
-                    "The status query parameter only supports single values"
-                )
-        return v
+        if v is None:
+            return None
+        if not isinstance(v, str):
+            raise ValueError("Unable to parse status value")
+        # Duplicates are dropped while keeping the order they were given in
+        return list(dict.fromkeys(v.split(",")))
 
     @validator("created_at", "completed_at", pre=True)
     def parse_datetimes(cls, v):
@@ -95,18 +127,48 @@ class EnumerationQueryArgs(BaseModel):
 
     @root_validator
     def allow_only_one(cls, values):
-        counter = [1 for v in values.values() if v is not None]
+        filters = ["status", "created_at", "completed_at", "changed_since"]
+        counter = [1 for f in filters if values.get(f) is not None]
         if sum(counter) > 1:
             raise ValueError("Only a single query parameter is supported")
+        if values.get("changed_since") is not None and (
+            values.get("page") is not None or values.get("order") is not None
+        ):
+            raise ValueError(
+                "changed_since continues from its own cursor, in change order"
+            )
         return values
 
 
+class PurgeQueryArgs(BaseModel):
+    status: t.Optional[ActionStatus] = None
+    older_than: t.Optional[datetime.datetime] = None
+
+    @validator("older_than")
+    def parse_older_than(cls, v):
+        if v is None:
+            return v
+        return arrow.get(v).to("utc").datetime
+
+    @root_validator
+    def require_one(cls, values):
+        if all(v is None for v in values.values()):
+            raise ValueError("Purging requires a status or older_than query parameter")
+        return values
+
+
+class StatusQueryArgs(BaseModel):
+    # Seconds to hold the request for the action's status to change
+    wait: t.Optional[float] = Field(None, ge=0)
+
+
 class Action(BaseModel):
     id: uuid.UUID = Field(default_factory=uuid.uuid4)
     created_at: datetime.datetime = Field(default_factory=_get_now)
     created_by: uuid.UUID
     completed_at: t.Optional[datetime.datetime] = None
     expires_at: datetime.datetime = None  # type: ignore
+    updated_at: datetime.datetime = None  # type: ignore
     status: ActionStatus = ActionStatus.PENDING
     details: t.Dict
 
@@ -117,12 +179,27 @@ class Action(BaseModel):
         expiration = arrow.get(values["created_at"]).shift(seconds=cls._expiration_ttl)
         return expiration.datetime
 
+    @validator("updated_at", pre=True, always=True)
+    def default_updated_at(cls, v, values):
+        # Actions stored before updated_at was tracked last changed when they
+        # finished, or else when they were created
+        if v is not None:
+            return v
+        return values.get("completed_at") or values["created_at"]
+
     @root_validator
     def trim_microseconds(cls, values):
-        for field_name in ["created_at", "completed_at", "expires_at"]:
+        for field_name in ["created_at", "completed_at", "expires_at", "updated_at"]:
             field_value = values[field_name]
             if field_value is None:
                 continue
             trimmed = arrow.get(field_value).replace(microsecond=0)
             values[field_name] = trimmed.datetime
         return values
+
+    def touch(self):
+        """
+        Record that the action is being written, see
+        ActionRepository.get_actions_changed_since.
+        """
+        self.updated_at = _get_now()
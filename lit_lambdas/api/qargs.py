@@ -0,0 +1,167 @@
+import datetime
+import typing as t
+
+from pydantic import ValidationError
+from pydantic.datetime_parse import parse_datetime
+from pydantic.error_wrappers import ErrorWrapper
+
+from api.models import ActionStatus, DatetimeRange, EnumerationQueryArgs
+
+# Everything the parser looks up is built once, at import
+_STATUSES: t.Dict[str, ActionStatus] = {s.value: s for s in ActionStatus}
+_STATUS_NAMES = ", ".join(_STATUSES)
+_ORDERS = frozenset(["asc", "desc"])
+_FILTERS = ("status", "created_at", "completed_at", "changed_since")
+_DATETIME_MIN = DatetimeRange().since
+_DATETIME_MAX = DatetimeRange().until
+
+_DEFAULTS = {name: f.default for name, f in EnumerationQueryArgs.__fields__.items()}
+
+# Both build models from values that were already checked, the way
+# Model.construct does minus looking up (and copying) each default per call
+
+
+def _enumeration_args(values: t.Dict[str, t.Any]) -> EnumerationQueryArgs:
+    instance = EnumerationQueryArgs.__new__(EnumerationQueryArgs)
+    object.__setattr__(instance, "__dict__", {**_DEFAULTS, **values})
+    object.__setattr__(instance, "__fields_set__", set(values))
+    return instance
+
+
+def _range(since: datetime.datetime, until: datetime.datetime) -> DatetimeRange:
+    instance = DatetimeRange.__new__(DatetimeRange)
+    object.__setattr__(instance, "__dict__", {"since": since, "until": until})
+    object.__setattr__(instance, "__fields_set__", {"since", "until"})
+    return instance
+
+
+# A complete range for queries that need a sort key but weren't given a filter
+UNBOUNDED_RANGE = _range(_DATETIME_MIN, _DATETIME_MAX)
+
+
+class _NestedErrors(Exception):
+    """
+    The errors found within a list or range argument, each with where it was
+    found, e.g. 1 for the second status.
+    """
+
+    def __init__(self, errors: t.List[t.Tuple[ValueError, t.Union[int, str]]]):
+        self.errors = errors
+
+
+def _status(value: t.Any) -> t.List[ActionStatus]:
+    if not isinstance(value, str):
+        raise ValueError("Unable to parse status value")
+    statuses = []
+    errors = []
+    # Duplicates are dropped while keeping the order they were given in
+    for i, part in enumerate(dict.fromkeys(value.split(","))):
+        status = _STATUSES.get(part)
+        if status is None:
+            message = f"{part!r} is not a status, expected any of {_STATUS_NAMES}"
+            errors.append((ValueError(message), i))
+        else:
+            statuses.append(status)
+    if errors:
+        raise _NestedErrors(errors)
+    return statuses
+
+
+def _datetime_range(value: t.Any) -> DatetimeRange:
+    if not isinstance(value, str):
+        raise ValueError("Unable to parse datetime value")
+    parts = value.split(",")
+    if len(parts) > 2:
+        raise ValueError("Datetime query parameters only support start and end values")
+
+    bounds = {}
+    errors = []
+    for loc, part in zip(("since", "until"), parts):
+        try:
+            bounds[loc] = parse_datetime(part)
+        except (ValueError, TypeError):
+            errors.append((ValueError(f"{part!r} is not a datetime"), loc))
+    if errors:
+        raise _NestedErrors(errors)
+    return _range(bounds["since"], bounds.get("until", _DATETIME_MAX))
+
+
+def _limit(value: t.Any) -> int:
+    try:
+        limit = int(value)
+    except (ValueError, TypeError):
+        raise ValueError(f"{value!r} is not an integer") from None
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    return limit
+
+
+def _order(value: t.Any) -> str:
+    if value not in _ORDERS:
+        raise ValueError(f"{value!r} is not an order, expected asc or desc")
+    return value
+
+
+def _text(value: t.Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError("Expected a string")
+    return value
+
+
+_PARSERS: t.Dict[str, t.Callable[[t.Any], t.Any]] = {
+    "status": _status,
+    "created_at": _datetime_range,
+    "completed_at": _datetime_range,
+    "limit": _limit,
+    "page": _text,
+    "order": _order,
+    "changed_since": _text,
+}
+
+
+def parse_enumeration_args(raw: t.Mapping[str, t.Any]) -> EnumerationQueryArgs:
+    """
+    Check and normalize GET /actions' query arguments in a single pass over
+    them. Accepts and rejects the same arguments as validating an
+    EnumerationQueryArgs, which is built without validating it again. Raises
+    a pydantic ValidationError naming every argument that was rejected and why.
+    """
+    values: t.Dict[str, t.Any] = {}
+    errors: t.List[ErrorWrapper] = []
+    filters = 0
+    for name, value in raw.items():
+        parser = _PARSERS.get(name)
+        if parser is None or value is None:
+            continue
+        try:
+            values[name] = parser(value)
+        except ValueError as e:
+            errors.append(ErrorWrapper(e, loc=(name,)))
+            continue
+        except _NestedErrors as e:
+            errors.extend(
+                ErrorWrapper(error, loc=(name, loc)) for error, loc in e.errors
+            )
+            continue
+        if name in _FILTERS:
+            filters += 1
+
+    if filters > 1:
+        errors.append(
+            ErrorWrapper(
+                ValueError("Only a single query parameter is supported"),
+                loc=("__root__",),
+            )
+        )
+    if "changed_since" in values and ("page" in values or "order" in values):
+        errors.append(
+            ErrorWrapper(
+                ValueError(
+                    "changed_since continues from its own cursor, in change order"
+                ),
+                loc=("__root__",),
+            )
+        )
+    if errors:
+        raise ValidationError(errors, EnumerationQueryArgs)
+    return _enumeration_args(values)
@@ -1,19 +1,118 @@
+import base64
+import binascii
 import datetime
+import functools
+import heapq
+import itertools
 import json
+import threading
 import typing as t
 import uuid
+import zlib
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 
 import arrow
 import boto3
-from aws_lambda_powertools import Logger
-from boto3.dynamodb.conditions import Attr, Key
-from mypy_boto3_dynamodb import ServiceResource
+from boto3.dynamodb.conditions import Attr, ConditionBase, Key
+from botocore.exceptions import BotoCoreError, ClientError
+from mypy_boto3_dynamodb import DynamoDBClient, ServiceResource
+from pydantic.json import pydantic_encoder
 
+from api import retries, tracing
+from api.batching import delete_keys, deserialize, get_items, serialize
 from api.config import Settings
-from api.models import Action, ActionStatus
+from api.log import logger
+from api.models import (
+    Action,
+    ActionChanges,
+    ActionPage,
+    ActionStats,
+    ActionStatus,
+    LambdaResponse,
+)
 
-logger = Logger(service="gw-api", utc=True)
+# The attributes projected into the TimeBucketGSI, and into the LSIs when
+# they're deployed with an INCLUDE projection. Must be kept in sync with
+# cdk/stack.py
+INDEX_INCLUDED_ATTRIBUTES = ["expires_at", "v", "c", "f", "m", "st"]
+
+# Items without a "v" attribute predate versioning and store the whole action
+# as a nested map
+LEGACY_ITEM_FORMAT = 0
+COMPACT_ITEM_FORMAT = 1
+
+# Sort key of the item holding a user's ActionStats, next to their actions
+STATS_SORT_KEY = "stats"
+
+# Spans every user's actions, partitioned by creation time bucket and write
+# shard and sorted by status#id
+TIME_BUCKET_INDEX = "TimeBucketGSI"
+
+# The user's actions ordered by when they last changed, for delta sync. A GSI
+# because LSIs can't be added to an existing table
+UPDATED_AT_INDEX = "UpdatedAtGSI"
+
+# Every status#id in the current layout embeds created_at, and so a time. The
+# legacy layout's <status>#<id> never contains a ":"
+NEW_STATUS_ID_LAYOUT = Attr("status#id").contains(":")
+
+TimeField = t.Literal["created_at", "completed_at"]
+
+TIME_INDEXES: t.Dict[str, str] = {
+    "created_at": "CreatedAtLSI",
+    "completed_at": "CompletedAtLSI",
+}
+
+
+def is_legacy_status_id(status_id: str) -> bool:
+    # <status>#<id>, as written before status#id embedded created_at
+    return status_id.count("#") == 1
+
+
+def status_id_merge_key(item: t.Dict) -> str:
+    status_id = item["status#id"]
+    created_at_id = status_id.split("#", 1)[1]
+    if not is_legacy_status_id(status_id):
+        # Strips the status, leaving the created_at#id it embeds
+        return created_at_id
+    # Legacy items merge by the created_at#id they'll be backfilled with
+    if "created_at#id" in item:
+        return item["created_at#id"]
+    created_at = datetime.datetime.fromtimestamp(int(item["c"]), datetime.timezone.utc)
+    return f"{created_at}#{created_at_id}"
+
+
+def encode_page_token(key: str) -> str:
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_page_token(token: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(token.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("Invalid page token") from e
+
+
+def changes_cursor(
+    after: t.Optional[str], last_key: t.Optional[str], has_more: bool
+) -> str:
+    """
+    The cursor a delta sync continues from. It only moves up to
+    APP_CHANGES_SETTLE_S ago, so that writes which were stamped just before the
+    read but weren't visible to it yet are still picked up. Clients see actions
+    changed within that window again. A full page that starts within the
+    window moves past it anyway, so that every page makes progress.
+    """
+    settled = arrow.utcnow().shift(seconds=-Settings().changes_settle_s)
+    # "#" sorts before the rest of any updated_at#id from the same second
+    horizon = f"{settled.replace(microsecond=0).datetime}#"
+    if has_more:
+        assert last_key is not None
+        held_back = min(last_key, horizon)
+        return encode_page_token(held_back if held_back > (after or "") else last_key)
+    return encode_page_token(max(after or "", horizon))
 
 
 class ActionRepository(ABC):
@@ -21,6 +120,17 @@ class ActionRepository(ABC):
     def store_actions(self, *actions: Action):
         ...
 
+    @abstractmethod
+    def store_action_idempotently(
+        self, action: Action, key: str, response: LambdaResponse
+    ) -> t.Optional[LambdaResponse]:
+        """
+        Store the action along with the response to the request that created
+        it, unless the user already used the idempotency key. Returns the
+        response recorded for the earlier request in that case, without
+        storing anything.
+        """
+
     @abstractmethod
     def get_action_by_id(self, user_id: str, action_id: str) -> t.Optional[Action]:
         ...
@@ -31,10 +141,45 @@ class ActionRepository(ABC):
 
     @abstractmethod
     def get_actions_by_status(
-        self, user_id: str, status: ActionStatus
+        self, user_id: str, status: ActionStatus, *, with_details: bool = True
     ) -> t.List[Action]:
         ...
 
+    @abstractmethod
+    def get_actions_by_statuses(
+        self,
+        user_id: str,
+        statuses: t.Sequence[ActionStatus],
+        *,
+        limit: t.Optional[int] = None,
+        page: t.Optional[str] = None,
+        descending: bool = False,
+        with_details: bool = True,
+    ) -> ActionPage:
+        """
+        Get the user's actions in any of the statuses, in creation order. At
+        most `limit` actions are returned along with a token for the next page.
+        """
+
+    @abstractmethod
+    def get_actions_by_time(
+        self,
+        user_id: str,
+        field: TimeField,
+        *,
+        since: t.Optional[datetime.datetime] = None,
+        until: t.Optional[datetime.datetime] = None,
+        limit: t.Optional[int] = None,
+        page: t.Optional[str] = None,
+        descending: bool = False,
+        with_details: bool = True,
+    ) -> ActionPage:
+        """
+        Get the user's actions whose `field` falls within the range, ordered
+        by it. At most `limit` actions are returned along with a token for the
+        next page.
+        """
+
     @abstractmethod
     def get_actions_by_created_at(
         self,
@@ -42,6 +187,7 @@ class ActionRepository(ABC):
         *,
         since: t.Optional[datetime.datetime] = None,
         until: t.Optional[datetime.datetime] = None,
+        with_details: bool = True,
     ) -> t.List[Action]:
         ...
 
@@ -52,21 +198,241 @@ class ActionRepository(ABC):
         *,
         since: t.Optional[datetime.datetime] = None,
         until: t.Optional[datetime.datetime] = None,
+        with_details: bool = True,
     ) -> t.List[Action]:
         ...
 
+    @abstractmethod
+    def get_actions_changed_since(
+        self,
+        user_id: str,
+        cursor: t.Optional[str] = None,
+        *,
+        limit: t.Optional[int] = None,
+    ) -> ActionChanges:
+        """
+        Get the user's actions written since the cursor, or all of them
+        without one, in the order they were written. At most `limit` actions
+        are returned along with the cursor to continue from. Deleted and
+        expired actions are not reported.
+        """
+
+    @abstractmethod
+    def delete_actions(self, *actions: Action) -> int:
+        """
+        Delete the actions, returning how many delete requests went through.
+        That's an upper bound on the actions deleted: DynamoDB's batch writes
+        don't report whether each item still existed, so actions that were
+        already gone are counted too.
+        """
+
+    @abstractmethod
+    def purge_actions(
+        self,
+        user_id: str,
+        *,
+        status: t.Optional[ActionStatus] = None,
+        older_than: t.Optional[datetime.datetime] = None,
+    ) -> int:
+        """
+        Delete the user's matching actions, counting them as `delete_actions`
+        does.
+        """
+
+    @abstractmethod
+    def get_action_stats(self, user_id: str) -> ActionStats:
+        """
+        Get the user's action counts by status without enumerating them.
+        """
+
+    @abstractmethod
+    def get_all_actions_by_created_at(
+        self,
+        *,
+        since: t.Optional[datetime.datetime] = None,
+        until: t.Optional[datetime.datetime] = None,
+        statuses: t.Optional[t.Sequence[ActionStatus]] = None,
+        with_details: bool = True,
+    ) -> t.List[Action]:
+        """
+        Get every user's actions created within the range, optionally only
+        those in any of the statuses, in creation order. Meant for operators,
+        e.g. finding actions stuck in PENDING.
+        """
+
+    def warmup(self):
+        """
+        Pay any first-use costs ahead of the first request.
+        """
+
 
 class DynamoActionRepository(ActionRepository):
-    def action_to_item(self, action: Action) -> t.Dict:
+    @staticmethod
+    def partition_key(user_id: str, action_id: uuid.UUID, shard_count: int) -> str:
+        # Actions are spread across shards deterministically by their ID so
+        # that point lookups never have to scatter
+        if shard_count <= 1:
+            return user_id
+        return f"{user_id}#{action_id.int % shard_count}"
+
+    @staticmethod
+    def partition_keys(user_id: str, shard_count: int) -> t.List[str]:
+        if shard_count <= 1:
+            return [user_id]
+        return [f"{user_id}#{shard}" for shard in range(shard_count)]
+
+    @staticmethod
+    def action_key(action: Action, settings: Settings) -> t.Dict:
         return {
-            "created_by": str(action.created_by),
+            "created_by": DynamoActionRepository.partition_key(
+                str(action.created_by), action.id, settings.dynamo_shard_count
+            ),
             "action_id": f"action#{str(action.id)}",
+        }
+
+    @staticmethod
+    def time_bucket(created_at: datetime.datetime, settings: Settings) -> int:
+        timestamp = int(created_at.timestamp())
+        return timestamp - timestamp % settings.dynamo_time_bucket_s
+
+    @staticmethod
+    def time_bucket_key(action: Action, settings: Settings) -> str:
+        # Writes within a bucket are spread across shards by action ID so that
+        # a burst of actions doesn't land on a single index partition
+        bucket = DynamoActionRepository.time_bucket(action.created_at, settings)
+        return f"{bucket}#{action.id.int % settings.dynamo_time_bucket_shards}"
+
+    @staticmethod
+    def time_bucket_keys(
+        since: datetime.datetime, until: datetime.datetime, settings: Settings
+    ) -> t.List[str]:
+        """
+        Every bucket partition holding actions created within the range.
+        """
+        first = DynamoActionRepository.time_bucket(since, settings)
+        last = DynamoActionRepository.time_bucket(until, settings)
+        return [
+            f"{bucket}#{shard}"
+            for bucket in range(first, last + 1, settings.dynamo_time_bucket_s)
+            for shard in range(settings.dynamo_time_bucket_shards)
+        ]
+
+    @staticmethod
+    def stats_key(user_id: str) -> t.Dict:
+        # Always in the user's unsharded partition, which sharded actions
+        # never use
+        return {"created_by": user_id, "action_id": STATS_SORT_KEY}
+
+    @staticmethod
+    def item_to_stats(item: t.Optional[t.Dict]) -> ActionStats:
+        stats = ActionStats()
+        if item is None:
+            return stats
+        for status in ActionStatus:
+            stats.counts[status] = int(item.get(status.value, 0))
+        stats.total = int(item.get("total", 0))
+        return stats
+
+    @staticmethod
+    def idempotency_record_key(user_id: str, key: str, settings: Settings) -> t.Dict:
+        # Records are spread across the user's shards like actions, by a
+        # stable ID derived from the key
+        record_id = uuid.uuid5(uuid.NAMESPACE_URL, key)
+        return {
+            "created_by": DynamoActionRepository.partition_key(
+                user_id, record_id, settings.dynamo_shard_count
+            ),
+            "action_id": f"idempotency#{key}",
+        }
+
+    @staticmethod
+    def action_to_item(action: Action, settings: Settings) -> t.Dict:
+        item = {
+            **DynamoActionRepository.action_key(action, settings),
             "created_at#id": f"{action.created_at}#{str(action.id)}",
-            "completed_at#id": f"{action.completed_at}#{str(action.id)}",
-            "status#id": f"{action.status}#{str(action.id)}",
+            # Ordering each status by creation time lets queries for several
+            # statuses be merged in creation order
+            "status#id": f"{action.status.value}#{action.created_at}#{str(action.id)}",
+            "updated_at#id": f"{action.updated_at}#{str(action.id)}",
+            "bucket": DynamoActionRepository.time_bucket_key(action, settings),
             "expires_at": int(action.expires_at.timestamp()),
-            "action": json.loads(action.json()),
         }
+        # Leaving the attribute off unfinished actions keeps them out of the
+        # CompletedAtLSI entirely
+        if action.completed_at is not None:
+            item["completed_at#id"] = f"{action.completed_at}#{str(action.id)}"
+        if settings.dynamo_item_format == LEGACY_ITEM_FORMAT:
+            item["action"] = json.loads(action.json())
+            return item
+
+        # The key attributes above are required by the table's schema, so the
+        # compact layout only shrinks the payload stored alongside them. They
+        # are in every index too, so the IDs are read back from them
+        item.update(
+            {
+                "v": COMPACT_ITEM_FORMAT,
+                "c": int(action.created_at.timestamp()),
+                "m": int(action.updated_at.timestamp()),
+                "st": action.status.value,
+            }
+        )
+        if action.completed_at is not None:
+            item["f"] = int(action.completed_at.timestamp())
+
+        details = json.dumps(
+            action.details, separators=(",", ":"), default=pydantic_encoder
+        )
+        encoded = details.encode()
+        if len(encoded) >= settings.dynamo_details_compression_threshold_bytes:
+            compressed = zlib.compress(encoded)
+            if len(compressed) < len(encoded):
+                item["dz"] = compressed
+                return item
+        item["d"] = details
+        return item
+
+    @staticmethod
+    def item_to_action(item: t.Dict) -> Action:
+        """
+        Decode an item written in any of the supported item formats.
+        """
+        version = item.get("v", LEGACY_ITEM_FORMAT)
+        if version == LEGACY_ITEM_FORMAT:
+            return Action(**item["action"])
+        if version != COMPACT_ITEM_FORMAT:
+            raise ValueError(f"Unsupported item format version {version}")
+
+        if "dz" in item:
+            details = json.loads(zlib.decompress(bytes(item["dz"])))
+        elif "d" in item:
+            details = json.loads(item["d"])
+        else:
+            # Index items projected without the details payload
+            details = {}
+        completed_at = item.get("f")
+        # Items written before "m" existed fall back to the Action default
+        updated_at = item.get("m")
+        # Partition keys carry a "#<shard>" suffix on sharded tables
+        user_id = item["created_by"].split("#", 1)[0]
+        return Action(
+            id=uuid.UUID(item["action_id"][len("action#") :]),
+            created_by=uuid.UUID(user_id),
+            created_at=datetime.datetime.fromtimestamp(
+                int(item["c"]), tz=datetime.timezone.utc
+            ),
+            completed_at=None
+            if completed_at is None
+            else datetime.datetime.fromtimestamp(
+                int(completed_at), tz=datetime.timezone.utc
+            ),
+            updated_at=None
+            if updated_at is None
+            else datetime.datetime.fromtimestamp(
+                int(updated_at), tz=datetime.timezone.utc
+            ),
+            status=item["st"],
+            details=details,
+        )
 
     def __init__(self):
         settings = Settings()
@@ -75,6 +441,7 @@ class DynamoActionRepository(ActionRepository):
             extra={
                 "region_name": settings.boto_client_config.region_name,
                 "connect_timeout": settings.boto_client_config.connect_timeout,
+                "read_timeout": settings.boto_client_config.read_timeout,
                 "retries": settings.boto_client_config.retries,
                 "endpoint_url": settings.dynamo_endpoint_url,
             },
@@ -86,67 +453,497 @@ class DynamoActionRepository(ActionRepository):
             # aws_access_key_id="TEST",
             # aws_secret_access_key="TEST",
         )
+        retries.instrument_client(dynamo.meta.client, settings)
         self.table = dynamo.Table(settings.dynamo_table_name)
+        # The resource's client transparently (de)serializes attribute values,
+        # so batch operations in api.batching get a plain low-level client
+        self.client: DynamoDBClient = retries.instrument_client(
+            boto3.client(
+                "dynamodb",
+                config=settings.boto_client_config,
+                endpoint_url=settings.dynamo_endpoint_url,
+            ),
+            settings,
+        )
+        self.settings = settings
+        self.shard_count = settings.dynamo_shard_count
+        self.query_max_workers = settings.dynamo_query_max_workers
+
+    def _query_partition(
+        self,
+        partition_key: str,
+        key_condition: t.Callable[[str], ConditionBase],
+        *,
+        limit: t.Optional[int] = None,
+        **query_kwargs,
+    ) -> t.List[t.Dict]:
+        """
+        Read matching items from a single partition, following DynamoDB's
+        pagination until `limit` items were found or the partition is exhausted.
+        """
+        query_kwargs = {
+            "TableName": self.table.name,
+            "KeyConditionExpression": key_condition(partition_key),
+            **query_kwargs,
+        }
+        items: t.List[t.Dict] = []
+        while True:
+            if limit is not None:
+                query_kwargs["Limit"] = limit - len(items)
+            # Tables aren't thread safe but their (transforming) clients are
+            with tracing.span("dynamo", operation="Query"):
+                response = self.table.meta.client.query(**query_kwargs)
+            # Only serialized if this invocation's logs are sampled
+            logger.info(
+                "Dynamo query consumed capacity", extra=response["ConsumedCapacity"]
+            )
+            items.extend(response["Items"])
+            last_key = response.get("LastEvaluatedKey")
+            if last_key is None or (limit is not None and len(items) >= limit):
+                return items
+            query_kwargs["ExclusiveStartKey"] = last_key
+
+    def _query(
+        self,
+        user_id: str,
+        key_conditions: t.Sequence[t.Callable[[str], ConditionBase]],
+        merge_key: t.Callable[[t.Dict], str],
+        **kwargs,
+    ) -> t.Tuple[t.List[t.Dict], bool]:
+        """
+        Query each of the user's shards, see `_query_partitions`.
+        """
+        return self._query_partitions(
+            self.partition_keys(user_id, self.shard_count),
+            key_conditions,
+            merge_key,
+            **kwargs,
+        )
+
+    def _query_partitions(
+        self,
+        partition_keys: t.Sequence[str],
+        key_conditions: t.Sequence[t.Callable[[str], ConditionBase]],
+        merge_key: t.Callable[[t.Dict], str],
+        *,
+        limit: t.Optional[int] = None,
+        after: t.Optional[str] = None,
+        descending: bool = False,
+        **query_kwargs,
+    ) -> t.Tuple[t.List[t.Dict], bool]:
+        """
+        Run each key condition against each partition in parallel and k-way
+        merge the streams by `merge_key`, which each stream must already be
+        sorted by (in reverse when `descending`). Items up to and including
+        `after` are expected to be excluded by the key conditions' bounds, bar
+        the `after` item itself. Returns at most `limit` items and whether any
+        more remain.
+        """
+        streams = [
+            (partition_key, key_condition)
+            for partition_key in partition_keys
+            for key_condition in key_conditions
+        ]
+        # One extra item tells whether there's another page, another makes up
+        # for the `after` item which the inclusive bounds return again
+        stream_limit = None
+        if limit is not None:
+            stream_limit = limit + 1 + (after is not None)
+
+        def query_stream(stream):
+            return self._query_partition(*stream, limit=stream_limit, **query_kwargs)
+
+        if len(streams) == 1:
+            results = [query_stream(streams[0])]
+        else:
+            workers = min(self.query_max_workers, len(streams))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(query_stream, streams))
+
+        merged: t.Iterable[t.Dict] = heapq.merge(
+            *results, key=merge_key, reverse=descending
+        )
+        if after is not None:
+            merged = (item for item in merged if merge_key(item) != after)
+        if limit is None:
+            return list(merged), False
+        items = list(itertools.islice(merged, limit + 1))
+        return items[:limit], len(items) > limit
+
+    def _legacy_status_items(
+        self,
+        partition_keys: t.Sequence[str],
+        partition_attribute: str,
+        statuses: t.Sequence[ActionStatus],
+        wanted: t.Callable[[str], bool],
+        *,
+        descending: bool = False,
+        **query_kwargs,
+    ) -> t.List[t.Dict]:
+        """
+        Read the items in any of the statuses whose status#id still has the
+        legacy layout, keeping those whose merge key is `wanted`, sorted by it.
+        The index orders them by ID, so each status is read in full; only
+        needed until scripts.backfill_status_id has run.
+        """
+        now = int(arrow.utcnow().timestamp())
+        items, _ = self._query_partitions(
+            partition_keys,
+            [
+                lambda pk, prefix=f"{status.value}#": Key(partition_attribute).eq(pk)
+                & Key("status#id").begins_with(prefix)
+                for status in statuses
+            ],
+            itemgetter("status#id"),
+            ReturnConsumedCapacity="INDEXES",
+            FilterExpression=Attr("expires_at").gte(now) & ~NEW_STATUS_ID_LAYOUT,
+            **query_kwargs,
+        )
+        # Legacy items projected without either timestamp
+        missing = [i for i in items if "created_at#id" not in i and "c" not in i]
+        if missing:
+            with tracing.span("dynamo", operation="BatchGetItem"):
+                fetched = {
+                    (item["created_by"], item["action_id"]): item
+                    for item in get_items(
+                        self.client,
+                        (
+                            {"created_by": i["created_by"], "action_id": i["action_id"]}
+                            for i in missing
+                        ),
+                    )
+                }
+            items = [fetched.get((i["created_by"], i["action_id"]), i) for i in items]
+            items = [i for i in items if "created_at#id" in i or "c" in i]
+        return sorted(
+            (i for i in items if wanted(status_id_merge_key(i))),
+            key=status_id_merge_key,
+            reverse=descending,
+        )
+
+    def _hydrate_index_items(
+        self,
+        items: t.List[t.Dict],
+        with_details: bool,
+        projection: t.Optional[str] = None,
+    ) -> t.List[Action]:
+        """
+        Decode items returned by an index query. When the index only projects
+        the attributes in INDEX_INCLUDED_ATTRIBUTES, any item that lacks what
+        the caller needs is fetched from the base table in batches. The LSIs'
+        projection is assumed unless another is given.
+        """
+        if (projection or self.settings.dynamo_lsi_projection) == "ALL":
+            with tracing.span("hydrate"):
+                return [self.item_to_action(item) for item in items]
+
+        def needs_fetch(item: t.Dict) -> bool:
+            if "v" not in item:
+                return "action" not in item
+            return with_details and "d" not in item and "dz" not in item
+
+        missing = [item for item in items if needs_fetch(item)]
+        if missing:
+            keys = [
+                {"created_by": item["created_by"], "action_id": item["action_id"]}
+                for item in missing
+            ]
+            with tracing.span("dynamo", operation="BatchGetItem"):
+                fetched = {
+                    (item["created_by"], item["action_id"]): item
+                    for item in get_items(self.client, keys)
+                }
+            items = [
+                fetched.get((item["created_by"], item["action_id"]), item)
+                if needs_fetch(item)
+                else item
+                for item in items
+            ]
+        with tracing.span("hydrate"):
+            return [
+                self.item_to_action(item) for item in items if not needs_fetch(item)
+            ]
+
+    def warmup(self):
+        # Each client has its own connection pool: queries and single item
+        # reads go through the table's, batches through the low-level one
+        for client in (self.table.meta.client, self.client):
+            try:
+                # Opens a connection to the DynamoDB endpoint which the client
+                # then keeps alive for the first real request
+                client.describe_endpoints()
+            except (BotoCoreError, ClientError) as e:
+                logger.warning(
+                    "Unable to open DynamoDB connection", extra={"error": str(e)}
+                )
+        action = Action(details={"endpoint": "warmup"}, created_by=uuid.UUID(int=0))
+        self.item_to_action(self.action_to_item(action, self.settings))
 
     def enumerate_actions(self) -> t.List[Action]:
-        items = self.table.scan().get("Items", [])
-        return [Action(**item["action"]) for item in items]
+        # Idempotency records and stats items share the table
+        items = self.table.scan(
+            FilterExpression=Key("action_id").begins_with("action#")
+        ).get("Items", [])
+        return [self.item_to_action(item) for item in items]
 
     def store_actions(self, *actions: Action):
-        with self.table.batch_writer() as batch:
-            for a in actions:
-                batch.put_item(Item=self.action_to_item(a))
+        with tracing.span("dynamo", operation="BatchWriteItem"):
+            with self.table.batch_writer() as batch:
+                for a in actions:
+                    a.touch()
+                    batch.put_item(Item=self.action_to_item(a, self.settings))
+
+    def store_action_idempotently(
+        self, action: Action, key: str, response: LambdaResponse
+    ) -> t.Optional[LambdaResponse]:
+        with tracing.span("dynamo", operation="TransactWriteItems"):
+            previous = self._put_idempotency_record(action, key, json.dumps(response))
+        return None if previous is None else json.loads(previous)
+
+    def _put_idempotency_record(
+        self, action: Action, key: str, response: str
+    ) -> t.Optional[str]:
+        """
+        Atomically store the action and record the serialized response under the
+        user's idempotency key, unless a live record for the key already exists.
+        Returns the previously recorded response in that case.
+        """
+        db, settings = self.client, self.settings
+        record_key = self.idempotency_record_key(str(action.created_by), key, settings)
+        now = arrow.utcnow()
+        record = {
+            **record_key,
+            "response": response,
+            "expires_at": int(
+                now.shift(seconds=settings.idempotency_ttl_s).timestamp()
+            ),
+        }
+        try:
+            db.transact_write_items(
+                TransactItems=[
+                    {
+                        "Put": {
+                            "TableName": settings.dynamo_table_name,
+                            "Item": serialize(record),
+                            # TTL deletion lags expiry, so expired records count
+                            # as absent
+                            "ConditionExpression": (
+                                "attribute_not_exists(action_id) OR expires_at < :now"
+                            ),
+                            "ExpressionAttributeValues": {
+                                ":now": {"N": str(int(now.timestamp()))}
+                            },
+                            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+                        }
+                    },
+                    {
+                        "Put": {
+                            "TableName": settings.dynamo_table_name,
+                            "Item": serialize(self.action_to_item(action, settings)),
+                        }
+                    },
+                ]
+            )
+            return None
+        except db.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get("CancellationReasons") or [{}]
+            if reasons[0].get("Code") != "ConditionalCheckFailed":
+                raise
+            previous = reasons[0].get("Item")
+
+        if previous is None:
+            previous = db.get_item(
+                TableName=settings.dynamo_table_name,
+                Key=serialize(record_key),
+                ConsistentRead=True,
+            ).get("Item")
+        if previous is None:
+            # The record expired in between, so the key is free again
+            return self._put_idempotency_record(action, key, response)
+        logger.info("Replaying idempotent request", extra={"idempotency_key": key})
+        return deserialize(previous)["response"]
+
+    def delete_actions(self, *actions: Action) -> int:
+        # Counts delete requests processed, see api.batching.delete_keys
+        keys = (serialize(self.action_key(a, self.settings)) for a in actions)
+        with tracing.span("dynamo", operation="BatchWriteItem"):
+            return delete_keys(self.client, keys)
+
+    def purge_actions(
+        self,
+        user_id: str,
+        *,
+        status: t.Optional[ActionStatus] = None,
+        older_than: t.Optional[datetime.datetime] = None,
+    ) -> int:
+        db, settings = self.client, self.settings
+        if older_than is None:
+            older_than = arrow.get(datetime.datetime.max).to("utc").datetime
+
+        since = arrow.get(datetime.datetime.min).to("utc").datetime
+        lower_bound = f"{since}#{uuid.UUID(int=0)}"
+        upper_bound = f"{older_than}#{uuid.UUID(int=0)}"
+
+        query_kwargs: t.Dict[str, t.Any] = {
+            "TableName": settings.dynamo_table_name,
+            "IndexName": "CreatedAtLSI",
+            "KeyConditionExpression": (
+                "created_by = :uid AND #created_at_id BETWEEN :lower AND :upper"
+            ),
+            "ProjectionExpression": "created_by, action_id",
+            "ExpressionAttributeNames": {"#created_at_id": "created_at#id"},
+            "ExpressionAttributeValues": {
+                ":lower": {"S": lower_bound},
+                ":upper": {"S": upper_bound},
+            },
+        }
+        if status is not None:
+            # Filter on the key attribute which every item format shares
+            query_kwargs["FilterExpression"] = "begins_with(#status_id, :status)"
+            query_kwargs["ExpressionAttributeNames"]["#status_id"] = "status#id"
+            query_kwargs["ExpressionAttributeValues"][":status"] = {
+                "S": f"{status.value}#"
+            }
+
+        keys = []
+        with tracing.span("dynamo", operation="Purge"):
+            paginator = db.get_paginator("query")
+            for partition_key in self.partition_keys(
+                user_id, settings.dynamo_shard_count
+            ):
+                query_kwargs["ExpressionAttributeValues"][":uid"] = {"S": partition_key}
+                for page in paginator.paginate(**query_kwargs):
+                    keys.extend(page["Items"])
+            # Counts delete requests processed, see api.batching.delete_keys
+            deleted = delete_keys(db, keys)
+        logger.info(
+            "Purged actions",
+            extra={
+                "user_id": user_id,
+                "status": status,
+                "older_than": older_than,
+                "matched": len(keys),
+                "deleted": deleted,
+            },
+        )
+        return deleted
 
     def enumerate_actions_for_user(self, user_id: str) -> t.List[Action]:
         now = int(arrow.utcnow().timestamp())
-        response = self.table.query(
-            KeyConditionExpression=Key("created_by").eq(user_id),
+        items, _ = self._query(
+            user_id,
+            # Idempotency records share the partition
+            [
+                lambda pk: Key("created_by").eq(pk)
+                & Key("action_id").begins_with("action#")
+            ],
+            itemgetter("action_id"),
             ReturnConsumedCapacity="TOTAL",
             FilterExpression=Attr("expires_at").gte(now),
         )
-        logger.info(
-            "Dynamo query consumed capacity", extra=response["ConsumedCapacity"]
-        )
-        return [Action(**item["action"]) for item in response["Items"]]
+        with tracing.span("hydrate"):
+            return [self.item_to_action(item) for item in items]
 
     def get_action_by_id(self, user_id: str, action_id: str) -> t.Optional[Action]:
+        try:
+            parsed_id = uuid.UUID(str(action_id))
+        except ValueError:
+            return None
+
         now = int(arrow.utcnow().timestamp())
-        response = self.table.query(
-            KeyConditionExpression=Key("created_by").eq(user_id)
+        items = self._query_partition(
+            self.partition_key(user_id, parsed_id, self.shard_count),
+            lambda pk: Key("created_by").eq(pk)
             & Key("action_id").eq(f"action#{action_id}"),
             ReturnConsumedCapacity="INDEXES",
             FilterExpression=Attr("expires_at").gte(now),
         )
-        logger.info(
-            "Dynamo query consumed capacity", extra=response["ConsumedCapacity"]
-        )
-        if response["Count"] == 0:
+        if len(items) == 0:
             return None
-        return Action(**response["Items"][0]["action"])
+        return self.item_to_action(items[0])
 
     def get_actions_by_status(
-        self, user_id: str, status: ActionStatus
+        self, user_id: str, status: ActionStatus, *, with_details: bool = True
     ) -> t.List[Action]:
+        return self.get_actions_by_statuses(
+            user_id, [status], with_details=with_details
+        ).actions
+
+    def get_actions_by_statuses(
+        self,
+        user_id: str,
+        statuses: t.Sequence[ActionStatus],
+        *,
+        limit: t.Optional[int] = None,
+        page: t.Optional[str] = None,
+        descending: bool = False,
+        with_details: bool = True,
+    ) -> ActionPage:
+        after = None if page is None else decode_page_token(page)
+
+        def key_condition(status: ActionStatus):
+            # Every status#id shares the status prefix, and "$" sorts right
+            # after the "#" separator
+            lower_bound, upper_bound = f"{status.value}#", f"{status.value}$"
+            if after is not None and descending:
+                upper_bound = f"{status.value}#{after}"
+            elif after is not None:
+                lower_bound = f"{status.value}#{after}"
+            return lambda pk: Key("created_by").eq(pk) & Key("status#id").between(
+                lower_bound, upper_bound
+            )
+
         now = int(arrow.utcnow().timestamp())
-        response = self.table.query(
+        statuses = list(dict.fromkeys(statuses))
+        items, has_more = self._query(
+            user_id,
+            [key_condition(status) for status in statuses],
+            status_id_merge_key,
+            limit=limit,
+            after=after,
+            descending=descending,
             IndexName="ActionStatusLSI",
-            KeyConditionExpression=Key("created_by").eq(user_id)
-            & Key("status#id").begins_with(f"{status}"),
+            ScanIndexForward=not descending,
             ReturnConsumedCapacity="INDEXES",
-            FilterExpression=Attr("expires_at").gte(now),
-        )
-        logger.info(
-            "Dynamo query consumed capacity", extra=response["ConsumedCapacity"]
+            # Legacy items would break each stream's creation order
+            FilterExpression=Attr("expires_at").gte(now) & NEW_STATUS_ID_LAYOUT,
         )
-        return [Action(**item["action"]) for item in response["Items"]]
+        if self.settings.dynamo_legacy_status_ids:
 
-    def get_actions_by_created_at(
+            def wanted(key: str) -> bool:
+                return after is None or (key < after if descending else key > after)
+
+            legacy = self._legacy_status_items(
+                self.partition_keys(user_id, self.shard_count),
+                "created_by",
+                statuses,
+                wanted,
+                descending=descending,
+                IndexName="ActionStatusLSI",
+            )
+            items = list(
+                heapq.merge(items, legacy, key=status_id_merge_key, reverse=descending)
+            )
+            if limit is not None:
+                has_more = has_more or len(items) > limit
+                items = items[:limit]
+        next_page = None
+        if has_more:
+            next_page = encode_page_token(status_id_merge_key(items[-1]))
+        return ActionPage(self._hydrate_index_items(items, with_details), next_page)
+
+    def get_actions_by_time(
         self,
         user_id: str,
+        field: TimeField,
         *,
         since: t.Optional[datetime.datetime] = None,
         until: t.Optional[datetime.datetime] = None,
-    ) -> t.List[Action]:
+        limit: t.Optional[int] = None,
+        page: t.Optional[str] = None,
+        descending: bool = False,
+        with_details: bool = True,
+    ) -> ActionPage:
         if since is None:
             since = arrow.get(datetime.datetime.min).to("utc").datetime
         if until is None:
@@ -154,44 +951,401 @@ class DynamoActionRepository(ActionRepository):
 
         lower_bound = f"{since}#{uuid.UUID(int=0)}"
         upper_bound = f"{until}#ffffffff-ffff-ffff-ffff-ffffffffffff"
+        after = None if page is None else decode_page_token(page)
+        if after is not None and descending:
+            upper_bound = min(upper_bound, after)
+        elif after is not None:
+            lower_bound = max(lower_bound, after)
+        if lower_bound > upper_bound:
+            return ActionPage([])
+
+        sort_key = f"{field}#id"
         now = int(arrow.utcnow().timestamp())
+        # With a limit each shard stops reading once it has enough items, so a
+        # "latest N" query reads the same amount however long the history is
+        items, has_more = self._query(
+            user_id,
+            [
+                lambda pk: Key("created_by").eq(pk)
+                & Key(sort_key).between(lower_bound, upper_bound)
+            ],
+            itemgetter(sort_key),
+            limit=limit,
+            after=after,
+            descending=descending,
+            IndexName=TIME_INDEXES[field],
+            ScanIndexForward=not descending,
+            ReturnConsumedCapacity="INDEXES",
+            FilterExpression=Attr("expires_at").gte(now),
+        )
+        next_page = None
+        if has_more:
+            next_page = encode_page_token(items[-1][sort_key])
+        return ActionPage(self._hydrate_index_items(items, with_details), next_page)
+
+    def get_actions_changed_since(
+        self,
+        user_id: str,
+        cursor: t.Optional[str] = None,
+        *,
+        limit: t.Optional[int] = None,
+    ) -> ActionChanges:
+        after = None if cursor is None else decode_page_token(cursor)
+
+        def key_condition(pk: str) -> ConditionBase:
+            if after is None:
+                return Key("created_by").eq(pk)
+            return Key("created_by").eq(pk) & Key("updated_at#id").gt(after)
 
-        response = self.table.query(
-            IndexName="CreatedAtLSI",
-            KeyConditionExpression=Key("created_by").eq(user_id)
-            & Key("created_at#id").between(lower_bound, upper_bound),
+        now = int(arrow.utcnow().timestamp())
+        items, has_more = self._query(
+            user_id,
+            [key_condition],
+            itemgetter("updated_at#id"),
+            limit=limit,
+            IndexName=UPDATED_AT_INDEX,
             ReturnConsumedCapacity="INDEXES",
             FilterExpression=Attr("expires_at").gte(now),
         )
-        logger.info(
-            "Dynamo query consumed capacity", extra=response["ConsumedCapacity"]
+        last_key = items[-1]["updated_at#id"] if items else None
+        return ActionChanges(
+            self._hydrate_index_items(items, True, projection="ALL"),
+            changes_cursor(after, last_key, has_more),
+            has_more,
         )
-        return [Action(**item["action"]) for item in response["Items"]]
 
-    def get_actions_by_completed_at(
+    def get_action_stats(self, user_id: str) -> ActionStats:
+        # Maintained from the table's stream by api.streams, so it may trail
+        # the latest writes by a moment
+        with tracing.span("dynamo", operation="GetItem"):
+            item = self.table.get_item(Key=self.stats_key(user_id)).get("Item")
+        return self.item_to_stats(item)
+
+    def get_all_actions_by_created_at(
         self,
-        user_id: str,
         *,
         since: t.Optional[datetime.datetime] = None,
         until: t.Optional[datetime.datetime] = None,
+        statuses: t.Optional[t.Sequence[ActionStatus]] = None,
+        with_details: bool = True,
     ) -> t.List[Action]:
+        now = arrow.utcnow()
         if since is None:
-            since = arrow.get(datetime.datetime.min).to("utc").datetime
+            # Nothing older than the item TTL is still around
+            since = now.shift(seconds=-self.settings.dynamo_item_ttl_s).datetime
         if until is None:
-            until = arrow.get(datetime.datetime.max).to("utc").datetime
+            until = now.datetime
+        if since > until:
+            return []
 
-        lower_bound = f"{since}#{uuid.UUID(int=0)}"
-        upper_bound = f"{until}#ffffffff-ffff-ffff-ffff-ffffffffffff"
-        now = int(arrow.utcnow().timestamp())
+        def key_condition(status: ActionStatus):
+            lower_bound = f"{status.value}#{since}#{uuid.UUID(int=0)}"
+            upper_bound = f"{status.value}#{until}#ffffffff-ffff-ffff-ffff-ffffffffffff"
+            return lambda pk: Key("bucket").eq(pk) & Key("status#id").between(
+                lower_bound, upper_bound
+            )
 
-        response = self.table.query(
-            IndexName="CompletedAtLSI",
-            KeyConditionExpression=Key("created_by").eq(user_id)
-            & Key("completed_at#id").between(lower_bound, upper_bound),
+        # Only the buckets the range covers are read, all shards of each in
+        # parallel, with one key condition per status
+        bucket_keys = self.time_bucket_keys(since, until, self.settings)
+        statuses = list(dict.fromkeys(statuses or ActionStatus))
+        items, _ = self._query_partitions(
+            bucket_keys,
+            [key_condition(status) for status in statuses],
+            status_id_merge_key,
+            IndexName=TIME_BUCKET_INDEX,
             ReturnConsumedCapacity="INDEXES",
-            FilterExpression=Attr("expires_at").gte(now),
+            FilterExpression=Attr("expires_at").gte(int(now.timestamp()))
+            & NEW_STATUS_ID_LAYOUT,
         )
-        logger.info(
-            "Dynamo query consumed capacity", extra=response["ConsumedCapacity"]
+        if self.settings.dynamo_legacy_status_ids:
+            lower_bound = f"{since}#{uuid.UUID(int=0)}"
+            upper_bound = f"{until}#ffffffff-ffff-ffff-ffff-ffffffffffff"
+            legacy = self._legacy_status_items(
+                bucket_keys,
+                "bucket",
+                statuses,
+                lambda key: lower_bound <= key <= upper_bound,
+                IndexName=TIME_BUCKET_INDEX,
+            )
+            items = list(heapq.merge(items, legacy, key=status_id_merge_key))
+        return self._hydrate_index_items(items, with_details, projection="INCLUDE")
+
+    def get_actions_by_created_at(
+        self,
+        user_id: str,
+        *,
+        since: t.Optional[datetime.datetime] = None,
+        until: t.Optional[datetime.datetime] = None,
+        with_details: bool = True,
+    ) -> t.List[Action]:
+        return self.get_actions_by_time(
+            user_id, "created_at", since=since, until=until, with_details=with_details
+        ).actions
+
+    def get_actions_by_completed_at(
+        self,
+        user_id: str,
+        *,
+        since: t.Optional[datetime.datetime] = None,
+        until: t.Optional[datetime.datetime] = None,
+        with_details: bool = True,
+    ) -> t.List[Action]:
+        return self.get_actions_by_time(
+            user_id,
+            "completed_at",
+            since=since,
+            until=until,
+            with_details=with_details,
+        ).actions
+
+
+class InMemoryActionRepository(ActionRepository):
+    """
+    A process local repository which mirrors the ordering and expiration
+    semantics of DynamoActionRepository. Useful for load testing the handler
+    without any backing services.
+    """
+
+    def __init__(self):
+        self.actions: t.Dict[str, t.Dict[uuid.UUID, Action]] = {}
+        # (user ID, idempotency key) -> (expiry timestamp, recorded response)
+        self.idempotency_records: t.Dict[
+            t.Tuple[str, str], t.Tuple[float, LambdaResponse]
+        ] = {}
+        self.lock = threading.Lock()
+
+    def _live_actions(self, user_id: str) -> t.List[Action]:
+        now = arrow.utcnow().datetime
+        with self.lock:
+            actions = list(self.actions.get(user_id, {}).values())
+        return [a for a in actions if a.expires_at >= now]
+
+    def store_actions(self, *actions: Action):
+        with self.lock:
+            for a in actions:
+                a.touch()
+                self.actions.setdefault(str(a.created_by), {})[a.id] = a
+
+    def store_action_idempotently(
+        self, action: Action, key: str, response: LambdaResponse
+    ) -> t.Optional[LambdaResponse]:
+        record_key = (str(action.created_by), key)
+        now = arrow.utcnow().timestamp()
+        with self.lock:
+            previous = self.idempotency_records.get(record_key)
+            if previous is not None and previous[0] >= now:
+                return previous[1]
+            self.idempotency_records[record_key] = (
+                now + Settings().idempotency_ttl_s,
+                response,
+            )
+            self.actions.setdefault(str(action.created_by), {})[action.id] = action
+        return None
+
+    def get_action_by_id(self, user_id: str, action_id: str) -> t.Optional[Action]:
+        try:
+            parsed_id = uuid.UUID(str(action_id))
+        except ValueError:
+            return None
+        with self.lock:
+            action = self.actions.get(user_id, {}).get(parsed_id)
+        if action is None or action.expires_at < arrow.utcnow().datetime:
+            return None
+        return action
+
+    def enumerate_actions_for_user(self, user_id: str) -> t.List[Action]:
+        return sorted(self._live_actions(user_id), key=lambda a: str(a.id))
+
+    def get_actions_by_status(
+        self, user_id: str, status: ActionStatus, *, with_details: bool = True
+    ) -> t.List[Action]:
+        return self.get_actions_by_statuses(user_id, [status]).actions
+
+    @staticmethod
+    def _page(
+        actions: t.Iterable[Action],
+        sort_key: t.Callable[[Action], str],
+        *,
+        limit: t.Optional[int],
+        page: t.Optional[str],
+        descending: bool,
+    ) -> ActionPage:
+        after = None if page is None else decode_page_token(page)
+        ordered = sorted(
+            (
+                a
+                for a in actions
+                if after is None
+                or (sort_key(a) < after if descending else sort_key(a) > after)
+            ),
+            key=sort_key,
+            reverse=descending,
+        )
+        if limit is None or len(ordered) <= limit:
+            return ActionPage(ordered)
+        return ActionPage(
+            ordered[:limit], encode_page_token(sort_key(ordered[limit - 1]))
+        )
+
+    def get_actions_by_statuses(
+        self,
+        user_id: str,
+        statuses: t.Sequence[ActionStatus],
+        *,
+        limit: t.Optional[int] = None,
+        page: t.Optional[str] = None,
+        descending: bool = False,
+        with_details: bool = True,
+    ) -> ActionPage:
+        return self._page(
+            (a for a in self._live_actions(user_id) if a.status in statuses),
+            lambda a: f"{a.created_at}#{str(a.id)}",
+            limit=limit,
+            page=page,
+            descending=descending,
+        )
+
+    def get_actions_by_time(
+        self,
+        user_id: str,
+        field: TimeField,
+        *,
+        since: t.Optional[datetime.datetime] = None,
+        until: t.Optional[datetime.datetime] = None,
+        limit: t.Optional[int] = None,
+        page: t.Optional[str] = None,
+        descending: bool = False,
+        with_details: bool = True,
+    ) -> ActionPage:
+        def in_range(a: Action) -> bool:
+            value = getattr(a, field)
+            return (
+                value is not None
+                and (since is None or value >= since)
+                and (until is None or value <= until)
+            )
+
+        return self._page(
+            filter(in_range, self._live_actions(user_id)),
+            lambda a: f"{getattr(a, field)}#{str(a.id)}",
+            limit=limit,
+            page=page,
+            descending=descending,
+        )
+
+    def get_actions_changed_since(
+        self,
+        user_id: str,
+        cursor: t.Optional[str] = None,
+        *,
+        limit: t.Optional[int] = None,
+    ) -> ActionChanges:
+        sort_key: t.Callable[[Action], str] = lambda a: f"{a.updated_at}#{str(a.id)}"
+        page = self._page(
+            self._live_actions(user_id),
+            sort_key,
+            limit=limit,
+            page=cursor,
+            descending=False,
+        )
+        last_key = sort_key(page.actions[-1]) if page.actions else None
+        return ActionChanges(
+            page.actions,
+            changes_cursor(
+                None if cursor is None else decode_page_token(cursor),
+                last_key,
+                page.next_page is not None,
+            ),
+            page.next_page is not None,
+        )
+
+    def get_action_stats(self, user_id: str) -> ActionStats:
+        stats = ActionStats()
+        for a in self._live_actions(user_id):
+            stats.counts[a.status] += 1
+            stats.total += 1
+        return stats
+
+    def get_all_actions_by_created_at(
+        self,
+        *,
+        since: t.Optional[datetime.datetime] = None,
+        until: t.Optional[datetime.datetime] = None,
+        statuses: t.Optional[t.Sequence[ActionStatus]] = None,
+        with_details: bool = True,
+    ) -> t.List[Action]:
+        with self.lock:
+            user_ids = list(self.actions)
+        return sorted(
+            (
+                a
+                for user_id in user_ids
+                for a in self._live_actions(user_id)
+                if (statuses is None or a.status in statuses)
+                and (since is None or a.created_at >= since)
+                and (until is None or a.created_at <= until)
+            ),
+            key=lambda a: (a.created_at, str(a.id)),
         )
-        return [Action(**item["action"]) for item in response["Items"]]
+
+    def get_actions_by_created_at(
+        self,
+        user_id: str,
+        *,
+        since: t.Optional[datetime.datetime] = None,
+        until: t.Optional[datetime.datetime] = None,
+        with_details: bool = True,
+    ) -> t.List[Action]:
+        return self.get_actions_by_time(
+            user_id, "created_at", since=since, until=until
+        ).actions
+
+    def get_actions_by_completed_at(
+        self,
+        user_id: str,
+        *,
+        since: t.Optional[datetime.datetime] = None,
+        until: t.Optional[datetime.datetime] = None,
+        with_details: bool = True,
+    ) -> t.List[Action]:
+        return self.get_actions_by_time(
+            user_id, "completed_at", since=since, until=until
+        ).actions
+
+    def delete_actions(self, *actions: Action) -> int:
+        deleted = 0
+        with self.lock:
+            for a in actions:
+                if self.actions.get(str(a.created_by), {}).pop(a.id, None):
+                    deleted += 1
+        return deleted
+
+    def purge_actions(
+        self,
+        user_id: str,
+        *,
+        status: t.Optional[ActionStatus] = None,
+        older_than: t.Optional[datetime.datetime] = None,
+    ) -> int:
+        with self.lock:
+            actions = list(self.actions.get(user_id, {}).values())
+        return self.delete_actions(
+            *(
+                a
+                for a in actions
+                if (status is None or a.status == status)
+                and (older_than is None or a.created_at < older_than)
+            )
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_repository() -> ActionRepository:
+    """
+    The repository, and any clients it holds, shared by every invocation
+    served by this execution environment.
+    """
+    if Settings().repository_backend == "memory":
+        return InMemoryActionRepository()
+    return DynamoActionRepository()
@@ -1,14 +1,27 @@
 import datetime
 import json
+import time
 import typing as t
 import uuid
 from abc import ABC
+from email.utils import formatdate
 
-from aws_lambda_powertools import Logger
+from api import tracing
+from api.config import Settings
+from api.log import logger
+from api.models import Action, ActionStatus, LambdaResponse
 
-from api.models import Action, LambdaResponse
+# Carries the token for the next page of a paginated response
+NEXT_PAGE_HEADER = "X-Next-Page"
+# Carries the cursor to continue a ?changed_since= delta sync from, and whether
+# changes were left out by the limit
+CHANGES_CURSOR_HEADER = "X-Changes-Cursor"
+MORE_CHANGES_HEADER = "X-More-Changes"
 
-logger = Logger(service="gw-api", utc=True)
+# Actions in these states are never updated again
+FINISHED_STATUSES = {ActionStatus.SUCCEEDED, ActionStatus.FAILED}
+
+_settings = Settings()
 
 
 class Encoder(json.JSONEncoder):
@@ -23,16 +36,52 @@ class Encoder(json.JSONEncoder):
             return json.JSONEncoder.default(self, obj)
 
 
+def cache_headers(max_age_s: int) -> t.Dict[str, str]:
+    if max_age_s <= 0:
+        return {"Cache-Control": "no-cache"}
+    # Actions all belong to a single user for now; this has to become
+    # "private" (and the stage cache keyed on the caller) once that changes
+    return {
+        "Cache-Control": f"public, max-age={max_age_s}",
+        "Expires": formatdate(time.time() + max_age_s, usegmt=True),
+    }
+
+
+def action_max_age(action: Action) -> int:
+    """
+    How long a response holding the action may be cached for. Finished
+    actions never change again, but are still only cached until they expire.
+    """
+    if action.status not in FINISHED_STATUSES:
+        return 0
+    ttl = int(action.expires_at.timestamp() - time.time())
+    return max(0, min(_settings.finished_action_max_age_s, ttl))
+
+
 class BaseResponse(ABC):
     http_status: int
     headers: t.Dict[str, str] = {"Content-Type": "application/json"}
 
     @classmethod
-    def as_json(cls, body: t.Any) -> LambdaResponse:
+    def as_json(
+        cls,
+        body: t.Any,
+        headers: t.Optional[t.Dict[str, str]] = None,
+        *,
+        max_age_s: t.Optional[int] = None,
+    ) -> LambdaResponse:
+        """
+        Cache headers are chosen by the state of an Action body unless
+        `max_age_s` is given. Any other body is not cached.
+        """
+        if max_age_s is None:
+            max_age_s = action_max_age(body) if isinstance(body, Action) else 0
+        with tracing.span("serialize"):
+            serialized = json.dumps(body, cls=Encoder)
         return {
             "statusCode": cls.http_status,
-            "headers": cls.headers,
-            "body": json.dumps(body, cls=Encoder),
+            "headers": {**cls.headers, **cache_headers(max_age_s), **(headers or {})},
+            "body": serialized,
         }
 
 
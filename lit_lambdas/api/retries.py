@@ -0,0 +1,161 @@
+import threading
+import time
+import typing as t
+from collections import Counter
+
+from aws_lambda_powertools.metrics import MetricUnit, single_metric
+
+from api.config import Settings
+from api.log import logger
+
+THROTTLING_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "ThrottlingException",
+}
+
+# Absolute time.monotonic() deadline of the current invocation. Lambda only
+# runs one invocation per process at a time, and the query/batch thread pools
+# need to see it too, so this is deliberately a plain module global
+_deadline: t.Optional[float] = None
+
+
+def set_deadline(remaining_ms: t.Optional[float]):
+    """
+    Record how long the current invocation has left, usually from
+    `context.get_remaining_time_in_millis()`. None clears the deadline.
+    """
+    global _deadline
+    _deadline = None if remaining_ms is None else time.monotonic() + remaining_ms / 1000
+
+
+def remaining_ms() -> t.Optional[float]:
+    if _deadline is None:
+        return None
+    return (_deadline - time.monotonic()) * 1000
+
+
+def deadline_allows(delay_s: float, settings: Settings) -> bool:
+    """
+    Whether sleeping `delay_s` before another attempt still leaves the
+    configured margin to finish the invocation.
+    """
+    remaining = remaining_ms()
+    if remaining is None:
+        return True
+    return remaining - delay_s * 1000 >= settings.boto_client_deadline_margin_ms
+
+
+class RetryMetrics:
+    """
+    Per operation throttle and retry counters, published as CloudWatch EMF
+    metrics when flushed at the end of an invocation.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.counts: t.Counter[t.Tuple[str, str]] = Counter()
+
+    def record(self, metric: str, operation: str, count: int = 1):
+        if count:
+            with self.lock:
+                self.counts[(metric, operation)] += count
+
+    def flush(self) -> t.Dict[t.Tuple[str, str], int]:
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+        for (metric, operation), count in counts.items():
+            with single_metric(
+                name=metric,
+                unit=MetricUnit.Count,
+                value=count,
+                namespace=self.namespace,
+            ) as m:
+                m.add_dimension(name="operation", value=operation)
+        return dict(counts)
+
+
+metrics = RetryMetrics(Settings().metrics_namespace)
+
+
+def _error_code(response: t.Optional[t.Tuple]) -> t.Optional[str]:
+    if response is None:
+        return None
+    _, parsed = response
+    return parsed.get("Error", {}).get("Code")
+
+
+def max_retry_delay_s(
+    settings: Settings, attempts: int, error_code: t.Optional[str]
+) -> float:
+    """
+    The longest botocore would sleep before retrying DynamoDB after its
+    `attempts`th attempt failed. The standard and adaptive modes sleep a random
+    part of this, the legacy mode all of it.
+    """
+    if settings.boto_client_retry_mode == "legacy":
+        # DynamoDB's entry in botocore's _retry.json
+        return 0.05 * 2 ** (attempts - 1)
+    # botocore.retries.standard.ExponentialBackoff's scales for DynamoDB
+    scale = 1 if error_code in THROTTLING_ERROR_CODES else 0.025
+    return min(scale * 2 ** (attempts - 1), 20)
+
+
+def _on_needs_retry(
+    settings: Settings,
+    client,
+    response=None,
+    caught_exception=None,
+    operation=None,
+    attempts=1,
+    **_,
+):
+    # Runs ahead of botocore's own retry handler for every attempt, returning
+    # None defers to the configured retry mode. Any other value is taken as a
+    # delay to sleep before retrying (False too, by older botocore), so
+    # giving up raises the error botocore would once out of attempts instead
+    error_code = _error_code(response)
+    if error_code in THROTTLING_ERROR_CODES:
+        metrics.record("DynamoThrottles", operation.name)
+    failed = error_code is not None or caught_exception is not None
+    # The backoff is only drawn once this defers, so allow for the longest
+    if failed and not deadline_allows(
+        max_retry_delay_s(settings, attempts, error_code), settings
+    ):
+        metrics.record("DynamoRetriesAbandoned", operation.name)
+        # Raising skips after-call, which would have counted these
+        metrics.record("DynamoRetries", operation.name, attempts - 1)
+        logger.warning(
+            "Not retrying request past the invocation deadline",
+            extra={"operation": operation.name, "remaining_ms": remaining_ms()},
+        )
+        if caught_exception is not None:
+            raise caught_exception
+        _, parsed = response
+        parsed.setdefault("ResponseMetadata", {})["RetryAttempts"] = attempts - 1
+        raise client.exceptions.from_code(error_code)(parsed, operation.name)
+    return None
+
+
+def _on_after_call(parsed=None, model=None, **_):
+    # Also runs for error responses, before they are raised as ClientErrors
+    retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+    metrics.record("DynamoRetries", model.name, retries)
+
+
+def instrument_client(client, settings: Settings):
+    """
+    Make a DynamoDB client's retries deadline aware and count its throttles
+    and retries per operation.
+    """
+    events = client.meta.events
+    events.register_first(
+        "needs-retry.dynamodb",
+        lambda **kwargs: _on_needs_retry(settings, client, **kwargs),
+        unique_id="deadline-aware-retries-dynamodb",
+    )
+    events.register(
+        "after-call.dynamodb", _on_after_call, unique_id="retry-metrics-dynamodb"
+    )
+    return client
@@ -1,15 +1,361 @@
+import typing as t
+import uuid
+from collections import Counter
+
+import arrow
 from mypy_boto3_dynamodb import DynamoDBClient
 
-from api.models import Action
+from api.batching import (
+    BATCH_WRITE_MAX_ITEMS,
+    chunked,
+    delete_keys,
+    get_items,
+    run_chunks,
+    serialize,
+    write_requests,
+)
+from api.config import Settings
+from api.log import logger
+from api.models import Action, ActionStatus
+from api.repository import DynamoActionRepository
+
+# What unfinished actions used to store as their completed_at#id prefix
+UNSET_COMPLETED_AT = f"{None}#"
+
+
+def store_actions(db: DynamoDBClient, *actions: Action) -> int:
+    settings = Settings()
+    for a in actions:
+        a.touch()
+    requests = [
+        {
+            "PutRequest": {
+                "Item": serialize(DynamoActionRepository.action_to_item(a, settings))
+            }
+        }
+        for a in actions
+    ]
+    return write_requests(db, requests)
+
+
+def get_actions(db: DynamoDBClient, *actions: Action) -> t.List[Action]:
+    settings = Settings()
+    keys = (DynamoActionRepository.action_key(a, settings) for a in actions)
+    return [DynamoActionRepository.item_to_action(item) for item in get_items(db, keys)]
+
+
+def delete_actions(db: DynamoDBClient, *actions: Action) -> int:
+    settings = Settings()
+    return delete_keys(
+        db,
+        (serialize(DynamoActionRepository.action_key(a, settings)) for a in actions),
+    )
+
+
+def _remove_unset_completed_at(
+    db: DynamoDBClient, keys: t.Sequence[t.Dict], settings: Settings
+) -> int:
+    removed = 0
+    for key in keys:
+        try:
+            db.update_item(
+                TableName=settings.dynamo_table_name,
+                Key=key,
+                UpdateExpression="REMOVE #completed_at_id",
+                ConditionExpression="begins_with(#completed_at_id, :unset)",
+                ExpressionAttributeNames={"#completed_at_id": "completed_at#id"},
+                ExpressionAttributeValues={":unset": {"S": UNSET_COMPLETED_AT}},
+            )
+            removed += 1
+        except db.exceptions.ConditionalCheckFailedException:
+            # The action completed or was deleted since it was scanned
+            continue
+    return removed
+
+
+def backfill_sparse_completed_at(db: DynamoDBClient) -> int:
+    """
+    Remove the placeholder completed_at#id attribute from items written before
+    the CompletedAtLSI became sparse. Returns the number of items updated.
+    """
+    settings = Settings()
+    keys = []
+    paginator = db.get_paginator("scan")
+    for page in paginator.paginate(
+        TableName=settings.dynamo_table_name,
+        ProjectionExpression="created_by, action_id",
+        FilterExpression="begins_with(#completed_at_id, :unset)",
+        ExpressionAttributeNames={"#completed_at_id": "completed_at#id"},
+        ExpressionAttributeValues={":unset": {"S": UNSET_COMPLETED_AT}},
+    ):
+        keys.extend(page["Items"])
+
+    chunks = list(chunked(keys, BATCH_WRITE_MAX_ITEMS))
+    removed = run_chunks(
+        lambda c: _remove_unset_completed_at(db, c, settings), chunks, settings
+    )
+    logger.info(
+        "Backfilled sparse completed_at#id",
+        extra={"matched": len(keys), "updated": sum(removed)},
+    )
+    return sum(removed)
+
+
+def _set_time_buckets(
+    db: DynamoDBClient, items: t.Sequence[t.Dict], settings: Settings
+) -> int:
+    updated = 0
+    for item in items:
+        try:
+            db.update_item(
+                TableName=settings.dynamo_table_name,
+                Key={"created_by": item["created_by"], "action_id": item["action_id"]},
+                UpdateExpression="SET #bucket = :bucket",
+                ConditionExpression="attribute_exists(action_id)",
+                ExpressionAttributeNames={"#bucket": "bucket"},
+                ExpressionAttributeValues={":bucket": {"S": item["bucket"]}},
+            )
+            updated += 1
+        except db.exceptions.ConditionalCheckFailedException:
+            # The action was deleted since it was scanned
+            continue
+    return updated
+
+
+def backfill_time_buckets(db: DynamoDBClient) -> int:
+    """
+    Put every action into the TimeBucketGSI bucket the current settings assign
+    it to, covering items written before the index existed or before the
+    bucket layout changed. Returns the number of items updated.
+    """
+    settings = Settings()
+    stale = []
+    paginator = db.get_paginator("scan")
+    for page in paginator.paginate(
+        TableName=settings.dynamo_table_name,
+        ProjectionExpression="created_by, action_id, #created_at_id, #bucket",
+        FilterExpression="begins_with(action_id, :action)",
+        ExpressionAttributeNames={
+            "#created_at_id": "created_at#id",
+            "#bucket": "bucket",
+        },
+        ExpressionAttributeValues={":action": {"S": "action#"}},
+    ):
+        for item in page["Items"]:
+            created_at, action_id = item["created_at#id"]["S"].split("#")
+            action = Action.construct(
+                id=uuid.UUID(action_id), created_at=arrow.get(created_at).datetime
+            )
+            bucket = DynamoActionRepository.time_bucket_key(action, settings)
+            if item.get("bucket", {}).get("S") != bucket:
+                stale.append({**item, "bucket": bucket})
+
+    chunks = list(chunked(stale, BATCH_WRITE_MAX_ITEMS))
+    updated = run_chunks(lambda c: _set_time_buckets(db, c, settings), chunks, settings)
+    logger.info(
+        "Backfilled time buckets",
+        extra={"matched": len(stale), "updated": sum(updated)},
+    )
+    return sum(updated)
+
+
+def _set_updated_at(
+    db: DynamoDBClient, items: t.Sequence[t.Dict], settings: Settings
+) -> int:
+    updated = 0
+    for item in items:
+        try:
+            db.update_item(
+                TableName=settings.dynamo_table_name,
+                Key={"created_by": item["created_by"], "action_id": item["action_id"]},
+                UpdateExpression="SET #updated_at_id = :updated_at_id",
+                # Left alone if the action was deleted or written since
+                ConditionExpression=(
+                    "attribute_exists(action_id) "
+                    "AND attribute_not_exists(#updated_at_id)"
+                ),
+                ExpressionAttributeNames={"#updated_at_id": "updated_at#id"},
+                ExpressionAttributeValues={
+                    ":updated_at_id": {"S": item["updated_at#id"]}
+                },
+            )
+            updated += 1
+        except db.exceptions.ConditionalCheckFailedException:
+            continue
+    return updated
+
+
+def backfill_updated_at(db: DynamoDBClient) -> int:
+    """
+    Add the updated_at#id attribute to actions written before it existed, so
+    that the UpdatedAtGSI covers them. They're taken to have last changed when
+    they finished, or else when they were created. Returns the number of items
+    updated.
+    """
+    settings = Settings()
+    stale = []
+    paginator = db.get_paginator("scan")
+    for page in paginator.paginate(
+        TableName=settings.dynamo_table_name,
+        ProjectionExpression=(
+            "created_by, action_id, #created_at_id, #completed_at_id"
+        ),
+        FilterExpression=(
+            "begins_with(action_id, :action) AND attribute_not_exists(#updated_at_id)"
+        ),
+        ExpressionAttributeNames={
+            "#created_at_id": "created_at#id",
+            "#completed_at_id": "completed_at#id",
+            "#updated_at_id": "updated_at#id",
+        },
+        ExpressionAttributeValues={":action": {"S": "action#"}},
+    ):
+        for item in page["Items"]:
+            # Both share the updated_at#id layout
+            changed = item.get("completed_at#id", item["created_at#id"])["S"]
+            # Placeholders left on unfinished actions by older versions
+            if changed.startswith(UNSET_COMPLETED_AT):
+                changed = item["created_at#id"]["S"]
+            stale.append(
+                {
+                    "created_by": item["created_by"],
+                    "action_id": item["action_id"],
+                    "updated_at#id": changed,
+                }
+            )
+
+    chunks = list(chunked(stale, BATCH_WRITE_MAX_ITEMS))
+    updated = run_chunks(lambda c: _set_updated_at(db, c, settings), chunks, settings)
+    logger.info(
+        "Backfilled updated_at#id",
+        extra={"matched": len(stale), "updated": sum(updated)},
+    )
+    return sum(updated)
+
+
+def _set_status_ids(
+    db: DynamoDBClient, items: t.Sequence[t.Dict], settings: Settings
+) -> int:
+    updated = 0
+    for item in items:
+        try:
+            db.update_item(
+                TableName=settings.dynamo_table_name,
+                Key={"created_by": item["created_by"], "action_id": item["action_id"]},
+                UpdateExpression="SET #status_id = :status_id",
+                # Left alone if the action was deleted or rewritten since
+                ConditionExpression="#status_id = :legacy",
+                ExpressionAttributeNames={"#status_id": "status#id"},
+                ExpressionAttributeValues={
+                    ":status_id": {"S": item["new_status#id"]},
+                    ":legacy": item["status#id"],
+                },
+            )
+            updated += 1
+        except db.exceptions.ConditionalCheckFailedException:
+            continue
+    return updated
+
+
+def backfill_status_id(db: DynamoDBClient) -> int:
+    """
+    Rewrite the status#id of actions written before it embedded created_at to
+    the current <status>#<created_at>#<id> layout, so that status queries
+    merge and page through them in creation order. Returns the number of
+    items updated.
+    """
+    settings = Settings()
+    stale = []
+    paginator = db.get_paginator("scan")
+    for page in paginator.paginate(
+        TableName=settings.dynamo_table_name,
+        ProjectionExpression="created_by, action_id, #status_id, #created_at_id",
+        FilterExpression=(
+            "begins_with(action_id, :action) AND NOT contains(#status_id, :time)"
+        ),
+        ExpressionAttributeNames={
+            "#status_id": "status#id",
+            "#created_at_id": "created_at#id",
+        },
+        ExpressionAttributeValues={":action": {"S": "action#"}, ":time": {"S": ":"}},
+    ):
+        for item in page["Items"]:
+            status = item["status#id"]["S"].split("#")[0]
+            stale.append(
+                {**item, "new_status#id": f"{status}#{item['created_at#id']['S']}"}
+            )
+
+    chunks = list(chunked(stale, BATCH_WRITE_MAX_ITEMS))
+    updated = run_chunks(lambda c: _set_status_ids(db, c, settings), chunks, settings)
+    logger.info(
+        "Backfilled status#id",
+        extra={"matched": len(stale), "updated": sum(updated)},
+    )
+    return sum(updated)
+
+
+StatusDeltas = t.Dict[str, t.Counter[str]]
+
+
+def apply_status_deltas(db: DynamoDBClient, deltas: StatusDeltas) -> int:
+    """
+    Atomically ADD each user's count changes (keyed by status value and
+    "total") to their stats item. Returns the number of items updated.
+    """
+    settings = Settings()
 
+    def update(user_id: str, delta: t.Counter[str]) -> int:
+        changes = {name: n for name, n in delta.items() if n}
+        if not changes:
+            return 0
+        names = {f"#a{i}": name for i, name in enumerate(changes)}
+        db.update_item(
+            TableName=settings.dynamo_table_name,
+            Key=serialize(DynamoActionRepository.stats_key(user_id)),
+            UpdateExpression="ADD " + ", ".join(f"{n} :{n[1:]}" for n in names),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={
+                f":{n[1:]}": {"N": str(changes[name])} for n, name in names.items()
+            },
+        )
+        return 1
 
-def store_actions(db: DynamoDBClient, *actions: Action):
-    ...
+    updated = run_chunks(lambda c: update(*c), list(deltas.items()), settings)
+    return sum(updated)
 
 
-def get_actions(db: DynamoDBClient, *actions: Action):
-    ...
+def reconcile_action_stats(db: DynamoDBClient) -> int:
+    """
+    Recount every user's actions by status from the table and overwrite their
+    stats items, correcting any drift in the incrementally maintained counts.
+    Returns the number of users whose stats were rewritten.
+    """
+    settings = Settings()
+    counts: t.Dict[str, t.Counter[str]] = {}
+    paginator = db.get_paginator("scan")
+    for page in paginator.paginate(
+        TableName=settings.dynamo_table_name,
+        ProjectionExpression="created_by, action_id, #status_id",
+        ExpressionAttributeNames={"#status_id": "status#id"},
+    ):
+        for item in page["Items"]:
+            # Sharded partition keys are suffixed with the shard
+            user_id = item["created_by"]["S"].split("#")[0]
+            user_counts = counts.setdefault(user_id, Counter())
+            if not item["action_id"]["S"].startswith("action#"):
+                continue
+            user_counts[item["status#id"]["S"].split("#")[0]] += 1
+            user_counts["total"] += 1
 
+    def rewrite(user_id: str, user_counts: t.Counter[str]) -> int:
+        item = {
+            **DynamoActionRepository.stats_key(user_id),
+            **{status.value: user_counts[status.value] for status in ActionStatus},
+            "total": user_counts["total"],
+        }
+        db.put_item(TableName=settings.dynamo_table_name, Item=serialize(item))
+        return 1
 
-def delete_actions(db: DynamoDBClient, *actions: Action):
-    ...
+    rewritten = run_chunks(lambda c: rewrite(*c), list(counts.items()), settings)
+    logger.info("Reconciled action stats", extra={"users": sum(rewritten)})
+    return sum(rewritten)
@@ -0,0 +1,65 @@
+import typing as t
+from collections import Counter
+
+from aws_lambda_powertools.utilities.data_classes import (
+    DynamoDBStreamEvent,
+    event_source,
+)
+from aws_lambda_powertools.utilities.data_classes.dynamo_db_stream_event import (
+    DynamoDBRecord,
+    DynamoDBRecordEventName,
+)
+
+from api import services
+from api.log import logger
+from api.repository import DynamoActionRepository, get_repository
+
+
+def _user_and_status(image: t.Optional[t.Dict]) -> t.Optional[t.Tuple[str, str]]:
+    """
+    The owner and status of an action item image, or None for any other item.
+    """
+    if not image or not image["action_id"].get_value.startswith("action#"):
+        return None
+    # Sharded partition keys are suffixed with the shard, and status#id leads
+    # with the status in every item format
+    user_id = image["created_by"].get_value.split("#")[0]
+    return user_id, image["status#id"].get_value.split("#")[0]
+
+
+def status_deltas(records: t.Iterable[DynamoDBRecord]) -> services.StatusDeltas:
+    """
+    Sum up how a batch of stream records changes each user's counts, so that
+    each user's stats item is updated once per batch however busy they are.
+    """
+    deltas: services.StatusDeltas = {}
+    for record in records:
+        assert record.dynamodb
+        old = _user_and_status(record.dynamodb.old_image)
+        new = _user_and_status(record.dynamodb.new_image)
+        if record.event_name == DynamoDBRecordEventName.REMOVE:
+            new = None
+        if old == new:
+            continue
+        if old is not None:
+            user_id, status = old
+            delta = deltas.setdefault(user_id, Counter())
+            delta[status] -= 1
+            delta["total"] -= 1
+        if new is not None:
+            user_id, status = new
+            delta = deltas.setdefault(user_id, Counter())
+            delta[status] += 1
+            delta["total"] += 1
+    return deltas
+
+
+# Deployed as its own lambda on the table's stream, see cdk/stack.py
+@logger.inject_lambda_context
+@event_source(data_class=DynamoDBStreamEvent)
+def handler(event: DynamoDBStreamEvent, context):
+    deltas = status_deltas(event.records)
+    repo = get_repository()
+    assert isinstance(repo, DynamoActionRepository)
+    updated = services.apply_status_deltas(repo.client, deltas)
+    logger.info("Applied action stats deltas", extra={"users": updated})
@@ -0,0 +1,160 @@
+import contextlib
+import threading
+import time
+import typing as t
+
+from api.log import Lazy, logger
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+class Span(t.NamedTuple):
+    name: str
+    # Milliseconds since the start of the trace
+    start_ms: float
+    duration_ms: float
+    parent: t.Optional[str]
+    attributes: t.Dict[str, t.Any]
+
+
+class Trace(t.NamedTuple):
+    route: str
+    duration_ms: float
+    spans: t.List[Span]
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        return {
+            "route": self.route,
+            "duration_ms": round(self.duration_ms, 3),
+            "spans": [
+                {
+                    **span._asdict(),
+                    "start_ms": round(span.start_ms, 3),
+                    "duration_ms": round(span.duration_ms, 3),
+                }
+                for span in self.spans
+            ],
+        }
+
+
+class _Recorder:
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.spans: t.List[Span] = []
+        # Spans nest per thread; those started on the query pool's threads
+        # have no parent
+        self.local = threading.local()
+
+    def finish(self) -> Trace:
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        return Trace(
+            self.route, duration_ms, sorted(self.spans, key=lambda s: s.start_ms)
+        )
+
+
+class _ActiveSpan:
+    __slots__ = ("recorder", "name", "attributes", "started", "parent")
+
+    def __init__(self, recorder: _Recorder, name: str, attributes: t.Dict):
+        self.recorder = recorder
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        stack = self.recorder.local.__dict__.setdefault("stack", [])
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        ended = time.perf_counter()
+        self.recorder.local.stack.pop()
+        self.recorder.spans.append(
+            Span(
+                self.name,
+                (self.started - self.recorder.started) * 1000,
+                (ended - self.started) * 1000,
+                self.parent,
+                self.attributes,
+            )
+        )
+
+
+# The invocation's recorder, if it's being traced. Like the retry deadline this
+# is a plain module global so that the query pool's threads record into it too
+_recorder: t.Optional[_Recorder] = None
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name: str, **attributes: t.Any) -> t.ContextManager[None]:
+    """
+    Time the block as a phase of the current trace, e.g.
+    `with tracing.span("dynamo", operation="Query"):`. Costs next to nothing
+    while nothing is being traced.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return _NO_SPAN
+    return _ActiveSpan(recorder, name, attributes)
+
+
+def start_trace(route: str):
+    global _recorder
+    _recorder = _Recorder(route)
+
+
+def end_trace() -> t.Optional[Trace]:
+    """
+    Stop tracing, returning the trace if one was started.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return None if recorder is None else recorder.finish()
+
+
+def server_timing(trace: Trace) -> str:
+    """
+    Format the trace as a Server-Timing header value, summing the durations of
+    spans with the same name. Spans on parallel threads can add up to more
+    than the total.
+    """
+    durations: t.Dict[str, float] = {}
+    for s in trace.spans:
+        durations[s.name] = durations.get(s.name, 0.0) + s.duration_ms
+    durations["total"] = trace.duration_ms
+    return ", ".join(f"{name};dur={ms:.3f}" for name, ms in durations.items())
+
+
+class Exporter(t.Protocol):
+    def export(self, trace: Trace):
+        ...
+
+
+class LogExporter:
+    """
+    Writes each trace as a structured "Trace" log record.
+    """
+
+    def export(self, trace: Trace):
+        logger.info("Trace", extra={"trace": Lazy(trace.as_dict)})
+
+
+class InMemoryExporter:
+    """
+    Keeps traces in memory, for tests and benchmarks.
+    """
+
+    def __init__(self):
+        self.traces: t.List[Trace] = []
+
+    def export(self, trace: Trace):
+        self.traces.append(trace)
+
+    def clear(self):
+        self.traces.clear()
+
+
+# Where traces go when APP_TRACING is on
+exporter: Exporter = LogExporter()
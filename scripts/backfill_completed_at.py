@@ -0,0 +1,18 @@
+"""
+Strip the placeholder completed_at#id from unfinished actions so that they drop
+out of the CompletedAtLSI. Safe to run repeatedly and against a live table.
+
+    APP_DYNAMO_TABLE_NAME=<table> poetry run python -m scripts.backfill_completed_at
+"""
+from api import services
+from api.repository import DynamoActionRepository
+
+
+def main():
+    repo = DynamoActionRepository()
+    updated = services.backfill_sparse_completed_at(repo.client)
+    print(f"Updated {updated} items in {repo.table.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+Rewrite status#id on actions written before it embedded created_at, so that
+status queries return them in creation order. Safe to run repeatedly and
+against a live table, deployed with `-c legacy_status_ids=true` until it has run.
+
+    APP_DYNAMO_TABLE_NAME=<table> poetry run python -m scripts.backfill_status_id
+"""
+from api import services
+from api.repository import DynamoActionRepository
+
+
+def main():
+    repo = DynamoActionRepository()
+    updated = services.backfill_status_id(repo.client)
+    print(f"Updated {updated} items in {repo.table.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+Assign every action its TimeBucketGSI bucket, for items written before the
+index existed or before the bucket settings changed. Safe to run repeatedly and
+against a live table.
+
+    APP_DYNAMO_TABLE_NAME=<table> poetry run python -m scripts.backfill_time_buckets
+"""
+from api import services
+from api.repository import DynamoActionRepository
+
+
+def main():
+    repo = DynamoActionRepository()
+    updated = services.backfill_time_buckets(repo.client)
+    print(f"Updated {updated} items in {repo.table.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+Add updated_at#id to actions written before delta sync existed, so that
+GET /actions?changed_since= returns them. Safe to run repeatedly and against a
+live table.
+
+    APP_DYNAMO_TABLE_NAME=<table> poetry run python -m scripts.backfill_updated_at
+"""
+from api import services
+from api.repository import DynamoActionRepository
+
+
+def main():
+    repo = DynamoActionRepository()
+    updated = services.backfill_updated_at(repo.client)
+    print(f"Updated {updated} items in {repo.table.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+Recount every user's actions by status and overwrite their stats items, fixing
+any drift in the counts the stream consumer maintains. Scans the whole table.
+
+    APP_DYNAMO_TABLE_NAME=<table> poetry run python -m scripts.reconcile_action_stats
+"""
+from api import services
+from api.repository import DynamoActionRepository
+
+
+def main():
+    repo = DynamoActionRepository()
+    rewritten = services.reconcile_action_stats(repo.client)
+    print(f"Reconciled stats for {rewritten} users in {repo.table.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+List every user's actions that have been PENDING for longer than the given
+number of minutes, as JSON lines, without scanning the table.
+
+    APP_DYNAMO_TABLE_NAME=<table> poetry run python -m scripts.stuck_actions 60
+"""
+import argparse
+
+import arrow
+
+from api.models import ActionStatus
+from api.repository import DynamoActionRepository
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("minutes", type=int, nargs="?", default=60)
+    args = parser.parse_args()
+
+    repo = DynamoActionRepository()
+    stuck = repo.get_all_actions_by_created_at(
+        until=arrow.utcnow().shift(minutes=-args.minutes).datetime,
+        statuses=[ActionStatus.PENDING],
+        with_details=False,
+    )
+    for action in stuck:
+        print(action.json())
+
+
+if __name__ == "__main__":
+    main()
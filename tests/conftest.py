@@ -7,8 +7,30 @@ import botocore
 import pytest
 from mypy_boto3_dynamodb import ServiceResource
 
+from api import idempotency as handler_idempotency
+from api import repository as handler_repository
 from lit_lambdas.api.config import Settings
-from lit_lambdas.api.repository import ActionRepository, DynamoActionRepository
+from lit_lambdas.api.repository import (
+    INDEX_INCLUDED_ATTRIBUTES,
+    TIME_BUCKET_INDEX,
+    UPDATED_AT_INDEX,
+    ActionRepository,
+    DynamoActionRepository,
+    InMemoryActionRepository,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_repository():
+    """
+    Handlers share a cached repository and idempotent responses; drop them so
+    that each test builds its own from its own settings
+    """
+    handler_repository.get_repository.cache_clear()
+    handler_idempotency.cache.clear()
+    yield
+    handler_repository.get_repository.cache_clear()
+    handler_idempotency.cache.clear()
 
 
 @pytest.fixture
@@ -25,6 +47,9 @@ def lambda_context():
         invoked_function_arn: str = "arn:aws:lambda:us-east-1:000000000:function:test"
         aws_request_id: str = str(uuid.UUID(int=0))
 
+        def get_remaining_time_in_millis(self) -> int:
+            return 3000
+
     return LambdaContext()
 
 
@@ -93,17 +118,32 @@ def apigateway_event() -> t.Dict[str, t.Any]:
 
 
 @pytest.fixture
-def localstack_settings(monkeypatch) -> Settings:
+def lsi_projection() -> str:
+    return "ALL"
+
+
+@pytest.fixture
+def localstack_settings(monkeypatch, lsi_projection: str) -> Settings:
     monkeypatch.setenv("APP_DYNAMO_TABLE_NAME", "tests")
     monkeypatch.setenv("APP_DYNAMO_ENDPOINT_URL", "http://localhost:4566")
     monkeypatch.setenv("APP_BOTO_CLIENT_REGION_NAME", "test")
     monkeypatch.setenv("APP_BOTO_CLIENT_CONNECTION_TIMEOUT", "1")
+    # The local DynamoDB answers far slower than the real one under load
+    monkeypatch.setenv("APP_BOTO_CLIENT_READ_TIMEOUT", "10")
     monkeypatch.setenv("APP_BOTO_CLIENT_CONNECTION_RETRIES", "1")
+    monkeypatch.setenv("APP_DYNAMO_LSI_PROJECTION", lsi_projection)
     return Settings()
 
 
 @pytest.fixture(scope="function")
 def using_localstack(localstack_settings: Settings):
+    if localstack_settings.dynamo_lsi_projection == "INCLUDE":
+        projection = {
+            "ProjectionType": "INCLUDE",
+            "NonKeyAttributes": INDEX_INCLUDED_ATTRIBUTES,
+        }
+    else:
+        projection = {"ProjectionType": "ALL"}
     dynamo: ServiceResource = boto3.resource(
         "dynamodb",
         config=localstack_settings.boto_client_config,
@@ -124,6 +164,8 @@ def using_localstack(localstack_settings: Settings):
                 {"AttributeName": "created_at#id", "AttributeType": "S"},
                 {"AttributeName": "completed_at#id", "AttributeType": "S"},
                 {"AttributeName": "status#id", "AttributeType": "S"},
+                {"AttributeName": "bucket", "AttributeType": "S"},
+                {"AttributeName": "updated_at#id", "AttributeType": "S"},
             ],
             LocalSecondaryIndexes=[
                 {
@@ -132,7 +174,7 @@ def using_localstack(localstack_settings: Settings):
                         {"AttributeName": "created_by", "KeyType": "HASH"},
                         {"AttributeName": "created_at#id", "KeyType": "RANGE"},
                     ],
-                    "Projection": {"ProjectionType": "ALL"},
+                    "Projection": projection,
                 },
                 {
                     "IndexName": "CompletedAtLSI",
@@ -140,7 +182,7 @@ def using_localstack(localstack_settings: Settings):
                         {"AttributeName": "created_by", "KeyType": "HASH"},
                         {"AttributeName": "completed_at#id", "KeyType": "RANGE"},
                     ],
-                    "Projection": {"ProjectionType": "ALL"},
+                    "Projection": projection,
                 },
                 {
                     "IndexName": "ActionStatusLSI",
@@ -148,6 +190,27 @@ def using_localstack(localstack_settings: Settings):
                         {"AttributeName": "created_by", "KeyType": "HASH"},
                         {"AttributeName": "status#id", "KeyType": "RANGE"},
                     ],
+                    "Projection": projection,
+                },
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": TIME_BUCKET_INDEX,
+                    "KeySchema": [
+                        {"AttributeName": "bucket", "KeyType": "HASH"},
+                        {"AttributeName": "status#id", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {
+                        "ProjectionType": "INCLUDE",
+                        "NonKeyAttributes": INDEX_INCLUDED_ATTRIBUTES,
+                    },
+                },
+                {
+                    "IndexName": UPDATED_AT_INDEX,
+                    "KeySchema": [
+                        {"AttributeName": "created_by", "KeyType": "HASH"},
+                        {"AttributeName": "updated_at#id", "KeyType": "RANGE"},
+                    ],
                     "Projection": {"ProjectionType": "ALL"},
                 },
             ],
@@ -170,3 +233,14 @@ def using_localstack(localstack_settings: Settings):
 @pytest.fixture
 def repo(using_localstack) -> ActionRepository:
     return DynamoActionRepository()
+
+
+@pytest.fixture
+def sharded_repo(monkeypatch, using_localstack) -> ActionRepository:
+    monkeypatch.setenv("APP_DYNAMO_SHARD_COUNT", "4")
+    return DynamoActionRepository()
+
+
+@pytest.fixture
+def in_memory_repo() -> ActionRepository:
+    return InMemoryActionRepository()
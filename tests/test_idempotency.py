@@ -0,0 +1,25 @@
+import time
+
+from api.idempotency import ResponseCache
+from lit_lambdas.api.responses import Ok
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_size=2, ttl_s=60)
+    cache.put("user", "a", Ok.as_json("a"))
+    cache.put("user", "b", Ok.as_json("b"))
+    assert cache.get("user", "a") is not None
+    cache.put("user", "c", Ok.as_json("c"))
+
+    assert cache.get("user", "b") is None
+    assert cache.get("user", "a") == Ok.as_json("a")
+    assert cache.get("other-user", "c") is None
+
+
+def test_response_cache_expires_entries(monkeypatch):
+    cache = ResponseCache(max_size=2, ttl_s=60)
+    cache.put("user", "a", Ok.as_json("a"))
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+
+    assert cache.get("user", "a") is None
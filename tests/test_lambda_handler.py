@@ -1,11 +1,22 @@
 import json
 from unittest.mock import patch
 
+import arrow
 from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
 
+from api import idempotency as handler_idempotency
+from api.idempotency import IDEMPOTENT_REPLAYED_HEADER
+from api.repository import get_repository
 from lit_lambdas.api.index import handler
 from lit_lambdas.api.models import Action
-from lit_lambdas.api.responses import NotFound, Ok
+from lit_lambdas.api.responses import (
+    CHANGES_CURSOR_HEADER,
+    MORE_CHANGES_HEADER,
+    NEXT_PAGE_HEADER,
+    BadRequest,
+    NotFound,
+    Ok,
+)
 
 
 def test_introspect_handler(apigateway_event, lambda_context):
@@ -53,6 +64,194 @@ def test_run_returns_action(using_localstack, apigateway_event, lambda_context):
     event = APIGatewayProxyEvent(apigateway_event)
     resp = handler(event, lambda_context)
 
-    assert "headers" in resp and resp["headers"] == Ok.headers
+    assert "headers" in resp and resp["headers"] == {
+        **Ok.headers,
+        "Cache-Control": "no-cache",
+    }
     assert "statusCode" in resp and resp["statusCode"] == Ok.http_status
     assert "body" in resp and Action(**json.loads(resp["body"]))
+
+
+def test_purge_handler(apigateway_event, lambda_context):
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "DELETE"
+    event = APIGatewayProxyEvent(apigateway_event)
+    with patch("lit_lambdas.api.index.purge") as purge_mock:
+        handler(event, lambda_context)
+
+    purge_mock.assert_called_once()
+
+
+def test_release_handler(apigateway_event, lambda_context):
+    apigateway_event["path"] = "/actions/some-id"
+    apigateway_event["httpMethod"] = "DELETE"
+    event = APIGatewayProxyEvent(apigateway_event)
+    with patch("lit_lambdas.api.index.release") as release_mock:
+        handler(event, lambda_context)
+
+    release_mock.assert_called_once()
+
+
+def test_release_removes_action(using_localstack, apigateway_event, lambda_context):
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    action = Action(**json.loads(handler(apigateway_event, lambda_context)["body"]))
+
+    apigateway_event["path"] = f"/actions/{action.id}"
+    apigateway_event["pathParameters"] = {"action_id": str(action.id)}
+    apigateway_event["httpMethod"] = "DELETE"
+    resp = handler(apigateway_event, lambda_context)
+    assert resp["statusCode"] == Ok.http_status
+
+    resp = handler(apigateway_event, lambda_context)
+    assert resp["statusCode"] == NotFound.http_status
+
+
+def test_warmup_handler(lambda_context):
+    with patch("lit_lambdas.api.index.warmup") as warmup_mock:
+        handler({"warmup": True}, lambda_context)
+
+    warmup_mock.assert_called_once()
+
+
+def test_warmup_does_not_touch_table(using_localstack, lambda_context):
+    resp = handler({"warmup": True}, lambda_context)
+
+    assert resp["statusCode"] == Ok.http_status
+    assert using_localstack.scan()["Count"] == 0
+
+
+def test_in_memory_backend_round_trip(monkeypatch, apigateway_event, lambda_context):
+    monkeypatch.setenv("APP_REPOSITORY_BACKEND", "memory")
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    action = Action(**json.loads(handler(apigateway_event, lambda_context)["body"]))
+
+    apigateway_event["path"] = f"/actions/{action.id}"
+    apigateway_event["pathParameters"] = {"action_id": str(action.id)}
+    apigateway_event["httpMethod"] = "GET"
+    resp = handler(apigateway_event, lambda_context)
+
+    assert resp["statusCode"] == Ok.http_status
+    assert Action(**json.loads(resp["body"])) == action
+
+
+def test_enumerate_accepts_repeated_status_qargs(
+    monkeypatch, apigateway_event, lambda_context
+):
+    monkeypatch.setenv("APP_REPOSITORY_BACKEND", "memory")
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    for _ in range(3):
+        handler(apigateway_event, lambda_context)
+
+    apigateway_event["httpMethod"] = "GET"
+    apigateway_event["queryStringParameters"] = {"status": "FAILED", "limit": "2"}
+    apigateway_event["multiValueQueryStringParameters"] = {
+        "status": ["PENDING", "FAILED"],
+        "limit": ["2"],
+    }
+    resp = handler(apigateway_event, lambda_context)
+
+    assert resp["statusCode"] == Ok.http_status
+    assert len(json.loads(resp["body"])) == 2
+    assert NEXT_PAGE_HEADER in resp["headers"]
+
+
+def test_enumerate_latest_actions(monkeypatch, apigateway_event, lambda_context):
+    monkeypatch.setenv("APP_REPOSITORY_BACKEND", "memory")
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    created = [
+        Action(**json.loads(handler(apigateway_event, lambda_context)["body"]))
+        for _ in range(3)
+    ]
+
+    apigateway_event["httpMethod"] = "GET"
+    apigateway_event["queryStringParameters"] = {"order": "desc", "limit": "2"}
+    resp = handler(apigateway_event, lambda_context)
+
+    expected = sorted(created, key=lambda a: (a.created_at, str(a.id)), reverse=True)
+    assert resp["statusCode"] == Ok.http_status
+    assert [Action(**a) for a in json.loads(resp["body"])] == expected[:2]
+    assert NEXT_PAGE_HEADER in resp["headers"]
+
+
+def test_enumerate_changed_since(monkeypatch, apigateway_event, lambda_context):
+    monkeypatch.setenv("APP_REPOSITORY_BACKEND", "memory")
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    # Older than APP_CHANGES_SETTLE_S, which would otherwise hold the cursor back
+    an_hour_ago = arrow.utcnow().shift(hours=-1).datetime
+    with patch("api.models._get_now", lambda: an_hour_ago):
+        for _ in range(3):
+            handler(apigateway_event, lambda_context)
+
+    apigateway_event["httpMethod"] = "GET"
+    apigateway_event["queryStringParameters"] = {"changed_since": "", "limit": "2"}
+    first = handler(apigateway_event, lambda_context)
+    assert first["statusCode"] == Ok.http_status
+    assert len(json.loads(first["body"])) == 2
+    assert first["headers"][MORE_CHANGES_HEADER] == "true"
+
+    apigateway_event["queryStringParameters"] = {
+        "changed_since": first["headers"][CHANGES_CURSOR_HEADER]
+    }
+    rest = handler(apigateway_event, lambda_context)
+    assert rest["statusCode"] == Ok.http_status
+    assert len(json.loads(rest["body"])) == 1
+    assert MORE_CHANGES_HEADER not in rest["headers"]
+    assert CHANGES_CURSOR_HEADER in rest["headers"]
+
+    apigateway_event["queryStringParameters"] = {"changed_since": "not a cursor!"}
+    resp = handler(apigateway_event, lambda_context)
+    assert resp["statusCode"] == BadRequest.http_status
+
+
+def test_run_replays_idempotent_requests(
+    using_localstack, apigateway_event, lambda_context
+):
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    apigateway_event["headers"] = {"idempotency-key": "retry-me"}
+    first = handler(apigateway_event, lambda_context)
+    second = handler(apigateway_event, lambda_context)
+    # Another warm Lambda wouldn't have the response cached in process
+    handler_idempotency.cache.clear()
+    third = handler(apigateway_event, lambda_context)
+
+    assert first["body"] == second["body"] == third["body"]
+    assert IDEMPOTENT_REPLAYED_HEADER not in first["headers"]
+    assert second["headers"][IDEMPOTENT_REPLAYED_HEADER] == "true"
+    assert third["headers"][IDEMPOTENT_REPLAYED_HEADER] == "true"
+    action = Action(**json.loads(first["body"]))
+    assert get_repository().enumerate_actions_for_user(str(action.created_by)) == [
+        action
+    ]
+
+
+def test_run_rejects_invalid_idempotency_keys(apigateway_event, lambda_context):
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    apigateway_event["headers"] = {"Idempotency-Key": "not a valid key"}
+    resp = handler(apigateway_event, lambda_context)
+
+    assert resp["statusCode"] == BadRequest.http_status
+
+
+def test_stats_handler(monkeypatch, apigateway_event, lambda_context):
+    monkeypatch.setenv("APP_REPOSITORY_BACKEND", "memory")
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    for _ in range(2):
+        handler(apigateway_event, lambda_context)
+
+    apigateway_event["path"] = "/actions/stats"
+    apigateway_event["httpMethod"] = "GET"
+    resp = handler(apigateway_event, lambda_context)
+
+    assert resp["statusCode"] == Ok.http_status
+    assert json.loads(resp["body"]) == {
+        "counts": {"SUCCEEDED": 0, "FAILED": 0, "PENDING": 2},
+        "total": 2,
+    }
@@ -0,0 +1,70 @@
+import io
+import json
+import logging
+
+import pytest
+
+from api.log import BufferingHandler, Lazy, _json_default
+
+
+def make_record(level: int, msg: str) -> logging.LogRecord:
+    return logging.LogRecord("gw-api", level, __file__, 1, msg, None, None)
+
+
+@pytest.fixture
+def handler() -> BufferingHandler:
+    return BufferingHandler(capacity=10, stream=io.StringIO())
+
+
+def written(handler: BufferingHandler) -> list:
+    return handler.stream.getvalue().splitlines()
+
+
+def test_records_pass_through_outside_an_invocation(handler: BufferingHandler):
+    handler.emit(make_record(logging.INFO, "init"))
+    assert written(handler) == ["init"]
+
+
+def test_records_are_held_until_the_invocation_ends(handler: BufferingHandler):
+    handler.start(sampled=True)
+    handler.emit(make_record(logging.INFO, "dispatch"))
+    assert written(handler) == []
+
+    handler.stop(failed=False)
+    assert written(handler) == ["dispatch"]
+
+
+def test_unsampled_invocations_keep_only_warnings(handler: BufferingHandler):
+    handler.start(sampled=False)
+    handler.emit(make_record(logging.INFO, "dispatch"))
+    handler.emit(make_record(logging.WARNING, "not found"))
+    handler.stop(failed=False)
+
+    assert written(handler) == ["not found"]
+
+
+def test_failed_invocations_keep_everything(handler: BufferingHandler):
+    handler.start(sampled=False)
+    handler.emit(make_record(logging.INFO, "dispatch"))
+    handler.stop(failed=True)
+
+    assert written(handler) == ["dispatch"]
+
+
+def test_full_buffer_is_flushed(handler: BufferingHandler):
+    handler.start(sampled=True)
+    for i in range(handler.capacity):
+        handler.emit(make_record(logging.INFO, str(i)))
+
+    assert len(written(handler)) == handler.capacity
+
+
+def test_lazy_values_are_computed_on_serialization():
+    calls = []
+    value = Lazy(lambda: calls.append(1) or {"errors": 1})
+    assert calls == []
+
+    assert json.loads(json.dumps({"extra": value}, default=_json_default)) == {
+        "extra": {"errors": 1}
+    }
+    assert calls == [1]
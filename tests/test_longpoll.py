@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+
+import arrow
+import pytest
+from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+
+from api.models import Action, ActionStatus
+from api.repository import get_repository
+from lit_lambdas.api.index import deadline_ms, handler, route
+from lit_lambdas.api.responses import BadRequest, NotFound, Ok
+
+
+@pytest.fixture
+def pending_action(monkeypatch, apigateway_event, lambda_context) -> Action:
+    monkeypatch.setenv("APP_REPOSITORY_BACKEND", "memory")
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    return Action(**json.loads(handler(apigateway_event, lambda_context)["body"]))
+
+
+def get_status(apigateway_event, lambda_context, action: Action, wait: str):
+    apigateway_event["path"] = f"/actions/{action.id}"
+    apigateway_event["pathParameters"] = {"action_id": str(action.id)}
+    apigateway_event["httpMethod"] = "GET"
+    apigateway_event["queryStringParameters"] = {"wait": wait}
+    apigateway_event["multiValueQueryStringParameters"] = None
+    started = time.monotonic()
+    resp = handler(APIGatewayProxyEvent(apigateway_event), lambda_context)
+    return resp, time.monotonic() - started
+
+
+def later(delay_s: float, fn):
+    timer = threading.Timer(delay_s, fn)
+    timer.start()
+    return timer
+
+
+def test_wait_returns_once_the_action_finishes(
+    pending_action, apigateway_event, lambda_context
+):
+    finished = pending_action.copy(
+        update={
+            "status": ActionStatus.SUCCEEDED,
+            "completed_at": arrow.utcnow().datetime,
+        }
+    )
+    later(0.3, lambda: get_repository().store_actions(finished))
+
+    resp, elapsed = get_status(apigateway_event, lambda_context, pending_action, "10")
+
+    assert resp["statusCode"] == Ok.http_status
+    assert Action(**json.loads(resp["body"])).status == ActionStatus.SUCCEEDED
+    assert 0.3 <= elapsed < 2
+
+
+def test_wait_runs_out(pending_action, apigateway_event, lambda_context):
+    resp, elapsed = get_status(apigateway_event, lambda_context, pending_action, "0.5")
+
+    assert resp["statusCode"] == Ok.http_status
+    assert Action(**json.loads(resp["body"])).status == ActionStatus.PENDING
+    assert 0.5 <= elapsed < 1.5
+
+
+def test_wait_stops_short_of_the_deadline(
+    monkeypatch, pending_action, apigateway_event, lambda_context
+):
+    # The mock context always has 3s left
+    monkeypatch.setenv("APP_BOTO_CLIENT_DEADLINE_MARGIN_MS", "2500")
+
+    resp, elapsed = get_status(apigateway_event, lambda_context, pending_action, "10")
+
+    assert resp["statusCode"] == Ok.http_status
+    assert elapsed < 1
+
+
+def test_finished_actions_are_returned_straight_away(
+    pending_action, apigateway_event, lambda_context
+):
+    get_repository().store_actions(
+        pending_action.copy(update={"status": ActionStatus.FAILED})
+    )
+
+    resp, elapsed = get_status(apigateway_event, lambda_context, pending_action, "10")
+
+    assert Action(**json.loads(resp["body"])).status == ActionStatus.FAILED
+    assert elapsed < 0.5
+
+
+def test_wait_ends_when_the_action_is_deleted(
+    pending_action, apigateway_event, lambda_context
+):
+    later(0.3, lambda: get_repository().delete_actions(pending_action))
+
+    resp, elapsed = get_status(apigateway_event, lambda_context, pending_action, "10")
+
+    assert resp["statusCode"] == NotFound.http_status
+    assert elapsed < 2
+
+
+@pytest.mark.parametrize("wait", ["-1", "soon"])
+def test_invalid_wait_is_rejected(
+    pending_action, apigateway_event, lambda_context, wait: str
+):
+    resp, _ = get_status(apigateway_event, lambda_context, pending_action, wait)
+
+    assert resp["statusCode"] == BadRequest.http_status
+
+
+@pytest.mark.parametrize("wait,expected_ms", [(None, 3000), ("10", 25000)])
+def test_only_long_polls_get_the_whole_timeout(
+    monkeypatch, pending_action, apigateway_event, lambda_context, wait, expected_ms
+):
+    monkeypatch.setattr(lambda_context, "get_remaining_time_in_millis", lambda: 25000)
+    apigateway_event["path"] = f"/actions/{pending_action.id}"
+    apigateway_event["httpMethod"] = "GET"
+    apigateway_event["queryStringParameters"] = None if wait is None else {"wait": wait}
+
+    assert (
+        deadline_ms(
+            route(APIGatewayProxyEvent(apigateway_event)),
+            APIGatewayProxyEvent(apigateway_event),
+            lambda_context,
+        )
+        == expected_ms
+    )
@@ -0,0 +1,126 @@
+import json
+import tracemalloc
+import uuid
+from unittest.mock import patch
+
+import pytest
+from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+
+from api import memory
+from api.config import Settings
+from api.endpoints import enumerate
+from api.models import Action
+from api.repository import get_repository
+from lit_lambdas.api.index import handler
+
+# Peak allocation budget for enumerating every action: a fixed allowance for
+# the first use of the encoder and friends, and a little under 4x the ~260
+# byte JSON encoding of each action
+BASE_BUDGET = 1024 * 1024
+PER_ACTION_BUDGET = 1024
+# Reading from DynamoDB also holds each page's raw response, its parsed and
+# deserialized items, and any items fetched to hydrate an index query
+DYNAMO_BASE_BUDGET = 2 * 1024 * 1024
+DYNAMO_PER_ACTION_BUDGET = 8 * 1024
+
+
+@pytest.fixture
+def memory_backend(monkeypatch):
+    monkeypatch.setenv("APP_REPOSITORY_BACKEND", "memory")
+    get_repository.cache_clear()
+    yield get_repository()
+    get_repository.cache_clear()
+
+
+@pytest.mark.parametrize("count", [1000, 10000])
+def test_enumerate_peak_memory(memory_backend, apigateway_event, count):
+    memory_backend.store_actions(
+        *[
+            Action(created_by=uuid.UUID(int=0), details={"endpoint": "run"})
+            for _ in range(count)
+        ]
+    )
+    apigateway_event["path"] = "/actions"
+    apigateway_event["queryStringParameters"] = None
+    apigateway_event["multiValueQueryStringParameters"] = None
+    event = APIGatewayProxyEvent(apigateway_event)
+
+    with memory.traced() as usage:
+        response = enumerate(event)
+
+    assert len(json.loads(response["body"])) == count
+    (peak, retained), *_ = usage
+    assert peak < BASE_BUDGET + PER_ACTION_BUDGET * count
+    # Little beyond the response body itself should outlive the request
+    assert retained < peak
+
+
+@pytest.fixture
+def dynamo_backend(using_localstack):
+    get_repository.cache_clear()
+    yield get_repository()
+    get_repository.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "lsi_projection,query",
+    [
+        ("ALL", None),
+        # Index query plus a BatchGetItem for every action's details
+        ("INCLUDE", {"status": "PENDING"}),
+    ],
+)
+def test_enumerate_peak_memory_from_dynamo(
+    dynamo_backend, apigateway_event, lsi_projection, query
+):
+    count = 1000
+    dynamo_backend.store_actions(
+        *[
+            Action(created_by=uuid.UUID(int=0), details={"endpoint": "run"})
+            for _ in range(count)
+        ]
+    )
+    apigateway_event["path"] = "/actions"
+    apigateway_event["queryStringParameters"] = query
+    apigateway_event["multiValueQueryStringParameters"] = None
+    event = APIGatewayProxyEvent(apigateway_event)
+
+    with memory.traced() as usage:
+        response = enumerate(event)
+
+    assert len(json.loads(response["body"])) == count
+    (peak, retained), *_ = usage
+    assert peak < DYNAMO_BASE_BUDGET + DYNAMO_PER_ACTION_BUDGET * count
+    assert retained < peak
+
+
+def test_traced_restores_tracing():
+    tracemalloc.start()
+    try:
+        with memory.traced() as usage:
+            _ = [object() for _ in range(1000)]
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    assert len(usage) == 1 and usage[0].peak >= usage[0].retained
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_handler_reports_memory(apigateway_event, lambda_context, enabled):
+    apigateway_event["path"] = "/"
+    apigateway_event["httpMethod"] = "GET"
+    event = APIGatewayProxyEvent(apigateway_event)
+    settings = Settings(memory_profiling=enabled)
+    with patch("lit_lambdas.api.index.settings", settings), patch(
+        "api.memory.logger"
+    ) as logger_mock:
+        handler(event, lambda_context)
+
+    if not enabled:
+        logger_mock.info.assert_not_called()
+        return
+    logger_mock.info.assert_called_once()
+    message, kwargs = logger_mock.info.call_args[0][0], logger_mock.info.call_args[1]
+    assert message == "Invocation memory"
+    assert kwargs["extra"]["route"] == "introspect"
+    assert kwargs["extra"]["peak_bytes"] >= kwargs["extra"]["retained_bytes"]
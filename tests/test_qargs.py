@@ -2,39 +2,123 @@ import arrow
 import pytest
 from pydantic import ValidationError
 
-from api.models import EnumerationQueryArgs
+from api.models import ActionStatus, EnumerationQueryArgs
+from api.qargs import parse_enumeration_args
 
 
-def test_empty_qargs_parse_as_null():
-    qargs = EnumerationQueryArgs(**{})
+@pytest.fixture(
+    params=[lambda raw: EnumerationQueryArgs(**raw), parse_enumeration_args],
+    ids=["model", "parser"],
+)
+def parse(request):
+    """
+    The dedicated parser must accept and reject the same arguments as the
+    model it builds
+    """
+    return request.param
+
+
+def test_empty_qargs_parse_as_null(parse):
+    qargs = parse({})
 
     assert qargs.status is None
     assert qargs.created_at is None
     assert qargs.completed_at is None
 
 
-def test_multiple_qargs_fail_parsing():
+def test_multiple_qargs_fail_parsing(parse):
     with pytest.raises(ValidationError):
-        EnumerationQueryArgs(
-            **{"status": "PENDING", "created_at": str(arrow.utcnow().datetime)}
-        )
+        parse({"status": "PENDING", "created_at": str(arrow.utcnow().datetime)})
 
 
-def test_invalid_status_qarg_fails_parsing():
+def test_invalid_status_qarg_fails_parsing(parse):
     with pytest.raises(ValidationError):
-        EnumerationQueryArgs(**{"status": "TEST"})
+        parse({"status": "TEST"})
 
 
 @pytest.mark.parametrize("qarg_value", ["PENDING", "SUCCEEDED", "FAILED"])
-def test_valid_status_qargs_parse(qarg_value: str):
-    EnumerationQueryArgs(**{"status": qarg_value})
+def test_valid_status_qargs_parse(parse, qarg_value: str):
+    parse({"status": qarg_value})
 
 
 @pytest.mark.parametrize("qarg_value", ["TEST", "", 2])
-def test_invalid_datetime_value_qarg_fails_parsing(qarg_value: str):
+def test_invalid_datetime_value_qarg_fails_parsing(parse, qarg_value: str):
+    with pytest.raises(ValidationError):
+        parse({"created_at": qarg_value})
+
+
+def test_valid_datetime_qarg_parses(parse):
+    parse({"created_at": str(arrow.utcnow().datetime)})
+
+
+def test_comma_separated_status_qargs_parse(parse):
+    qargs = parse({"status": "PENDING,FAILED,PENDING"})
+
+    assert qargs.status == [ActionStatus.PENDING, ActionStatus.FAILED]
+
+
+def test_invalid_status_in_list_fails_parsing(parse):
+    with pytest.raises(ValidationError):
+        parse({"status": "PENDING,TEST"})
+
+
+def test_pagination_qargs_without_filter(parse):
+    qargs = parse({"limit": "10", "order": "desc"})
+    assert qargs.limit == 10
+    assert qargs.descending
+    assert qargs.paginated
+
+
+def test_invalid_order_qarg_fails_parsing(parse):
+    with pytest.raises(ValidationError):
+        parse({"order": "sideways"})
+
+
+@pytest.mark.parametrize("qarg_value", ["0", "-1", "ten"])
+def test_invalid_limit_qarg_fails_parsing(parse, qarg_value: str):
+    with pytest.raises(ValidationError):
+        parse({"status": "PENDING", "limit": qarg_value})
+
+
+@pytest.mark.parametrize("cursor", ["", "c29tZSBjdXJzb3I="])
+def test_changed_since_qarg_parses(parse, cursor: str):
+    qargs = parse({"changed_since": cursor, "limit": "10"})
+
+    assert qargs.changed_since == cursor
+    assert qargs.limit == 10
+
+
+@pytest.mark.parametrize(
+    "other", [{"status": "PENDING"}, {"order": "desc"}, {"page": "abc"}]
+)
+def test_changed_since_qarg_excludes_other_qargs(parse, other):
     with pytest.raises(ValidationError):
-        EnumerationQueryArgs(**{"created_at": qarg_value})
+        parse({"changed_since": "", **other})
 
 
-def test_valid_datetime_qarg_parses():
-    EnumerationQueryArgs(**{"created_at": str(arrow.utcnow().datetime)})
+@pytest.mark.parametrize(
+    "raw",
+    [
+        {},
+        {"created_at": "2021-01-01T00:00:00+00:00"},
+        {"completed_at": "2021-01-01T00:00:00+00:00,2021-02-01T00:00:00+00:00"},
+        {"created_at": "1609459200,2021-02-01"},
+        {"status": "FAILED,PENDING,FAILED", "limit": "3", "order": "asc", "page": "x"},
+        {"changed_since": "", "limit": "5", "unknown": "ignored"},
+        {"created_at": "2021-01-01,2021-02-01,2021-03-01"},
+        {"created_at": "2021-01-01,"},
+        {"status": "PENDING", "completed_at": "2021-01-01", "limit": "0"},
+        {"status": "", "order": "up"},
+        {"status": "PENDING,PENDING,TEST,NOPE"},
+    ],
+)
+def test_parser_matches_model(raw):
+    try:
+        expected = EnumerationQueryArgs(**raw)
+    except ValidationError as e:
+        with pytest.raises(ValidationError) as parsed:
+            parse_enumeration_args(raw)
+        locs = {error["loc"] for error in parsed.value.errors()}
+        assert locs == {error["loc"] for error in e.errors()}
+    else:
+        assert parse_enumeration_args(raw).dict() == expected.dict()
@@ -1,12 +1,20 @@
 import random
 import typing as t
 import uuid
+from unittest.mock import patch
 
 import arrow
+import pytest
 
+from lit_lambdas.api import models
 from lit_lambdas.api.config import Settings
-from lit_lambdas.api.models import Action, ActionStatus
-from lit_lambdas.api.repository import ActionRepository
+from lit_lambdas.api.models import Action, ActionPage, ActionStatus
+from lit_lambdas.api.repository import (
+    COMPACT_ITEM_FORMAT,
+    LEGACY_ITEM_FORMAT,
+    ActionRepository,
+    DynamoActionRepository,
+)
 
 
 def generate_actions(
@@ -245,3 +253,571 @@ def test_expired_items_are_not_returned(repo: ActionRepository):
 
     result = repo.enumerate_actions_for_user(str(test_user_id))
     assert len(result) == 0
+
+
+def test_sharded_actions_can_be_retrieved_by_id(sharded_repo: ActionRepository):
+    actions = generate_actions(20)
+    store_actions(sharded_repo, *actions)
+
+    for action in actions:
+        result = sharded_repo.get_action_by_id(str(action.created_by), str(action.id))
+        assert result == action
+
+
+def test_sharded_actions_are_spread_across_partitions(sharded_repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(20, created_by=test_user_id)
+    store_actions(sharded_repo, *actions)
+
+    items = sharded_repo.table.scan()["Items"]
+    assert len(set(item["created_by"] for item in items)) > 1
+
+    result = sharded_repo.enumerate_actions_for_user(str(test_user_id))
+    assert set(r.id for r in result) == set(a.id for a in actions)
+
+
+def test_sharded_created_at_query_is_merged_in_order(sharded_repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(20, created_by=test_user_id, randomize_created_at=True)
+    store_actions(sharded_repo, *actions)
+
+    result = sharded_repo.get_actions_by_created_at(str(test_user_id))
+
+    assert [r.id for r in result] == [
+        a.id for a in sorted(actions, key=lambda a: (a.created_at, str(a.id)))
+    ]
+
+
+def test_sharded_status_query_is_merged_in_order(sharded_repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(20, created_by=test_user_id, status=ActionStatus.FAILED)
+    store_actions(sharded_repo, *actions)
+
+    result = sharded_repo.get_actions_by_status(str(test_user_id), ActionStatus.FAILED)
+
+    assert [str(r.id) for r in result] == sorted(str(a.id) for a in actions)
+
+
+def test_compact_items_compress_large_details(repo: ActionRepository):
+    action, *_ = generate_actions(1)
+    action.details = {"payload": "x" * 10_000}
+    store_actions(repo, action)
+
+    item = repo.table.scan()["Items"][0]
+    assert "action" not in item
+    assert "dz" in item and len(bytes(item["dz"])) < 10_000
+
+    result = repo.get_action_by_id(str(action.created_by), str(action.id))
+    assert result == action
+
+
+def test_compact_items_read_ids_from_their_keys(sharded_repo: ActionRepository):
+    action, *_ = generate_actions(1, created_by=uuid.UUID(int=7))
+    store_actions(sharded_repo, action)
+
+    item = sharded_repo.table.scan()["Items"][0]
+    assert "u" not in item and "i" not in item
+
+    assert DynamoActionRepository.item_to_action(item) == action
+
+
+def test_compact_items_keep_small_details_uncompressed(repo: ActionRepository):
+    action, *_ = generate_actions(1, randomize_completed_at=True)
+    store_actions(repo, action)
+
+    item = repo.table.scan()["Items"][0]
+    assert "dz" not in item and "d" in item
+
+    result = repo.get_action_by_id(str(action.created_by), str(action.id))
+    assert result == action
+
+
+def test_legacy_items_remain_readable(monkeypatch, repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    legacy_actions = generate_actions(2, created_by=test_user_id)
+    compact_actions = generate_actions(2, created_by=test_user_id)
+
+    monkeypatch.setenv("APP_DYNAMO_ITEM_FORMAT", str(LEGACY_ITEM_FORMAT))
+    DynamoActionRepository().store_actions(*legacy_actions)
+    monkeypatch.setenv("APP_DYNAMO_ITEM_FORMAT", str(COMPACT_ITEM_FORMAT))
+    DynamoActionRepository().store_actions(*compact_actions)
+
+    result = repo.enumerate_actions_for_user(str(test_user_id))
+    assert sorted(result, key=lambda a: str(a.id)) == sorted(
+        legacy_actions + compact_actions, key=lambda a: str(a.id)
+    )
+
+
+def test_purge_actions_by_status_and_age(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    old_failed = generate_actions(
+        30, created_by=test_user_id, status=ActionStatus.FAILED
+    )
+    old_pending = generate_actions(
+        5, created_by=test_user_id, status=ActionStatus.PENDING
+    )
+    repo.store_actions(*old_failed, *old_pending)
+
+    older_than = arrow.utcnow().shift(seconds=5).datetime
+    deleted = repo.purge_actions(
+        str(test_user_id), status=ActionStatus.FAILED, older_than=older_than
+    )
+
+    result = repo.enumerate_actions_for_user(str(test_user_id))
+    assert deleted == len(old_failed)
+    assert set(r.id for r in result) == set(a.id for a in old_pending)
+
+
+def test_purge_actions_keeps_newer_actions(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(5, created_by=test_user_id, status=ActionStatus.FAILED)
+    repo.store_actions(*actions)
+
+    older_than = arrow.utcnow().shift(hours=-1).datetime
+    deleted = repo.purge_actions(str(test_user_id), older_than=older_than)
+
+    assert deleted == 0
+    assert len(repo.enumerate_actions_for_user(str(test_user_id))) == len(actions)
+
+
+@pytest.mark.parametrize("lsi_projection", ["INCLUDE"])
+def test_included_projection_fetches_details(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(5, created_by=test_user_id, randomize_created_at=True)
+    for a in actions:
+        a.details = {"payload": "x" * 2_000}
+    store_actions(repo, *actions)
+
+    result = repo.get_actions_by_created_at(str(test_user_id))
+
+    assert result == sorted(actions, key=lambda a: (a.created_at, str(a.id)))
+
+
+@pytest.mark.parametrize("lsi_projection", ["INCLUDE"])
+def test_included_projection_without_details(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(5, created_by=test_user_id, status=ActionStatus.FAILED)
+    store_actions(repo, *actions)
+
+    result = repo.get_actions_by_status(
+        str(test_user_id), ActionStatus.FAILED, with_details=False
+    )
+
+    assert set(r.id for r in result) == set(a.id for a in actions)
+    assert all(r.details == {} for r in result)
+
+
+@pytest.mark.parametrize("lsi_projection", ["INCLUDE"])
+def test_included_projection_keeps_updated_at(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    action = Action(
+        details={"endpoint": "run"},
+        created_by=test_user_id,
+        created_at=arrow.utcnow().shift(hours=-1).datetime,
+    )
+    store_actions(repo, action)
+
+    (result,) = repo.get_actions_by_status(
+        str(test_user_id), action.status, with_details=False
+    )
+
+    assert result.updated_at == action.updated_at != action.created_at
+
+
+def test_unfinished_actions_are_not_indexed_by_completed_at(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    completed = generate_actions(
+        5, created_by=test_user_id, randomize_completed_at=True
+    )
+    pending = generate_actions(5, created_by=test_user_id)
+    store_actions(repo, *completed, *pending)
+
+    items = repo.table.scan()["Items"]
+    assert sum("completed_at#id" in item for item in items) == len(completed)
+
+    c1 = random.choice(completed).completed_at
+    c2 = random.choice(completed).completed_at
+    since, until = (c1, c2) if c1 < c2 else (c2, c1)
+    result = repo.get_actions_by_completed_at(
+        str(test_user_id), since=since, until=until
+    )
+
+    action_ids = set(a.id for a in completed if since <= a.completed_at <= until)
+    assert set(r.id for r in result) == action_ids
+    assert [r.completed_at for r in result] == sorted(r.completed_at for r in result)
+
+
+def generate_mixed_status_actions(user_id: uuid.UUID, n: int) -> t.List[Action]:
+    actions = []
+    for status in ActionStatus:
+        actions.extend(
+            generate_actions(
+                n, created_by=user_id, status=status, randomize_created_at=True
+            )
+        )
+    return actions
+
+
+def test_get_actions_by_statuses_merges_in_created_order(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_mixed_status_actions(test_user_id, 5)
+    store_actions(repo, *actions)
+
+    statuses = [ActionStatus.PENDING, ActionStatus.FAILED]
+    page = repo.get_actions_by_statuses(str(test_user_id), statuses)
+
+    expected = sorted(
+        (a for a in actions if a.status in statuses),
+        key=lambda a: (a.created_at, str(a.id)),
+    )
+    assert page.actions == expected
+    assert page.next_page is None
+
+
+@pytest.mark.parametrize("repo_fixture", ["repo", "sharded_repo"])
+def test_get_actions_by_statuses_paginates(repo_fixture: str, request):
+    repo = request.getfixturevalue(repo_fixture)
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_mixed_status_actions(test_user_id, 7)
+    store_actions(repo, *actions)
+
+    statuses = [ActionStatus.SUCCEEDED, ActionStatus.FAILED]
+    results: t.List[Action] = []
+    page = repo.get_actions_by_statuses(str(test_user_id), statuses, limit=4)
+    while True:
+        assert len(page.actions) <= 4
+        results.extend(page.actions)
+        if page.next_page is None:
+            break
+        page = repo.get_actions_by_statuses(
+            str(test_user_id), statuses, limit=4, page=page.next_page
+        )
+
+    expected = sorted(
+        (a for a in actions if a.status in statuses),
+        key=lambda a: (a.created_at, str(a.id)),
+    )
+    assert results == expected
+
+
+def use_legacy_status_ids(repo: DynamoActionRepository, *actions: Action):
+    # Mimic items written before status#id embedded created_at
+    for action in actions:
+        repo.table.update_item(
+            Key=repo.action_key(action, repo.settings),
+            UpdateExpression="SET #status_id = :status_id",
+            ExpressionAttributeNames={"#status_id": "status#id"},
+            ExpressionAttributeValues={
+                ":status_id": f"{action.status.value}#{str(action.id)}"
+            },
+        )
+
+
+@pytest.mark.parametrize("lsi_projection", ["ALL", "INCLUDE"])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("repo_fixture", ["repo", "sharded_repo"])
+def test_get_actions_by_statuses_places_legacy_status_ids(
+    monkeypatch, repo_fixture: str, descending: bool, lsi_projection: str, request
+):
+    repo = request.getfixturevalue(repo_fixture)
+    monkeypatch.setattr(repo.settings, "dynamo_legacy_status_ids", True)
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_mixed_status_actions(test_user_id, 7)
+    store_actions(repo, *actions)
+    use_legacy_status_ids(repo, *actions[::2])
+
+    statuses = [ActionStatus.SUCCEEDED, ActionStatus.FAILED]
+    results: t.List[Action] = []
+    page = ActionPage([], None)
+    while True:
+        page = repo.get_actions_by_statuses(
+            str(test_user_id),
+            statuses,
+            limit=4,
+            page=page.next_page,
+            descending=descending,
+            with_details=False,
+        )
+        results.extend(page.actions)
+        if page.next_page is None:
+            break
+
+    expected = sorted(
+        (a for a in actions if a.status in statuses),
+        key=lambda a: (a.created_at, str(a.id)),
+        reverse=descending,
+    )
+    assert [r.id for r in results] == [a.id for a in expected]
+
+
+def test_legacy_status_ids_are_skipped_by_default(repo):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(4, created_by=test_user_id)
+    store_actions(repo, *actions)
+    use_legacy_status_ids(repo, *actions[:2])
+
+    result = repo.get_actions_by_status(str(test_user_id), actions[0].status)
+
+    assert set(r.id for r in result) == set(a.id for a in actions[2:])
+
+
+@pytest.mark.parametrize("repo_fixture", ["repo", "sharded_repo"])
+def test_get_latest_actions_by_created_at(repo_fixture: str, request):
+    repo = request.getfixturevalue(repo_fixture)
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(20, created_by=test_user_id, randomize_created_at=True)
+    store_actions(repo, *actions)
+
+    page = repo.get_actions_by_time(
+        str(test_user_id), "created_at", limit=5, descending=True
+    )
+
+    expected = sorted(actions, key=lambda a: (a.created_at, str(a.id)), reverse=True)
+    assert page.actions == expected[:5]
+    assert page.next_page is not None
+
+
+@pytest.mark.parametrize("repo_fixture", ["repo", "sharded_repo"])
+def test_get_actions_by_completed_at_paginates_descending(repo_fixture: str, request):
+    repo = request.getfixturevalue(repo_fixture)
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(15, created_by=test_user_id, randomize_completed_at=True)
+    store_actions(repo, *actions)
+
+    results: t.List[Action] = []
+    page = repo.get_actions_by_time(
+        str(test_user_id), "completed_at", limit=4, descending=True
+    )
+    while True:
+        assert len(page.actions) <= 4
+        results.extend(page.actions)
+        if page.next_page is None:
+            break
+        page = repo.get_actions_by_time(
+            str(test_user_id),
+            "completed_at",
+            limit=4,
+            page=page.next_page,
+            descending=True,
+        )
+
+    expected = sorted(actions, key=lambda a: (a.completed_at, str(a.id)), reverse=True)
+    assert results == expected
+
+
+def test_get_actions_by_statuses_descending(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_mixed_status_actions(test_user_id, 5)
+    store_actions(repo, *actions)
+
+    statuses = [ActionStatus.PENDING, ActionStatus.SUCCEEDED]
+    first = repo.get_actions_by_statuses(
+        str(test_user_id), statuses, limit=6, descending=True
+    )
+    second = repo.get_actions_by_statuses(
+        str(test_user_id), statuses, limit=6, page=first.next_page, descending=True
+    )
+
+    expected = sorted(
+        (a for a in actions if a.status in statuses),
+        key=lambda a: (a.created_at, str(a.id)),
+        reverse=True,
+    )
+    assert first.actions + second.actions == expected
+    assert second.next_page is None
+
+
+def generate_recent_actions(n: int, *, days: int = 3) -> t.List[Action]:
+    return [
+        Action(
+            details={"endpoint": "run"},
+            created_by=uuid.uuid4(),
+            status=random.choice(list(ActionStatus)),
+            created_at=arrow.utcnow()
+            .shift(minutes=-random.randint(0, days * 24 * 60))
+            .datetime,
+        )
+        for _ in range(n)
+    ]
+
+
+def test_time_bucket_keys_cover_range():
+    settings = Settings(dynamo_time_bucket_s=3600, dynamo_time_bucket_shards=2)
+    since = arrow.get("2021-01-01T00:59:59+00:00").datetime
+    until = arrow.get("2021-01-01T01:00:00+00:00").datetime
+
+    keys = DynamoActionRepository.time_bucket_keys(since, until, settings)
+
+    hour = int(since.timestamp()) - 59 * 60 - 59
+    assert keys == [f"{hour}#0", f"{hour}#1", f"{hour + 3600}#0", f"{hour + 3600}#1"]
+
+
+@pytest.mark.parametrize("repo_fixture", ["repo", "in_memory_repo"])
+def test_get_all_actions_by_created_at_spans_users(repo_fixture: str, request):
+    repo = request.getfixturevalue(repo_fixture)
+    actions = generate_recent_actions(40)
+    store_actions(repo, *actions)
+    since = arrow.utcnow().shift(days=-2).datetime
+    until = arrow.utcnow().shift(hours=-1).datetime
+
+    result = repo.get_all_actions_by_created_at(since=since, until=until)
+
+    expected = sorted(
+        (a for a in actions if since <= a.created_at <= until),
+        key=lambda a: (a.created_at, str(a.id)),
+    )
+    assert result == expected
+
+
+def test_get_all_actions_by_created_at_places_legacy_status_ids(monkeypatch, repo):
+    monkeypatch.setattr(repo.settings, "dynamo_legacy_status_ids", True)
+    actions = generate_recent_actions(40)
+    store_actions(repo, *actions)
+    use_legacy_status_ids(repo, *actions[::3])
+    since = arrow.utcnow().shift(days=-2).datetime
+    until = arrow.utcnow().shift(hours=-1).datetime
+
+    result = repo.get_all_actions_by_created_at(
+        since=since, until=until, with_details=False
+    )
+
+    expected = sorted(
+        (a for a in actions if since <= a.created_at <= until),
+        key=lambda a: (a.created_at, str(a.id)),
+    )
+    assert [r.id for r in result] == [a.id for a in expected]
+
+
+@pytest.mark.parametrize("repo_fixture", ["repo", "in_memory_repo"])
+def test_get_all_actions_by_created_at_finds_stuck_actions(repo_fixture: str, request):
+    repo = request.getfixturevalue(repo_fixture)
+    actions = generate_recent_actions(40)
+    store_actions(repo, *actions)
+    until = arrow.utcnow().shift(hours=-1).datetime
+
+    result = repo.get_all_actions_by_created_at(
+        until=until, statuses=[ActionStatus.PENDING], with_details=False
+    )
+
+    expected = [
+        a.id
+        for a in sorted(actions, key=lambda a: (a.created_at, str(a.id)))
+        if a.status == ActionStatus.PENDING and a.created_at <= until
+    ]
+    assert [r.id for r in result] == expected
+
+
+@pytest.mark.parametrize("repo_fixture", ["repo", "sharded_repo", "in_memory_repo"])
+def test_get_actions_changed_since(monkeypatch, repo_fixture: str, request):
+    repo = request.getfixturevalue(repo_fixture)
+    test_user_id = uuid.uuid4()
+    an_hour_ago = arrow.utcnow().shift(hours=-1).replace(microsecond=0).datetime
+    actions = [
+        Action(created_by=test_user_id, created_at=an_hour_ago, details={})
+        for _ in range(5)
+    ]
+    with monkeypatch.context() as m:
+        m.setattr(models, "_get_now", lambda: an_hour_ago)
+        store_actions(repo, *actions)
+
+    synced: t.List[Action] = []
+    changes = repo.get_actions_changed_since(str(test_user_id), limit=2)
+    while changes.has_more:
+        assert len(changes.actions) == 2
+        synced.extend(changes.actions)
+        changes = repo.get_actions_changed_since(
+            str(test_user_id), changes.cursor, limit=2
+        )
+    synced.extend(changes.actions)
+    assert sorted(a.id for a in synced) == sorted(a.id for a in actions)
+
+    unchanged = repo.get_actions_changed_since(str(test_user_id), changes.cursor)
+    assert unchanged.actions == [] and not unchanged.has_more
+
+    finished = actions[2].copy(
+        update={
+            "status": ActionStatus.SUCCEEDED,
+            "completed_at": arrow.utcnow().datetime,
+        }
+    )
+    store_actions(repo, finished)
+    changes = repo.get_actions_changed_since(str(test_user_id), unchanged.cursor)
+    assert [(a.id, a.status) for a in changes.actions] == [
+        (finished.id, ActionStatus.SUCCEEDED)
+    ]
+    assert changes.actions[0].updated_at > an_hour_ago
+
+    # The cursor is held back by APP_CHANGES_SETTLE_S, so a poll straight
+    # away sees the change again
+    again = repo.get_actions_changed_since(str(test_user_id), changes.cursor)
+    assert [a.id for a in again.actions] == [finished.id]
+
+
+@pytest.mark.parametrize("repo_fixture", ["repo", "sharded_repo", "in_memory_repo"])
+def test_get_actions_changed_since_picks_up_lagged_writes_across_pages(
+    monkeypatch, repo_fixture: str, request
+):
+    repo = request.getfixturevalue(repo_fixture)
+    test_user_id = uuid.uuid4()
+    just_now = arrow.utcnow().shift(seconds=-2).replace(microsecond=0)
+    actions = [Action(created_by=test_user_id, details={}) for _ in range(3)]
+    with monkeypatch.context() as m:
+        m.setattr(models, "_get_now", lambda: just_now.datetime)
+        store_actions(repo, *actions)
+
+    changes = repo.get_actions_changed_since(str(test_user_id), limit=2)
+    assert changes.has_more
+    synced = list(changes.actions)
+
+    # Stamped before the page's last change, but only visible after it was read
+    lagged = Action(created_by=test_user_id, details={})
+    with monkeypatch.context() as m:
+        m.setattr(models, "_get_now", lambda: just_now.shift(seconds=-1).datetime)
+        store_actions(repo, lagged)
+
+    while changes.has_more:
+        changes = repo.get_actions_changed_since(
+            str(test_user_id), changes.cursor, limit=2
+        )
+        synced.extend(changes.actions)
+    assert set(a.id for a in synced) == set(a.id for a in [*actions, lagged])
+
+
+@pytest.mark.parametrize("repo_fixture", ["repo", "in_memory_repo"])
+def test_get_actions_changed_since_rejects_invalid_cursor(repo_fixture: str, request):
+    repo = request.getfixturevalue(repo_fixture)
+    with pytest.raises(ValueError):
+        repo.get_actions_changed_since(str(uuid.uuid4()), "not a cursor!")
+
+
+def test_actions_without_updated_at_default_to_last_change():
+    created_at = arrow.utcnow().shift(hours=-2).datetime
+    completed_at = arrow.utcnow().shift(hours=-1).datetime
+    pending = Action(created_by=uuid.uuid4(), created_at=created_at, details={})
+    finished = Action(
+        created_by=uuid.uuid4(),
+        created_at=created_at,
+        completed_at=completed_at,
+        details={},
+    )
+
+    assert pending.updated_at == pending.created_at
+    assert finished.updated_at == finished.completed_at
+
+
+def test_warmup_opens_a_connection_on_each_client(repo: ActionRepository):
+    table_client = patch.object(repo.table.meta.client, "describe_endpoints")
+    batch_client = patch.object(repo.client, "describe_endpoints")
+    with table_client as table_mock, batch_client as batch_mock:
+        repo.warmup()
+
+    table_mock.assert_called_once()
+    batch_mock.assert_called_once()
+
+
+def test_enumerating_all_actions_skips_idempotency_records(repo):
+    action, *_ = generate_actions(1)
+    response = {"statusCode": 200, "headers": {}, "body": action.json()}
+    repo.store_action_idempotently(action, "retry-key", response)
+
+    assert repo.enumerate_actions() == [action]
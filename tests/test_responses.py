@@ -0,0 +1,43 @@
+import uuid
+
+import arrow
+import pytest
+
+from api.models import Action, ActionStatus
+from api.responses import Ok
+
+
+def make_action(status: ActionStatus, **kwargs) -> Action:
+    return Action(created_by=uuid.UUID(int=0), status=status, details={}, **kwargs)
+
+
+@pytest.mark.parametrize("status", [ActionStatus.SUCCEEDED, ActionStatus.FAILED])
+def test_finished_actions_are_cacheable(status: ActionStatus):
+    headers = Ok.as_json(make_action(status))["headers"]
+
+    assert headers["Cache-Control"].startswith("public, max-age=")
+    assert int(headers["Cache-Control"].rsplit("=", 1)[1]) > 0
+    assert "Expires" in headers
+
+
+def test_pending_actions_are_not_cached():
+    headers = Ok.as_json(make_action(ActionStatus.PENDING))["headers"]
+
+    assert headers["Cache-Control"] == "no-cache"
+    assert "Expires" not in headers
+
+
+def test_finished_actions_are_not_cached_past_expiry():
+    created_at = arrow.utcnow().shift(days=-31, seconds=30).datetime
+    action = make_action(ActionStatus.SUCCEEDED, created_at=created_at)
+    headers = Ok.as_json(action)["headers"]
+
+    assert int(headers["Cache-Control"].rsplit("=", 1)[1]) <= 30
+
+
+def test_explicit_max_age_overrides_action_state():
+    headers = Ok.as_json(make_action(ActionStatus.SUCCEEDED), max_age_s=0)["headers"]
+    assert headers["Cache-Control"] == "no-cache"
+
+    headers = Ok.as_json({"schema": ""}, max_age_s=60)["headers"]
+    assert headers["Cache-Control"] == "public, max-age=60"
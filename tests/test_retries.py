@@ -0,0 +1,143 @@
+import time
+import typing as t
+
+import pytest
+from botocore.awsrequest import AWSResponse
+
+# The repository resolves its own imports through the "api" package, so the
+# metrics it records live on that module rather than on lit_lambdas.api
+from api import retries
+from api.config import Settings
+from api.repository import DynamoActionRepository
+
+THROTTLED = (
+    400,
+    b'{"__type": "com.amazonaws.dynamodb.v20120810#'
+    b'ProvisionedThroughputExceededException", "message": "Slow down"}',
+)
+OK = (200, b'{"Table": {"TableName": "actions"}}')
+
+
+class RawBody:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def stream(self, **_) -> t.Iterator[bytes]:
+        yield self.body
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("APP_BOTO_CLIENT_CONNECTION_RETRIES", "3")
+    monkeypatch.setenv("APP_BOTO_CLIENT_RETRY_MODE", "standard")
+    # Keep the backoff between attempts out of the test's runtime
+    monkeypatch.setattr(time, "sleep", lambda _: None)
+    retries.metrics.flush()
+    yield DynamoActionRepository().client
+    retries.set_deadline(None)
+    retries.metrics.flush()
+
+
+def respond_with(client, *responses: t.Tuple[int, bytes]):
+    pending = list(responses)
+
+    def send(request, **_):
+        status_code, body = pending.pop(0)
+        return AWSResponse(request.url, status_code, {}, RawBody(body))
+
+    client.meta.events.register_first("before-send.dynamodb", send)
+
+
+def test_boto_client_config_uses_retry_mode(monkeypatch):
+    monkeypatch.setenv("APP_BOTO_CLIENT_RETRY_MODE", "standard")
+    assert Settings().boto_client_config.retries["mode"] == "standard"
+    assert Settings.__fields__["boto_client_retry_mode"].default == "adaptive"
+
+
+def test_one_attempt_fits_in_the_request_deadline():
+    settings = Settings()
+    config = settings.boto_client_config
+    attempt_s = config.connect_timeout + config.read_timeout
+
+    assert attempt_s * 1000 < settings.request_deadline_ms
+
+
+def test_deadline_allows_without_deadline():
+    retries.set_deadline(None)
+    assert retries.deadline_allows(60, Settings())
+
+
+def test_deadline_allows_respects_margin(monkeypatch):
+    monkeypatch.setenv("APP_BOTO_CLIENT_DEADLINE_MARGIN_MS", "100")
+    retries.set_deadline(500)
+    try:
+        assert retries.deadline_allows(0.2, Settings())
+        assert not retries.deadline_allows(0.45, Settings())
+    finally:
+        retries.set_deadline(None)
+
+
+def test_throttles_are_retried_and_counted(client):
+    respond_with(client, THROTTLED, OK)
+
+    client.describe_table(TableName="actions")
+
+    counts = retries.metrics.flush()
+    assert counts[("DynamoThrottles", "DescribeTable")] == 1
+    assert counts[("DynamoRetries", "DescribeTable")] == 1
+
+
+def test_retries_stop_at_the_deadline(client):
+    respond_with(client, THROTTLED, OK)
+    retries.set_deadline(Settings().boto_client_deadline_margin_ms / 2)
+
+    with pytest.raises(client.exceptions.ProvisionedThroughputExceededException):
+        client.describe_table(TableName="actions")
+
+    counts = retries.metrics.flush()
+    assert counts[("DynamoRetriesAbandoned", "DescribeTable")] == 1
+
+
+def test_retries_stop_when_the_backoff_would_pass_the_deadline(client):
+    respond_with(client, THROTTLED, OK)
+    # Enough for another attempt, but not for the up to 1s backoff before it
+    retries.set_deadline(Settings().boto_client_deadline_margin_ms + 500)
+
+    with pytest.raises(client.exceptions.ProvisionedThroughputExceededException):
+        client.describe_table(TableName="actions")
+
+    counts = retries.metrics.flush()
+    assert counts[("DynamoRetriesAbandoned", "DescribeTable")] == 1
+
+
+def test_abandoned_retries_raise_without_another_attempt(client):
+    respond_with(client, THROTTLED, THROTTLED, OK)
+    # Room for the up to 1s backoff after the first attempt, not the 2s after
+    # the second
+    retries.set_deadline(Settings().boto_client_deadline_margin_ms + 1500)
+
+    with pytest.raises(
+        client.exceptions.ProvisionedThroughputExceededException
+    ) as error:
+        client.describe_table(TableName="actions")
+
+    assert error.value.response["ResponseMetadata"]["RetryAttempts"] == 1
+    counts = retries.metrics.flush()
+    assert counts[("DynamoThrottles", "DescribeTable")] == 2
+    assert counts[("DynamoRetries", "DescribeTable")] == 1
+    assert counts[("DynamoRetriesAbandoned", "DescribeTable")] == 1
+
+
+@pytest.mark.parametrize(
+    "mode,attempts,error_code,expected",
+    [
+        ("standard", 1, "ThrottlingException", 1),
+        ("adaptive", 3, "ProvisionedThroughputExceededException", 4),
+        ("standard", 10, "ThrottlingException", 20),
+        ("standard", 2, "InternalServerError", 0.05),
+        ("legacy", 3, "ThrottlingException", 0.2),
+    ],
+)
+def test_max_retry_delay_follows_botocore(mode, attempts, error_code, expected):
+    settings = Settings(boto_client_retry_mode=mode)
+    assert retries.max_retry_delay_s(settings, attempts, error_code) == expected
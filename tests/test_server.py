@@ -0,0 +1,62 @@
+import io
+import json
+from wsgiref.util import setup_testing_defaults
+
+import pytest
+from benchmarks.server import app, to_event
+
+
+def make_environ(method: str, path: str, query: str = "", **headers) -> dict:
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "wsgi.input": io.BytesIO(),
+        **{f"HTTP_{k.upper()}": v for k, v in headers.items()},
+    }
+    setup_testing_defaults(environ)
+    return environ
+
+
+def call(environ: dict):
+    started = {}
+
+    def start_response(status, headers):
+        started.update(status=status, headers=dict(headers))
+
+    body = b"".join(app(environ, start_response))
+    return started["status"], started["headers"], body
+
+
+def test_to_event_matches_proxy_integration_resources():
+    event = to_event(
+        make_environ("GET", "/actions/some-id", "wait=1&a=1&a=2", idempotency_key="abc")
+    )
+
+    assert event["resource"] == "/actions/{action_id}"
+    assert event["pathParameters"] == {"action_id": "some-id"}
+    assert event["queryStringParameters"] == {"wait": "1", "a": "2"}
+    assert event["multiValueQueryStringParameters"] == {"wait": ["1"], "a": ["1", "2"]}
+    assert event["headers"]["Idempotency-Key"] == "abc"
+
+    stats = to_event(make_environ("GET", "/actions/stats"))
+    assert (stats["resource"], stats["pathParameters"]) == ("/actions/stats", None)
+    assert stats["queryStringParameters"] is None
+
+
+@pytest.fixture
+def memory_backend(monkeypatch):
+    monkeypatch.setenv("APP_REPOSITORY_BACKEND", "memory")
+
+
+def test_app_round_trip(memory_backend):
+    status, headers, body = call(make_environ("POST", "/actions"))
+    assert status == "200 OK"
+    assert headers["Content-Length"] == str(len(body))
+    action_id = json.loads(body)["id"]
+
+    status, _, body = call(make_environ("GET", f"/actions/{action_id}"))
+    assert status == "200 OK" and json.loads(body)["id"] == action_id
+
+    status, _, _ = call(make_environ("GET", "/some/fake/path"))
+    assert status == "404 Not Found"
@@ -0,0 +1,128 @@
+import uuid
+
+import arrow
+from tests.test_repo import generate_actions, use_legacy_status_ids
+
+from lit_lambdas.api import services
+from lit_lambdas.api.models import ActionStatus
+from lit_lambdas.api.repository import ActionRepository
+
+
+def test_store_and_get_actions_in_batches(repo: ActionRepository):
+    actions = generate_actions(60, created_by=uuid.UUID(int=0))
+
+    stored = services.store_actions(repo.client, *actions)
+    result = services.get_actions(repo.client, *actions)
+
+    assert stored == len(actions)
+    assert set(r.id for r in result) == set(a.id for a in actions)
+
+
+def test_delete_actions_in_batches(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(60, created_by=test_user_id)
+    repo.store_actions(*actions)
+
+    deleted = services.delete_actions(repo.client, *actions)
+
+    assert deleted == len(actions)
+    assert repo.enumerate_actions_for_user(str(test_user_id)) == []
+
+
+def test_delete_actions_ignores_duplicates(repo: ActionRepository):
+    action, *_ = generate_actions(1)
+    repo.store_actions(action)
+
+    deleted = services.delete_actions(repo.client, action, action)
+
+    assert deleted == 1
+    assert repo.get_action_by_id(str(action.created_by), str(action.id)) is None
+
+
+def test_delete_actions_counts_requests_for_missing_items(repo: ActionRepository):
+    stored, missing = generate_actions(2)
+    repo.store_actions(stored)
+
+    # BatchWriteItem can't tell the two apart
+    deleted = services.delete_actions(repo.client, stored, missing)
+
+    assert deleted == 2
+
+
+def test_backfill_removes_unset_completed_at(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    pending = generate_actions(30, created_by=test_user_id)
+    completed = generate_actions(
+        5, created_by=test_user_id, randomize_completed_at=True
+    )
+    repo.store_actions(*pending, *completed)
+    for action in pending:
+        # Mimic items written before the index was made sparse
+        repo.table.update_item(
+            Key=repo.action_key(action, repo.settings),
+            UpdateExpression="SET #completed_at_id = :unset",
+            ExpressionAttributeNames={"#completed_at_id": "completed_at#id"},
+            ExpressionAttributeValues={":unset": f"None#{action.id}"},
+        )
+
+    updated = services.backfill_sparse_completed_at(repo.client)
+
+    assert updated == len(pending)
+    items = repo.table.scan()["Items"]
+    assert sum("completed_at#id" in item for item in items) == len(completed)
+    result = repo.get_actions_by_completed_at(str(test_user_id))
+    assert set(r.id for r in result) == set(a.id for a in completed)
+    assert services.backfill_sparse_completed_at(repo.client) == 0
+
+
+def test_backfill_embeds_created_at_in_status_ids(repo):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(20, created_by=test_user_id, randomize_created_at=True)
+    repo.store_actions(*actions)
+    use_legacy_status_ids(repo, *actions[:12])
+
+    assert services.backfill_status_id(repo.client) == 12
+
+    result = repo.get_actions_by_status(str(test_user_id), actions[0].status)
+    assert result == sorted(actions, key=lambda a: (a.created_at, str(a.id)))
+    assert services.backfill_status_id(repo.client) == 0
+
+
+def test_backfill_assigns_time_buckets(repo: ActionRepository):
+    actions = generate_actions(20, created_by=uuid.UUID(int=0))
+    repo.store_actions(*actions)
+    for action in actions[:12]:
+        # Mimic items written before the index existed
+        repo.table.update_item(
+            Key=repo.action_key(action, repo.settings),
+            UpdateExpression="REMOVE #bucket",
+            ExpressionAttributeNames={"#bucket": "bucket"},
+        )
+
+    assert services.backfill_time_buckets(repo.client) == 12
+
+    result = repo.get_all_actions_by_created_at(
+        until=arrow.utcnow().shift(days=1).datetime
+    )
+    assert set(r.id for r in result) == set(a.id for a in actions)
+    assert services.backfill_time_buckets(repo.client) == 0
+
+
+def test_backfill_indexes_actions_by_last_change(repo: ActionRepository):
+    test_user_id = uuid.UUID(int=0)
+    actions = generate_actions(20, created_by=test_user_id)
+    repo.store_actions(*actions)
+    for action in actions[:12]:
+        # Mimic items written before delta sync existed
+        repo.table.update_item(
+            Key=repo.action_key(action, repo.settings),
+            UpdateExpression="REMOVE #updated_at_id",
+            ExpressionAttributeNames={"#updated_at_id": "updated_at#id"},
+        )
+    assert len(repo.get_actions_changed_since(str(test_user_id)).actions) == 8
+
+    assert services.backfill_updated_at(repo.client) == 12
+
+    result = repo.get_actions_changed_since(str(test_user_id)).actions
+    assert set(r.id for r in result) == set(a.id for a in actions)
+    assert services.backfill_updated_at(repo.client) == 0
@@ -0,0 +1,93 @@
+import typing as t
+import uuid
+
+from aws_lambda_powertools.utilities.data_classes.dynamo_db_stream_event import (
+    DynamoDBRecord,
+)
+from tests.test_repo import generate_actions
+
+from api import services
+from api.batching import serialize
+from api.models import ActionStatus
+from api.repository import DynamoActionRepository
+from api.streams import status_deltas
+
+
+def stream_record(
+    event_name: str, old: t.Optional[t.Dict] = None, new: t.Optional[t.Dict] = None
+) -> DynamoDBRecord:
+    images = {}
+    if old is not None:
+        images["OldImage"] = serialize(old)
+    if new is not None:
+        images["NewImage"] = serialize(new)
+    return DynamoDBRecord({"eventName": event_name, "dynamodb": images})
+
+
+def test_status_deltas_track_inserts_transitions_and_removals(
+    repo: DynamoActionRepository,
+):
+    user_id = uuid.UUID(int=0)
+    pending = generate_actions(3, created_by=user_id, status=ActionStatus.PENDING)
+    to_item = lambda a: repo.action_to_item(a, repo.settings)  # noqa: E731
+    finished = pending[0].copy(update={"status": ActionStatus.SUCCEEDED})
+
+    deltas = status_deltas(
+        [stream_record("INSERT", new=to_item(a)) for a in pending]
+        + [
+            stream_record("MODIFY", old=to_item(pending[0]), new=to_item(finished)),
+            stream_record("REMOVE", old=to_item(pending[1])),
+            # Non-action items never count
+            stream_record("INSERT", new={**repo.stats_key(str(user_id)), "total": 1}),
+        ]
+    )
+
+    assert deltas == {
+        str(user_id): {"PENDING": 1, "SUCCEEDED": 1, "total": 2},
+    }
+
+
+def test_applied_deltas_are_served_as_stats(repo: DynamoActionRepository):
+    user_id = str(uuid.UUID(int=0))
+    services.apply_status_deltas(
+        repo.client, {user_id: {"PENDING": 2, "FAILED": 1, "total": 3}}
+    )
+    services.apply_status_deltas(repo.client, {user_id: {"PENDING": -1, "total": -1}})
+
+    stats = repo.get_action_stats(user_id)
+
+    assert stats.counts == {
+        ActionStatus.PENDING: 1,
+        ActionStatus.SUCCEEDED: 0,
+        ActionStatus.FAILED: 1,
+    }
+    assert stats.total == 2
+
+
+def test_reconcile_fixes_drifted_stats(sharded_repo: DynamoActionRepository):
+    user_id = uuid.UUID(int=0)
+    actions = generate_actions(12, created_by=user_id) + generate_actions(
+        5, created_by=user_id, status=ActionStatus.FAILED
+    )
+    sharded_repo.store_actions(*actions)
+    services.apply_status_deltas(
+        sharded_repo.client, {str(user_id): {"SUCCEEDED": 100, "total": 100}}
+    )
+
+    services.reconcile_action_stats(sharded_repo.client)
+
+    stats = sharded_repo.get_action_stats(str(user_id))
+    assert stats.total == len(actions)
+    for status in ActionStatus:
+        assert stats.counts[status] == sum(a.status == status for a in actions)
+
+
+def test_stats_items_are_not_enumerated_as_actions(repo: DynamoActionRepository):
+    user_id = uuid.UUID(int=0)
+    actions = generate_actions(3, created_by=user_id)
+    repo.store_actions(*actions)
+    services.apply_status_deltas(repo.client, {str(user_id): {"total": 3}})
+
+    result = repo.enumerate_actions()
+
+    assert set(r.id for r in result) == set(a.id for a in actions)
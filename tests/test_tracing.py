@@ -0,0 +1,102 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from api import tracing
+from api.config import Settings
+from lit_lambdas.api.index import handler
+
+
+@pytest.fixture
+def exporter(monkeypatch) -> tracing.InMemoryExporter:
+    exporter = tracing.InMemoryExporter()
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    return exporter
+
+
+def test_spans_are_not_recorded_outside_a_trace():
+    with tracing.span("parse"):
+        pass
+
+    assert tracing.end_trace() is None
+
+
+def test_spans_nest():
+    tracing.start_trace("enumerate")
+    with tracing.span("dynamo", operation="BatchGetItem"):
+        with tracing.span("hydrate"):
+            pass
+    trace = tracing.end_trace()
+
+    assert trace is not None and trace.route == "enumerate"
+    dynamo, hydrate = trace.spans
+    assert (dynamo.name, dynamo.parent, dynamo.attributes) == (
+        "dynamo",
+        None,
+        {"operation": "BatchGetItem"},
+    )
+    assert (hydrate.name, hydrate.parent) == ("hydrate", "dynamo")
+    assert dynamo.start_ms <= hydrate.start_ms
+    assert hydrate.duration_ms <= dynamo.duration_ms <= trace.duration_ms
+
+
+def test_server_timing_sums_spans_by_name():
+    trace = tracing.Trace(
+        "enumerate",
+        10.0,
+        [
+            tracing.Span("dynamo", 0.0, 2.0, None, {}),
+            tracing.Span("dynamo", 0.5, 3.25, None, {}),
+            tracing.Span("serialize", 6.0, 1.0, None, {}),
+        ],
+    )
+
+    assert tracing.server_timing(trace) == (
+        "dynamo;dur=5.250, serialize;dur=1.000, total;dur=10.000"
+    )
+
+
+@pytest.mark.parametrize(
+    "tracing_on,server_timing_on", [(False, False), (True, False), (False, True)]
+)
+def test_handler_exports_traces(
+    using_localstack,
+    exporter,
+    apigateway_event,
+    lambda_context,
+    tracing_on,
+    server_timing_on,
+):
+    apigateway_event["path"] = "/actions"
+    apigateway_event["httpMethod"] = "POST"
+    handler(apigateway_event, lambda_context)
+
+    apigateway_event["httpMethod"] = "GET"
+    apigateway_event["queryStringParameters"] = {"status": "PENDING"}
+    apigateway_event["multiValueQueryStringParameters"] = None
+    settings = Settings(tracing=tracing_on, server_timing=server_timing_on)
+    with patch("lit_lambdas.api.index.settings", settings):
+        resp = handler(apigateway_event, lambda_context)
+    assert len(json.loads(resp["body"])) == 1
+
+    if tracing_on:
+        (trace,) = exporter.traces
+        assert trace.route == "enumerate"
+        names = [span.name for span in trace.spans]
+        assert names[0] == "parse" and names[-1] == "serialize"
+        assert {"dynamo", "hydrate"} <= set(names)
+    else:
+        assert exporter.traces == []
+
+    if server_timing_on:
+        timings = resp["headers"][tracing.SERVER_TIMING_HEADER].split(", ")
+        assert [timing.split(";")[0] for timing in timings] == [
+            "parse",
+            "dynamo",
+            "hydrate",
+            "serialize",
+            "total",
+        ]
+    else:
+        assert tracing.SERVER_TIMING_HEADER not in resp["headers"]